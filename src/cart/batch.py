@@ -0,0 +1,114 @@
+# cart/batch.py
+
+from django.db import transaction
+
+from product.models import Product
+from .models import CartItem
+from .serializers import CartOperationSerializer
+
+UPDATE_FIELDS = ('quantity', 'selected_color', 'selected_size')
+
+
+def line_key(product_id, color, size):
+    # A blank and a missing option are the same choice.
+    return product_id, color or '', size or ''
+
+
+def _error(op, error, message):
+    return {'op': op, 'status': 'error', 'error': error, 'message': message}
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply a batch of add/update/remove operations to `cart` and return one
+    result per operation, in order.
+
+    Operations are checked in order against the cart as the earlier ones
+    leave it, with the same rules as add_item, update_item and remove_item:
+    a failing operation is reported and skipped, the others still apply. The
+    cart's items and the stock of every product involved are read with one
+    query each; the writes then go out as one delete, one bulk_update and one
+    bulk_create in a single transaction. An IntegrityError (a line added
+    concurrently) rolls the whole batch back.
+    """
+    serializers = [CartOperationSerializer(data=raw) for raw in operations]
+    valid = [serializer.validated_data for serializer in serializers if serializer.is_valid()]
+
+    items = {item.pk: item for item in CartItem.objects.filter(cart=cart)}
+    product_ids = {data['product_id'] for data in valid if data['op'] == 'add'}
+    product_ids.update(items[data['id']].product_id for data in valid if data['op'] == 'update' and data['id'] in items)
+    stock = dict(Product.objects.filter(pk__in=product_ids).order_by().values_list('pk', 'current_stock'))
+    # Each line of the cart as the batch leaves it, by (product, color, size).
+    lines = {line_key(item.product_id, item.selected_color, item.selected_size): item for item in items.values()}
+
+    results = []
+    created, updated, removed = [], set(), set()
+    for serializer in serializers:
+        if serializer.errors:
+            results.append(_error(serializer.initial_data.get('op'), 'invalid_operation', serializer.errors))
+            continue
+        data = serializer.validated_data
+        op = data['op']
+
+        if op == 'add':
+            if data['product_id'] not in stock:
+                results.append(_error(op, 'product_not_found', "Product not found"))
+                continue
+            item = CartItem(
+                cart=cart,
+                product_id=data['product_id'],
+                quantity=data['quantity'],
+                selected_color=data.get('selected_color'),
+                selected_size=data.get('selected_size'),
+            )
+        else:
+            item = items.get(data['id'])
+            if item is None or item.pk in removed:
+                results.append(_error(op, 'item_not_found', "Item not found in cart"))
+                continue
+            if op == 'remove':
+                del lines[line_key(item.product_id, item.selected_color, item.selected_size)]
+                removed.add(item.pk)
+                updated.discard(item.pk)
+                results.append({'op': op, 'status': 'removed', 'cartItemId': item.pk})
+                continue
+
+        quantity = data.get('quantity', item.quantity)
+        if quantity > stock[item.product_id]:
+            results.append(_error(op, 'insufficient_stock', f"Only {stock[item.product_id]} items available"))
+            continue
+        key = line_key(
+            item.product_id,
+            data.get('selected_color', item.selected_color),
+            data.get('selected_size', item.selected_size),
+        )
+        if lines.get(key, item) is not item:
+            results.append(_error(
+                op, 'duplicate_item',
+                "This item with the same color/size combination already exists in your cart",
+            ))
+            continue
+
+        if op == 'add':
+            lines[key] = item
+            created.append((len(results), item))
+            results.append({'op': op, 'status': 'created'})
+        else:
+            del lines[line_key(item.product_id, item.selected_color, item.selected_size)]
+            lines[key] = item
+            for field in UPDATE_FIELDS:
+                if field in data:
+                    setattr(item, field, data[field])
+            updated.add(item.pk)
+            results.append({'op': op, 'status': 'updated', 'cartItemId': item.pk})
+
+    with transaction.atomic():
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        if updated:
+            CartItem.objects.bulk_update([items[pk] for pk in updated], UPDATE_FIELDS)
+        if created:
+            CartItem.objects.bulk_create([item for _, item in created])
+    for index, item in created:
+        results[index]['cartItemId'] = item.pk
+    return results
@@ -0,0 +1,64 @@
+# cart/current.py
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Cart
+
+CART_ID_KEY = 'cart:user:{}:id'
+CART_ID_TIMEOUT = 24 * 60 * 60
+
+
+def _remember(user, cart_id):
+    # After commit, so a cart created in a transaction that rolls back is
+    # never remembered.
+    transaction.on_commit(lambda: cache.set(CART_ID_KEY.format(user.pk), cart_id, timeout=CART_ID_TIMEOUT))
+
+
+def _cart(user, cart_id):
+    """A Cart instance for a known id, built without a query."""
+    cart = Cart(pk=cart_id, user=user)
+    cart._state.adding = False
+    cart._state.db = 'default'
+    return cart
+
+
+def find_cart(user):
+    """
+    The user's cart, or None if they have none yet. The cart id is cached
+    per user, so this costs no query after the first lookup. The instance
+    only carries its id and user; reload it to read its timestamps.
+    """
+    cart_id = cache.get(CART_ID_KEY.format(user.pk))
+    if cart_id is None:
+        cart_id = Cart.objects.filter(user=user).values_list('pk', flat=True).first()
+        if cart_id is None:
+            return None
+        _remember(user, cart_id)
+    return _cart(user, cart_id)
+
+
+def get_or_create_cart(user):
+    """
+    (cart, created) for the user, creating the cart if they have none.
+
+    Concurrent first writes are safe: the cart's OneToOne user column is
+    unique, so get_or_create's losing insert fails and it returns the
+    winner's row instead.
+    """
+    cart = find_cart(user)
+    if cart is not None:
+        return cart, False
+    cart, created = Cart.objects.get_or_create(user=user)
+    _remember(user, cart.pk)
+    return cart, created
+
+
+def forget_cart(user_id):
+    """
+    Drop the cached cart id of a user whose cart is deleted; again after
+    commit, for ids cached by readers while the delete was uncommitted.
+    """
+    key = CART_ID_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
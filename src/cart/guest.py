@@ -0,0 +1,122 @@
+# cart/guest.py
+
+import secrets
+
+from django.core.cache import cache
+from django.db import transaction
+
+from product.detail_cache import get_product_details
+from product.models import Product
+from .batch import line_key
+from .current import get_or_create_cart
+from .models import CartItem
+
+GUEST_CART_KEY = 'cart:guest:{}'
+# Guest carts expire this long after their last change.
+GUEST_CART_TIMEOUT = 7 * 24 * 60 * 60
+GUEST_CART_MAX_LINES = 100
+# Tokens are secrets.token_urlsafe(GUEST_TOKEN_BYTES): 32 URL-safe characters.
+GUEST_TOKEN_BYTES = 24
+GUEST_TOKEN_REGEX = '[A-Za-z0-9_-]{32}'
+
+
+def new_guest_cart():
+    """Start an empty guest cart and return its token."""
+    token = secrets.token_urlsafe(GUEST_TOKEN_BYTES)
+    cache.set(GUEST_CART_KEY.format(token), {}, timeout=GUEST_CART_TIMEOUT)
+    return token
+
+
+def get_guest_cart(token):
+    """
+    The guest cart as {(product id, color, size): quantity}, or None if the
+    token is unknown or the cart expired.
+    """
+    return cache.get(GUEST_CART_KEY.format(token))
+
+
+def save_guest_cart(token, lines):
+    """Store the lines of a guest cart and restart its expiry."""
+    cache.set(GUEST_CART_KEY.format(token), lines, timeout=GUEST_CART_TIMEOUT)
+
+
+def guest_cart_payload(lines, context=None):
+    """
+    The lines of a guest cart in the CartItemOutputSerializer shape, minus
+    cartItemId (guest lines are addressed by product, color and size).
+
+    Product data comes from the product detail cache, so rendering a cart
+    whose products are cached costs no queries. Lines of deleted products
+    are left out.
+    """
+    products = get_product_details(sorted({product_id for product_id, _, _ in lines}), context)
+    items = []
+    for (product_id, color, size), quantity in lines.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        items.append({
+            "id": product_id,
+            "name": product["name"],
+            "price": product["price"],
+            "description": product["description"],
+            "category": product["category"] or "",
+            "tags": [{"id": t["id"], "name": t["name"], "value": t["value"]} for t in product["tags"]],
+            "images": [{
+                "id": img["id"],
+                "image": img["image"],
+                "media_type": img["media_type"],
+                "alt_text": img["alt_text"],
+                "is_primary": img["is_primary"]
+            } for img in product["images"]],
+            "quantity": quantity,
+            "selectedColor": color,
+            "selectedSize": size,
+            "current_stock": product["current_stock"],
+            "created_at": product["created_at"],
+            "updated_at": product["updated_at"]
+        })
+    return items
+
+
+def merge_guest_cart(user, token):
+    """
+    Move the guest cart `token` into the user's Cart, then drop it.
+
+    Lines the user already has are summed with the guest quantities; every
+    quantity is capped at the product's current stock, and lines of deleted
+    or sold-out products are dropped. The cart's items and the stock of the
+    guest's products are read with one query each and written with one
+    bulk_update and one bulk_create in a single transaction. Returns the
+    number of lines merged; 0 for unknown or expired tokens.
+    """
+    lines = get_guest_cart(token)
+    if not lines:
+        return 0
+    product_ids = {product_id for product_id, _, _ in lines}
+    with transaction.atomic():
+        cart, _ = get_or_create_cart(user)
+        existing = {
+            line_key(item.product_id, item.selected_color, item.selected_size): item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=product_ids)
+        }
+        stock = dict(Product.objects.filter(pk__in=product_ids).order_by().values_list('pk', 'current_stock'))
+        created, updated = [], []
+        for key, quantity in lines.items():
+            product_id, color, size = key
+            available = stock.get(product_id, 0)
+            item = existing.get(key)
+            if item is not None:
+                item.quantity = min(item.quantity + quantity, max(available, item.quantity))
+                updated.append(item)
+            elif available > 0:
+                created.append(CartItem(
+                    cart=cart, product_id=product_id, quantity=min(quantity, available),
+                    selected_color=color, selected_size=size,
+                ))
+        if updated:
+            CartItem.objects.bulk_update(updated, ['quantity'])
+        if created:
+            CartItem.objects.bulk_create(created)
+        transaction.on_commit(lambda: cache.delete(GUEST_CART_KEY.format(token)))
+    return len(created) + len(updated)
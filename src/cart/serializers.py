@@ -83,29 +83,113 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         """Convert to frontend expected format"""
-        product = instance.product
-        return {
-            "id": instance.id,
-            "cartItemId": str(instance.id),
-            "name": product.name,
-            "price": str(product.price),
-            "description": product.description,
-            "category": product.category.name if product.category else "",
-            "tags": [{"id": t.id, "name": t.name, "value": t.value} for t in product.tags.all()],
-            "images": [{
-                "id": img.id,
-                "image": img.image,
-                "media_type": img.media_type,
-                "alt_text": img.alt_text,
-                "is_primary": img.is_primary
-            } for img in product.images.all()],
-            "quantity": instance.quantity,
-            "selectedColor": instance.selected_color or "",
-            "selectedSize": instance.selected_size or "",
-            "current_stock": product.current_stock,
-            "created_at": product.created_at.isoformat(),
-            "updated_at": product.updated_at.isoformat()
-        }
+        return cart_item_payload(instance)
+
+
+def cart_item_payload(item):
+    """
+    The CartItemOutputSerializer shape for one cart item, built directly from
+    the model. Reads only what cart_item_queryset() preloads, so a list of
+    items costs no queries beyond that queryset's.
+    """
+    product = item.product
+    return {
+        "id": item.id,
+        "cartItemId": str(item.id),
+        "name": product.name,
+        "price": str(product.price),
+        "description": product.description,
+        "category": product.category.name if product.category else "",
+        "tags": [{"id": t.id, "name": t.name, "value": t.value} for t in product.tags.all()],
+        "images": [{
+            "id": img.id,
+            "image": img.image,
+            "media_type": img.media_type,
+            "alt_text": img.alt_text,
+            "is_primary": img.is_primary
+        } for img in product.images.all()],
+        "quantity": item.quantity,
+        "selectedColor": item.selected_color or "",
+        "selectedSize": item.selected_size or "",
+        "current_stock": product.current_stock,
+        "created_at": product.created_at.isoformat(),
+        "updated_at": product.updated_at.isoformat()
+    }
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    One operation of a cart batch: `add` a product (like add_item), or
+    `update`/`remove` a cart item by its id (like update_item/remove_item).
+    """
+    op = serializers.ChoiceField(choices=['add', 'update', 'remove'], help_text="Operation to apply")
+    id = serializers.IntegerField(required=False, help_text="Cart item ID (update and remove)")
+    product_id = serializers.IntegerField(required=False, help_text="Product to add (add)")
+    quantity = serializers.IntegerField(required=False, min_value=1, help_text="Quantity (add, update)")
+    selected_color = serializers.CharField(required=False, allow_blank=True, help_text="Selected color variant")
+    selected_size = serializers.CharField(required=False, allow_blank=True, help_text="Selected size variant")
+
+    def validate(self, data):
+        if data['op'] == 'add':
+            missing = [field for field in ('product_id', 'quantity') if field not in data]
+        else:
+            missing = [] if 'id' in data else ['id']
+        if missing:
+            raise serializers.ValidationError({field: "This field is required." for field in missing})
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of cart operations. Operations are validated one by
+    one when applied, so a malformed operation fails alone.
+    """
+    operations = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=100,
+        help_text="Operations to apply, in order"
+    )
+
+
+class CartOperationResultSerializer(serializers.Serializer):
+    """
+    Serializer for the outcome of one batch operation.
+    """
+    op = serializers.CharField(help_text="Operation as requested")
+    status = serializers.ChoiceField(
+        choices=['created', 'updated', 'removed', 'error'],
+        help_text="What happened to the operation"
+    )
+    cartItemId = serializers.IntegerField(required=False, help_text="Cart item ID the operation applied to")
+    error = serializers.CharField(required=False, help_text="Error code, when status is error")
+    message = serializers.JSONField(required=False, help_text="Error details, when status is error")
+
+
+class CartBatchOutputSerializer(serializers.Serializer):
+    """
+    Serializer for the batch response: one result per operation, then the cart.
+    """
+    results = CartOperationResultSerializer(many=True)
+    items = CartItemOutputSerializer(many=True)
+
+
+class GuestCartItemSerializer(serializers.Serializer):
+    """
+    Serializer for a guest cart line, addressed by product, color and size.
+    """
+    product_id = serializers.IntegerField(help_text="ID of the product")
+    quantity = serializers.IntegerField(min_value=1, default=1, help_text="Quantity of the item (add, update)")
+    selected_color = serializers.CharField(required=False, allow_blank=True, help_text="Selected color variant")
+    selected_size = serializers.CharField(required=False, allow_blank=True, help_text="Selected size variant")
+
+
+class GuestCartTokenSerializer(serializers.Serializer):
+    """
+    Serializer for a new guest cart's token.
+    """
+    token = serializers.CharField(help_text="Opaque guest cart token; pass it as guest_cart when logging in to keep the cart")
+
 
 class CartSerializer(serializers.ModelSerializer):
     """
@@ -0,0 +1,12 @@
+# cart/signals.py
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .current import forget_cart
+from .models import Cart
+
+
+@receiver(post_delete, sender=Cart)
+def forget_deleted_cart(sender, instance, **kwargs):
+    """Deleted carts (including with their user) must not be served from the cached id."""
+    forget_cart(instance.user_id)
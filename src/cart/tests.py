@@ -1,9 +1,15 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from product.models import Product, Category
 from cart.models import Cart, CartItem
+from cart.views import GuestCartCreateThrottle, GuestCartWriteThrottle
+from product.tests.test_query_budget import create_catalog
 
 User = get_user_model()
 
@@ -104,4 +110,212 @@ class CartAPITestCase(APITestCase):
     def test_cart_total(self):
         response = self.client.get(f'/api/cart/cart/{self.cart.id}/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['total'], self.cart.get_total())
\ No newline at end of file
+        self.assertEqual(response.data['total'], self.cart.get_total())
+
+class CartQueryBudgetTest(TestCase):
+    def test_cart_list(self):
+        # cart, items (+products, categories), product tags, product images
+        for count in (1, 10, 100):
+            user = User.objects.create_user(username=f"shopper{count}", password="password123")
+            cart = Cart.objects.create(user=user)
+            for product in create_catalog(count):
+                CartItem.objects.create(cart=cart, product=product, quantity=2, selected_color="Red", selected_size="")
+            client = APIClient()
+            client.force_authenticate(user=user)
+            with self.assertNumQueries(4):
+                response = client.get('/api/cart/cart/')
+            self.assertEqual(len(response.data), count)
+            item = response.data[0]
+            self.assertEqual((item['quantity'], item['selectedColor'], item['selectedSize']), (2, "Red", ""))
+            self.assertEqual(len(item['tags']), 2)
+            self.assertEqual(len(item['images']), 2)
+
+
+class CartBatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="shopper", password="password123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        self.shirt, self.dress, self.skirt = create_catalog(3)
+        Product.objects.update(current_stock=10)
+        Product.objects.filter(pk=self.skirt.pk).update(current_stock=2)
+        self.item = CartItem.objects.create(cart=self.cart, product=self.shirt, quantity=1, selected_color="", selected_size="")
+
+    def batch(self, *operations):
+        response = self.client.post('/api/cart/cart/batch/', {'operations': list(operations)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_applies_operations_in_order(self):
+        data = self.batch(
+            {'op': 'add', 'product_id': self.dress.pk, 'quantity': 2, 'selected_color': "", 'selected_size': ""},
+            {'op': 'update', 'id': self.item.pk, 'quantity': 3},
+            {'op': 'remove', 'id': self.item.pk},
+            {'op': 'update', 'id': self.item.pk, 'quantity': 1},
+        )
+        created = CartItem.objects.get(cart=self.cart)
+        self.assertEqual(data['results'], [
+            {'op': 'add', 'status': 'created', 'cartItemId': created.pk},
+            {'op': 'update', 'status': 'updated', 'cartItemId': self.item.pk},
+            {'op': 'remove', 'status': 'removed', 'cartItemId': self.item.pk},
+            {'op': 'update', 'status': 'error', 'error': 'item_not_found', 'message': "Item not found in cart"},
+        ])
+        self.assertEqual([(item['id'], item['quantity']) for item in data['items']], [(self.dress.pk, 2)])
+
+    def test_failing_operations_are_skipped(self):
+        data = self.batch(
+            {'op': 'add', 'product_id': self.skirt.pk, 'quantity': 3, 'selected_color': "", 'selected_size': ""},
+            {'op': 'add', 'product_id': self.shirt.pk, 'quantity': 1, 'selected_color': "", 'selected_size': ""},
+            {'op': 'add', 'product_id': 999, 'quantity': 1},
+            {'op': 'add', 'product_id': self.skirt.pk},
+            {'op': 'update', 'id': self.item.pk, 'quantity': 2},
+        )
+        self.assertEqual(
+            [result.get('error') for result in data['results']],
+            ['insufficient_stock', 'duplicate_item', 'product_not_found', 'invalid_operation', None],
+        )
+        self.assertEqual(data['results'][0]['message'], "Only 2 items available")
+        self.assertIn('quantity', data['results'][3]['message'])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 2)
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 1)
+
+    def test_rejects_malformed_batch(self):
+        response = self.client.post('/api/cart/cart/batch/', {'operations': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_is_constant(self):
+        # cart, items, stock, savepoint, bulk update, bulk insert, release,
+        # then the final cart: items, tags, images
+        for count in (1, 20):
+            products = create_catalog(count)
+            Product.objects.update(current_stock=10)
+            operations = [
+                {'op': 'add', 'product_id': product.pk, 'quantity': 1, 'selected_color': "", 'selected_size': ""}
+                for product in products
+            ] + [{'op': 'update', 'id': self.item.pk, 'quantity': 2}]
+            with self.assertNumQueries(10):
+                data = self.batch(*operations)
+            self.assertEqual(len(data['items']), count + 1)
+            self.batch(*[{'op': 'remove', 'id': item['cartItemId']} for item in data['items'][1:]])
+
+
+class GuestCartTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.shirt, self.dress = create_catalog(2)
+        Product.objects.update(current_stock=5)
+        self.token = self.client.post('/api/cart/guest/').data['token']
+        self.url = f'/api/cart/guest/{self.token}/'
+
+    def tearDown(self):
+        cache.clear()
+
+    def add(self, product, quantity, color="Red"):
+        return self.client.post(
+            self.url + 'add_item/',
+            {'product_id': product.pk, 'quantity': quantity, 'selected_color': color}, format='json',
+        )
+
+    def test_lines_by_product_color_and_size(self):
+        self.assertEqual(self.add(self.shirt, 2).status_code, status.HTTP_200_OK)
+        self.add(self.shirt, 1, color="Blue")
+        self.assertEqual(self.add(self.shirt, 1).data['error'], 'duplicate_item')
+        self.assertIn('quantity', self.add(self.dress, 6).data)
+        self.assertIn('product_id', self.client.post(self.url + 'add_item/', {'product_id': 999}).data)
+
+        response = self.client.post(
+            self.url + 'update_item/', {'product_id': self.shirt.pk, 'quantity': 4, 'selected_color': "Blue"}, format='json',
+        )
+        self.assertEqual([(item['selectedColor'], item['quantity']) for item in response.data], [("Red", 2), ("Blue", 4)])
+        response = self.client.post(self.url + 'remove_item/', {'product_id': self.shirt.pk, 'selected_color': "Red"}, format='json')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(self.client.post(self.url + 'clear/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(self.url).data, [])
+
+    def test_reads_do_not_query_the_database(self):
+        self.add(self.shirt, 2)
+        self.add(self.dress, 1)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual([item['id'] for item in response.data], [self.shirt.pk, self.dress.pk])
+        self.assertEqual(response.data[0]['category'], self.shirt.category.name)
+        self.assertEqual(len(response.data[0]['images']), 2)
+
+    def test_full_cart(self):
+        with mock.patch('cart.views.GUEST_CART_MAX_LINES', 1):
+            self.add(self.shirt, 1)
+            self.assertEqual(self.add(self.dress, 1).data['error'], 'cart_full')
+
+    def test_creation_and_writes_are_throttled(self):
+        with mock.patch.object(GuestCartCreateThrottle, 'THROTTLE_RATES', {'guest_cart_create': '2/hour'}):
+            self.assertEqual(self.client.post('/api/cart/guest/').status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.client.post('/api/cart/guest/').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        with mock.patch.object(GuestCartWriteThrottle, 'THROTTLE_RATES', {'guest_cart_write': '1/hour'}):
+            self.assertEqual(self.add(self.shirt, 1).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.add(self.dress, 1).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            # Reads are not limited.
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_unknown_token(self):
+        response = self.client.get(f'/api/cart/guest/{"x" * 32}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_merge_on_login(self):
+        user = User.objects.create_user(username="shopper", password="password123")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.shirt, quantity=4, selected_color="Red", selected_size="")
+        self.add(self.shirt, 3)
+        self.add(self.dress, 2, color="")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/user/auth/login/',
+                {'username': "shopper", 'password': "password123", 'guest_cart': self.token}, format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertEqual(
+            sorted(CartItem.objects.filter(cart=cart).values_list('product_id', 'selected_color', 'quantity')),
+            [(self.shirt.pk, "Red", 5), (self.dress.pk, "", 2)],
+        )
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CartAccessorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="shopper", password="password123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.shirt, = create_catalog(1)
+        Product.objects.update(current_stock=5)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_first_write_creates_the_cart(self):
+        self.assertEqual(self.client.get('/api/cart/cart/').data, [])
+        self.assertEqual(self.client.post('/api/cart/cart/clear/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        response = self.client.post(
+            '/api/cart/cart/add_item/',
+            {'product_id': self.shirt.pk, 'quantity': 1, 'selected_color': "", 'selected_size': ""}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CartItem.objects.get().cart, Cart.objects.get(user=self.user))
+
+    def test_cart_id_is_cached_across_requests(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.shirt, quantity=1, selected_color="", selected_size="")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/api/cart/cart/')
+        # items, tags, images
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/cart/cart/')
+        self.assertEqual(len(response.data), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.delete()
+        self.assertEqual(self.client.get('/api/cart/cart/').data, [])
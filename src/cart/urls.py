@@ -1,10 +1,11 @@
 # cart/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CartViewSet
+from .views import CartViewSet, GuestCartViewSet
 
 router = DefaultRouter()
 router.register(r'cart', CartViewSet, basename='cart')
+router.register(r'guest', GuestCartViewSet, basename='guest-cart')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -2,12 +2,35 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.throttling import AnonRateThrottle
 from django.db import IntegrityError
+from django.db.models import Prefetch
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
+from product.detail_cache import get_product_details
+from product.querysets import product_serializer_lookups
+from .batch import apply_cart_operations, line_key
+from .current import find_cart, get_or_create_cart
+from .guest import (
+    GUEST_CART_MAX_LINES, GUEST_TOKEN_REGEX, get_guest_cart, guest_cart_payload, new_guest_cart, save_guest_cart,
+)
 from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer, CartItemOutputSerializer
+from .serializers import (
+    CartSerializer, CartItemSerializer, CartItemOutputSerializer, CartBatchSerializer, CartBatchOutputSerializer,
+    GuestCartItemSerializer, GuestCartTokenSerializer, cart_item_payload,
+)
+
+
+def cart_item_queryset():
+    """
+    Cart items with everything cart_item_payload reads preloaded: the product
+    with its category in the same query, then its tags and images in one
+    query each, whatever the number of items.
+    """
+    select, prefetch = product_serializer_lookups('product')
+    return CartItem.objects.select_related(*select).prefetch_related(*prefetch).order_by('pk')
+
 
 class CartViewSet(viewsets.ModelViewSet):
     """
@@ -23,17 +46,29 @@ class CartViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Get the cart for the current user"""
-        return Cart.objects.filter(user=self.request.user)
-        
+        queryset = Cart.objects.filter(user=self.request.user)
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=cart_item_queryset()))
+        return queryset
+
+    def get_cart(self, create=False):
+        """
+        The current user's cart, resolved once per request through its cached
+        id (see cart.current). None if the user has no cart yet, unless
+        `create` is set: actions that write create the cart on first use.
+        """
+        if getattr(self, '_cart', None) is None:
+            self._cart = get_or_create_cart(self.request.user)[0] if create else find_cart(self.request.user)
+        return self._cart
+
     def create(self, request, *args, **kwargs):
         """
         Create or get cart for the current user.
         Instead of creating a new cart, returns existing cart if one exists.
+        Optional: the other actions create the cart when they first need it.
         """
-        cart, created = Cart.objects.get_or_create(
-            user=request.user,
-            defaults={'user_id': request.user.id}
-        )
+        cart, created = get_or_create_cart(request.user)
+        self._cart = cart
         serializer = self.get_serializer(cart)
         return Response(serializer.data, 
                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
@@ -57,9 +92,11 @@ class CartViewSet(viewsets.ModelViewSet):
         - Current stock levels
         - Images and other metadata
         """
-        cart = self.get_queryset().first()
-        serializer = CartItemSerializer(cart.items.all(), many=True)
-        return Response(serializer.data)
+        cart = self.get_cart()
+        if cart is None:
+            return Response([])
+        items = cart_item_queryset().filter(cart=cart)
+        return Response([cart_item_payload(item) for item in items])
 
     @extend_schema(
         summary="Add item to cart",
@@ -91,7 +128,7 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def add_item(self, request):
         """Add a new item to the cart"""
-        cart = self.get_queryset().first()
+        cart = self.get_cart(create=True)
         serializer = CartItemSerializer(data=request.data)
         
         try:
@@ -149,8 +186,10 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def update_item(self, request):
         """Update an existing cart item's quantity, color, or size"""
-        cart = self.get_queryset().first()
+        cart = self.get_cart()
         try:
+            if cart is None:
+                raise CartItem.DoesNotExist
             id = id = request.query_params.get('id')
             print(f"Updating item with ID: {id}")
             item = cart.items.get(id=id)
@@ -199,8 +238,10 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def remove_item(self, request):
         """Remove a specific item from the cart"""
-        cart = self.get_queryset().first()
+        cart = self.get_cart()
         try:
+            if cart is None:
+                raise CartItem.DoesNotExist
             item = cart.items.get(id=request.data.get('id'))
             item.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -210,6 +251,59 @@ class CartViewSet(viewsets.ModelViewSet):
                 "error": "item_not_found"
             }, status=status.HTTP_404_NOT_FOUND)
 
+    @extend_schema(
+        summary="Apply a batch of cart changes",
+        description=(
+            "Apply a list of add/update/remove operations in one request. Each operation follows the rules of "
+            "add_item, update_item and remove_item; failing operations are reported and skipped. Returns one "
+            "result per operation and the resulting cart items."
+        ),
+        request=CartBatchSerializer,
+        responses={
+            200: CartBatchOutputSerializer,
+            400: OpenApiResponse(
+                description="Bad Request",
+                examples=[
+                    OpenApiExample(
+                        "Duplicate Item",
+                        value={"message": "This item with the same color/size combination already exists in your cart", "error": "duplicate_item"}
+                    )
+                ]
+            ),
+            401: OpenApiResponse(description="Authentication credentials were not provided")
+        },
+        examples=[
+            OpenApiExample(
+                "Batch",
+                request_only=True,
+                value={"operations": [
+                    {"op": "add", "product_id": 1, "quantity": 2, "selected_color": "Red", "selected_size": "M"},
+                    {"op": "update", "id": 7, "quantity": 3},
+                    {"op": "remove", "id": 8}
+                ]}
+            )
+        ],
+        tags=['Cart Operations']
+    )
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Apply several add/update/remove operations to the cart at once"""
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = self.get_cart(create=True)
+        try:
+            results = apply_cart_operations(cart, serializer.validated_data['operations'])
+        except IntegrityError:
+            return Response({
+                "message": "This item with the same color/size combination already exists in your cart",
+                "error": "duplicate_item"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        items = cart_item_queryset().filter(cart=cart)
+        return Response({
+            "results": results,
+            "items": [cart_item_payload(item) for item in items]
+        })
+
     @extend_schema(
         summary="Clear cart",
         description="Remove all items from the cart",
@@ -222,6 +316,193 @@ class CartViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def clear(self, request):
         """Remove all items from the cart"""
-        cart = self.get_queryset().first()
-        cart.items.all().delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        cart = self.get_cart()
+        if cart is not None:
+            cart.items.all().delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+GUEST_CART_NOT_FOUND = {"message": "Guest cart not found or expired", "error": "cart_not_found"}
+
+
+class GuestCartCreateThrottle(AnonRateThrottle):
+    scope = 'guest_cart_create'
+
+
+class GuestCartWriteThrottle(AnonRateThrottle):
+    scope = 'guest_cart_write'
+
+
+class GuestCartViewSet(viewsets.ViewSet):
+    """
+    ViewSet for carts of anonymous visitors.
+
+    Guest carts live in the cache, keyed by an opaque token returned on
+    creation, and expire a week after their last change. Pass the token as
+    `guest_cart` to the login endpoint to merge the cart into the user's.
+    Reading a guest cart does not touch the database once its products are
+    in the product detail cache. Creating carts and changing them are rate
+    limited per client IP, and a cart holds at most GUEST_CART_MAX_LINES
+    lines, so anonymous clients cannot fill the shared cache.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    lookup_field = 'token'
+    lookup_value_regex = GUEST_TOKEN_REGEX
+
+    def get_throttles(self):
+        if self.action == 'create':
+            return [GuestCartCreateThrottle()]
+        if self.action in ('add_item', 'update_item', 'remove_item', 'clear'):
+            return [GuestCartWriteThrottle()]
+        return super().get_throttles()
+
+    def _update(self, token, change):
+        """Apply `change` to the cart's lines and return the cart, or a 404/400 response."""
+        lines = get_guest_cart(token)
+        if lines is None:
+            return Response(GUEST_CART_NOT_FOUND, status=status.HTTP_404_NOT_FOUND)
+        error = change(lines)
+        if error is not None:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        save_guest_cart(token, lines)
+        return Response(guest_cart_payload(lines))
+
+    def _validated_line(self, request):
+        serializer = GuestCartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        key = line_key(data['product_id'], data.get('selected_color'), data.get('selected_size'))
+        return key, data['quantity']
+
+    def _stock_error(self, product_id, quantity):
+        product = get_product_details([product_id]).get(product_id)
+        if product is None:
+            return {"product_id": ["Product not found"]}
+        if quantity > product['current_stock']:
+            return {"quantity": [f"Only {product['current_stock']} items available"]}
+        return None
+
+    @extend_schema(
+        summary="Create guest cart",
+        description="Start an empty cart for an anonymous visitor and return its token",
+        request=None,
+        responses={201: GuestCartTokenSerializer},
+        tags=['Guest Cart']
+    )
+    def create(self, request):
+        """Start a guest cart"""
+        return Response({"token": new_guest_cart()}, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary="Get guest cart items",
+        description="Items in a guest cart, in the same format as the cart items of signed-in users without cartItemId",
+        responses={
+            200: CartItemOutputSerializer(many=True),
+            404: OpenApiResponse(description="Guest cart not found or expired")
+        },
+        tags=['Guest Cart']
+    )
+    def retrieve(self, request, token=None):
+        """Get all items in a guest cart"""
+        lines = get_guest_cart(token)
+        if lines is None:
+            return Response(GUEST_CART_NOT_FOUND, status=status.HTTP_404_NOT_FOUND)
+        return Response(guest_cart_payload(lines))
+
+    @extend_schema(
+        summary="Add item to guest cart",
+        description="Add a product with optional color and size to a guest cart; returns the cart items",
+        request=GuestCartItemSerializer,
+        responses={
+            200: CartItemOutputSerializer(many=True),
+            400: OpenApiResponse(description="Duplicate item, unknown product, insufficient stock or full cart"),
+            404: OpenApiResponse(description="Guest cart not found or expired")
+        },
+        tags=['Guest Cart']
+    )
+    @action(detail=True, methods=['post'])
+    def add_item(self, request, token=None):
+        """Add a new item to a guest cart"""
+        key, quantity = self._validated_line(request)
+
+        def add(lines):
+            if key in lines:
+                return {
+                    "message": "This item with the same color/size combination already exists in your cart",
+                    "error": "duplicate_item"
+                }
+            if len(lines) >= GUEST_CART_MAX_LINES:
+                return {"message": f"A guest cart holds at most {GUEST_CART_MAX_LINES} items", "error": "cart_full"}
+            error = self._stock_error(key[0], quantity)
+            if error is None:
+                lines[key] = quantity
+            return error
+
+        return self._update(token, add)
+
+    @extend_schema(
+        summary="Update guest cart item",
+        description="Set the quantity of the guest cart line with this product, color and size; returns the cart items",
+        request=GuestCartItemSerializer,
+        responses={
+            200: CartItemOutputSerializer(many=True),
+            400: OpenApiResponse(description="Item not in the cart, or insufficient stock"),
+            404: OpenApiResponse(description="Guest cart not found or expired")
+        },
+        tags=['Guest Cart']
+    )
+    @action(detail=True, methods=['post'])
+    def update_item(self, request, token=None):
+        """Update the quantity of a guest cart item"""
+        key, quantity = self._validated_line(request)
+
+        def update(lines):
+            if key not in lines:
+                return {"message": "Item not found in cart", "error": "item_not_found"}
+            error = self._stock_error(key[0], quantity)
+            if error is None:
+                lines[key] = quantity
+            return error
+
+        return self._update(token, update)
+
+    @extend_schema(
+        summary="Remove item from guest cart",
+        description="Remove the guest cart line with this product, color and size; returns the cart items",
+        request=GuestCartItemSerializer,
+        responses={
+            200: CartItemOutputSerializer(many=True),
+            404: OpenApiResponse(description="Guest cart not found or expired")
+        },
+        tags=['Guest Cart']
+    )
+    @action(detail=True, methods=['post'])
+    def remove_item(self, request, token=None):
+        """Remove an item from a guest cart"""
+        key, _ = self._validated_line(request)
+
+        def remove(lines):
+            if lines.pop(key, None) is None:
+                return {"message": "Item not found in cart", "error": "item_not_found"}
+            return None
+
+        return self._update(token, remove)
+
+    @extend_schema(
+        summary="Clear guest cart",
+        description="Remove all items from a guest cart",
+        request=None,
+        responses={
+            204: OpenApiResponse(description="Cart successfully cleared"),
+            404: OpenApiResponse(description="Guest cart not found or expired")
+        },
+        tags=['Guest Cart']
+    )
+    @action(detail=True, methods=['post'])
+    def clear(self, request, token=None):
+        """Remove all items from a guest cart"""
+        if get_guest_cart(token) is None:
+            return Response(GUEST_CART_NOT_FOUND, status=status.HTTP_404_NOT_FOUND)
+        save_guest_cart(token, {})
+        return Response(status=status.HTTP_204_NO_CONTENT)
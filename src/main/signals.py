@@ -0,0 +1,33 @@
+# main/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from product.models import Category, Product, ProductImage, ProductTag, Tag
+from product.sections import UNTRACKED_FIELDS
+from product.signals import catalog_bulk_changed, scores_updated
+from .snapshot import invalidate_landing_snapshot
+
+# Models rendered on the landing page; any write to them bumps the snapshot version.
+LANDING_SOURCES = (Category, Product, ProductImage, ProductTag, Tag)
+
+
+def invalidate_landing_on_catalog_change(sender, **kwargs):
+    invalidate_landing_snapshot()
+
+
+for model in LANDING_SOURCES:
+    post_save.connect(invalidate_landing_on_catalog_change, sender=model)
+    post_delete.connect(invalidate_landing_on_catalog_change, sender=model)
+
+
+@receiver(catalog_bulk_changed)
+def invalidate_landing_on_bulk_write(sender, **kwargs):
+    invalidate_landing_snapshot()
+
+
+@receiver(scores_updated)
+def invalidate_landing_on_scores(sender, fields=None, **kwargs):
+    # Like sections, the snapshot does not rebuild for every view count flush;
+    # its views_count is as fresh as its last rebuild.
+    if fields is None or set(fields) - UNTRACKED_FIELDS:
+        invalidate_landing_snapshot()
@@ -0,0 +1,133 @@
+# main/snapshot.py
+
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from product.models import Category, Product
+from product.detail_cache import get_product_fragments
+from product.serializers import CategorySerializer
+
+VERSION_KEY = 'main:landing:version'
+SNAPSHOT_KEY = 'main:landing:snapshot'
+BUILD_LOCK_KEY = 'main:landing:build-lock'
+REBUILD_SCHEDULED_KEY = 'main:landing:rebuild-scheduled'
+
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+# How long one build may hold the single-flight lock, and how long other
+# requests wait for it before building for themselves (seconds).
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT = 5
+BUILD_POLL_INTERVAL = 0.05
+# Bursts of writes within this many seconds share one background rebuild.
+REBUILD_DELAY = 2
+
+logger = logging.getLogger(__name__)
+
+
+def build_landing_payload():
+    """
+    Returns:
+    - All categories
+    - 8 bestsellers (most ordered products)
+    - 8 trending products (highest time-decayed views/sales score)
+    - 8 new arrivals (recently added products)
+    """
+    categories = Category.objects.all()
+    products = Product.objects.for_fragments()
+    sections = {
+        "bestsellers": list(products.order_by('-sales_count')[:8]),
+        "trending": list(products.order_by('-trending_score')[:8]),
+        "new_arrivals": list(products.order_by('-created_at')[:8]),
+    }
+    # One fragment lookup for all three lists; only uncached products are serialized
+    fragments = get_product_fragments(product for section in sections.values() for product in section)
+    payload = {"categories": CategorySerializer(categories, many=True).data}
+    for name, section in sections.items():
+        payload[name] = [fragments[product.pk] for product in section]
+    return payload
+
+
+def current_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def rebuild_landing_snapshot():
+    """
+    Build the landing payload, render it to JSON once and store it in the cache
+    tagged with the data version it was built from. A build never replaces a
+    snapshot of a newer version. Returns the snapshot dict.
+    """
+    version = current_version()
+    body = JSONRenderer().render(build_landing_payload())
+    snapshot = {'version': version, 'body': body}
+    stored = cache.get(SNAPSHOT_KEY)
+    if stored is None or stored['version'] <= version:
+        cache.set(SNAPSHOT_KEY, snapshot, timeout=SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def get_landing_snapshot():
+    """
+    Return the pre-rendered landing snapshot, building it if the cache is cold.
+
+    A snapshot older than the current data version is still served while the
+    background rebuild runs (one is queued if none is pending). On a cold
+    cache only the request that wins the lock builds; the others wait for its
+    result, and only build for themselves if it takes longer than BUILD_WAIT.
+    """
+    cached = cache.get_many([SNAPSHOT_KEY, VERSION_KEY])
+    snapshot = cached.get(SNAPSHOT_KEY)
+    if snapshot is not None:
+        if snapshot['version'] != cached.get(VERSION_KEY):
+            try:
+                schedule_landing_rebuild()
+            except Exception:
+                logger.exception("Could not queue landing snapshot rebuild; serving stale snapshot")
+        return snapshot
+
+    if cache.add(BUILD_LOCK_KEY, True, timeout=BUILD_LOCK_TIMEOUT):
+        try:
+            return rebuild_landing_snapshot()
+        finally:
+            cache.delete(BUILD_LOCK_KEY)
+
+    deadline = time.monotonic() + BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+    return {'version': None, 'body': JSONRenderer().render(build_landing_payload())}
+
+
+def invalidate_landing_snapshot():
+    """
+    Bump the data version and queue one background rebuild after commit.
+    """
+    current_version()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key evicted between the two calls; start a fresh sequence.
+        cache.add(VERSION_KEY, 1, timeout=None)
+    transaction.on_commit(schedule_landing_rebuild)
+
+
+def schedule_landing_rebuild():
+    """
+    Queue a snapshot rebuild unless one is already pending. Returns True if queued.
+    """
+    from .tasks import rebuild_landing_snapshot as rebuild_task
+
+    if not cache.add(REBUILD_SCHEDULED_KEY, True, timeout=REBUILD_DELAY):
+        return False
+    try:
+        rebuild_task.apply_async(countdown=REBUILD_DELAY)
+    except Exception:
+        cache.delete(REBUILD_SCHEDULED_KEY)
+        raise
+    return True
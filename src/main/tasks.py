@@ -0,0 +1,13 @@
+# main/tasks.py
+
+from celery import shared_task
+from . import snapshot
+
+
+@shared_task
+def rebuild_landing_snapshot():
+    """
+    Task to rebuild the cached landing page snapshot after catalog changes.
+    Queued by main.snapshot.schedule_landing_rebuild.
+    """
+    return snapshot.rebuild_landing_snapshot()['version']
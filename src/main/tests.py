@@ -1,3 +1,79 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from main import snapshot
+from product.detail_cache import local_details
+from product.models import Category, Product
+from product.tests.test_query_budget import create_catalog
+
+
+class LandingSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Women")
+        self.product = Product.objects.create(category=self.category, name="Dress", price=40, sales_count=5)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_landing_payload(self):
+        response = self.client.get('/api/landing/')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([c['name'] for c in data['categories']], ["Women"])
+        self.assertEqual(data['bestsellers'][0]['name'], "Dress")
+        self.assertEqual(set(data), {'categories', 'bestsellers', 'trending', 'new_arrivals'})
+
+    def test_warm_snapshot_costs_no_queries(self):
+        self.client.get('/api/landing/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/landing/')
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch('product.tasks.recompute_dirty_trending_scores.apply_async')
+    @mock.patch('main.tasks.rebuild_landing_snapshot.apply_async')
+    def test_writes_bump_version_and_queue_one_rebuild(self, apply_async, _trending_apply_async):
+        snapshot.rebuild_landing_snapshot()
+        version = snapshot.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            for price in (41, 42, 43):
+                self.product.price = price
+                self.product.save()
+        self.assertGreater(snapshot.current_version(), version)
+        apply_async.assert_called_once_with(countdown=snapshot.REBUILD_DELAY)
+
+    def test_rebuild_picks_up_changes(self):
+        self.client.get('/api/landing/')
+        self.product.name = "Red Dress"
+        self.product.save()
+        snapshot.rebuild_landing_snapshot()
+        data = json.loads(self.client.get('/api/landing/').content)
+        self.assertEqual(data['bestsellers'][0]['name'], "Red Dress")
+
+    def test_single_flight_cold_cache(self):
+        # Another request holds the build lock: wait for its snapshot instead of building.
+        cache.add(snapshot.BUILD_LOCK_KEY, True)
+        built = {'version': 1, 'body': b'{}'}
+        with mock.patch('main.snapshot.time.sleep', side_effect=lambda _: cache.set(snapshot.SNAPSHOT_KEY, built)), \
+                mock.patch('main.snapshot.build_landing_payload') as build:
+            self.assertEqual(snapshot.get_landing_snapshot(), built)
+        build.assert_not_called()
+
 
-# Create your tests here.
+class LandingQueryBudgetTest(TestCase):
+    def test_snapshot_build_is_independent_of_catalog_size(self):
+        for size in (2, 12):
+            Product.objects.all().delete()
+            create_catalog(size)
+            cache.clear()
+            local_details.clear()
+            # categories + 3 product lists + images and tags of all listed products
+            with self.assertNumQueries(6):
+                snapshot.build_landing_payload()
+            # products already cached as fragments are not loaded again
+            with self.assertNumQueries(4):
+                snapshot.build_landing_payload()
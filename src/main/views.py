@@ -1,9 +1,8 @@
-from django.utils import timezone
+from django.http import HttpResponse
 from rest_framework.response import Response
 from rest_framework import status, generics
 from main.serializers import LandingPageSerializer
-from product.models import Category, Product
-from product.serializers import CategorySerializer, ProductSerializer
+from main.snapshot import get_landing_snapshot
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 
@@ -34,38 +33,16 @@ class LandingPageView(generics.GenericAPIView):
     )
     def get(self, request):
         """
-        Returns:
+        Serves the pre-rendered landing snapshot (see main.snapshot):
         - All categories
         - 8 bestsellers (most ordered products)
-        - 8 trending products (most viewed/carted)
+        - 8 trending products (highest time-decayed views/sales score)
         - 8 new arrivals (recently added products)
         """
         try:
-            # Fetch all categories
-            categories = Category.objects.all()
-            category_serializer = CategorySerializer(categories, many=True)
-            
-            # Fetch 8 bestsellers
-            bestsellers = Product.objects.order_by('-sales_count')[:8]
-            bestsellers_serializer = ProductSerializer(bestsellers, many=True)
-            
-            # Fetch 8 trending products
-            trending = Product.objects.order_by('-trending_score')[:8]
-            trending_serializer = ProductSerializer(trending, many=True)
-            
-            # Fetch 8 new arrivals
-            new_arrivals = Product.objects.order_by('-created_at')[:8]
-            new_arrivals_serializer = ProductSerializer(new_arrivals, many=True)
-            
-            data = {
-                "categories": category_serializer.data,
-                "bestsellers": bestsellers_serializer.data,
-                "trending": trending_serializer.data,
-                "new_arrivals": new_arrivals_serializer.data
-            }
-            
-            return Response(data, status=status.HTTP_200_OK)
-            
+            snapshot = get_landing_snapshot()
+            return HttpResponse(snapshot['body'], content_type='application/json', status=status.HTTP_200_OK)
+
         except Exception as e:
             return Response(
                 {"error": "Failed to fetch landing page data"},
@@ -143,6 +143,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Per client IP, for the anonymous guest cart endpoints.
+    'DEFAULT_THROTTLE_RATES': {
+        'guest_cart_create': '30/hour',
+        'guest_cart_write': '300/hour',
+    },
 }
 
 
@@ -152,6 +157,7 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'user.serializers.GuestCartTokenObtainPairSerializer',
 }
 AUTH_USER_MODEL = 'user.CustomUser'
 
@@ -160,6 +166,24 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Redis as the message broker
 CELERY_ACCEPT_CONTENT = ['json']  # Accept JSON-encoded messages
 CELERY_TASK_SERIALIZER = 'json'  # Serialize tasks in JSON format
 
+# Cache
+# Web and celery processes coordinate through the cache (coalescing locks,
+# scheduled-task markers), so production should point it at a shared Redis.
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
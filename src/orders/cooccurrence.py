@@ -0,0 +1,107 @@
+# orders/cooccurrence.py
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from product.models import ProductCoOccurrence, ProductNeighbours
+from .models import Order, OrderItem, RollupCheckpoint
+from .rollups import ROLLUP_LAG, WRITE_BATCH_SIZE
+
+COOCCURRENCE_CHECKPOINT = 'product_cooccurrence'
+# Neighbours kept per product.
+NEIGHBOURS_SIZE = 20
+
+
+def order_pair_counts(lower, upper):
+    """
+    {(product id, related id): orders} for orders with ids in (lower, upper].
+
+    One self-join of the orders' items grouped by product pair, so the sparse
+    matrix delta is summed by the database instead of a Python loop over
+    every pair of every order. Lines without a product and repeated lines of
+    the same product count once per order.
+    """
+    rows = (
+        OrderItem.objects.filter(order_id__gt=lower, order_id__lte=upper, product__isnull=False)
+        .annotate(related=F('order__items__product'))
+        .filter(related__isnull=False)
+        .exclude(related=F('product_id'))
+        .values('product_id', 'related')
+        .annotate(orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+    return {(row['product_id'], row['related']): row['orders'] for row in rows}
+
+
+def top_neighbours(product_ids, size):
+    """{product id: [[related id, orders], ...]} for the `size` best pairs of each product."""
+    ranked = (
+        ProductCoOccurrence.objects.filter(product_id__in=product_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=F('product_id'), order_by=[F('orders').desc(), F('related_id')]))
+        .filter(rank__lte=size)
+        .order_by('product_id', 'rank')
+        .values_list('product_id', 'related_id', 'orders')
+    )
+    neighbours = {pk: [] for pk in product_ids}
+    for product_id, related_id, orders in ranked:
+        neighbours[product_id].append([related_id, orders])
+    return neighbours
+
+
+def build_product_cooccurrence(now=None):
+    """
+    Fold orders placed since the last run into the product co-occurrence
+    matrix (ProductCoOccurrence) and refresh ProductNeighbours for every
+    product they touch.
+
+    Orders are scanned by id range (checkpoint, upper], lagging ROLLUP_LAG
+    behind like the order rollups. The new pair counts are added to the
+    stored ones and each touched product's neighbours are re-ranked with one
+    windowed query; the checkpoint moves in the same transaction, so a failed
+    run is simply retried.
+
+    Returns a dict with the number of orders scanned and products refreshed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=COOCCURRENCE_CHECKPOINT)
+        upper = Order.objects.filter(
+            pk__gt=checkpoint.position, created_at__lte=now - ROLLUP_LAG
+        ).aggregate(upper=Max('pk'))['upper']
+        if upper is None:
+            return {'orders': 0, 'products': 0}
+
+        order_count = Order.objects.filter(pk__gt=checkpoint.position, pk__lte=upper).count()
+        delta = order_pair_counts(checkpoint.position, upper)
+        touched = sorted({product_id for product_id, _ in delta})
+        if touched:
+            existing = {
+                (product_id, related_id): orders
+                for product_id, related_id, orders in ProductCoOccurrence.objects
+                .filter(product_id__in=touched, related_id__in=touched)
+                .values_list('product_id', 'related_id', 'orders')
+            }
+            ProductCoOccurrence.objects.bulk_create(
+                [
+                    ProductCoOccurrence(product_id=product_id, related_id=related_id, orders=existing.get((product_id, related_id), 0) + orders)
+                    for (product_id, related_id), orders in delta.items()
+                ],
+                batch_size=WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['product', 'related'],
+                update_fields=['orders'],
+            )
+            ProductNeighbours.objects.bulk_create(
+                [ProductNeighbours(product_id=pk, neighbours=neighbours) for pk, neighbours in top_neighbours(touched, NEIGHBOURS_SIZE).items()],
+                batch_size=WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['neighbours', 'updated_at'],
+            )
+
+        checkpoint.position = upper
+        checkpoint.save(update_fields=['position', 'updated_at'])
+
+    return {'orders': order_count, 'products': len(touched)}
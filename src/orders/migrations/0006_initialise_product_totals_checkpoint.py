@@ -0,0 +1,76 @@
+# Generated by Django 5.1.7 on 2026-10-18 11:02
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.utils import timezone
+
+
+def merge_order_totals(info, units, revenue, orders, last_ordered_at):
+    # A copy of orders.rollups.merge_order_totals as of this migration.
+    info = dict(info or {})
+    previous_last = info.get('last_ordered_at')
+    last = last_ordered_at.isoformat() if last_ordered_at else None
+    if previous_last and (last is None or previous_last > last):
+        last = previous_last
+    return {
+        'total_units': info.get('total_units', 0) + units,
+        'total_revenue': float(
+            (Decimal(str(info.get('total_revenue', 0))) + revenue).quantize(Decimal('0.01'))
+        ),
+        'total_orders': info.get('total_orders', 0) + orders,
+        'last_ordered_at': last,
+    }
+
+
+def fold_existing_orders(apps, schema_editor):
+    # Fold the orders placed before the rollup existed into
+    # aggregated_order_info in one pass at migrate time, and start the
+    # checkpoint after them, so the first scheduled run only sees new orders.
+    OrderItem = apps.get_model("orders", "OrderItem")
+    Product = apps.get_model("product", "Product")
+    RollupCheckpoint = apps.get_model("orders", "RollupCheckpoint")
+
+    checkpoint, _ = RollupCheckpoint.objects.get_or_create(name='product_order_totals')
+    upper = OrderItem.objects.filter(pk__gt=checkpoint.position).aggregate(upper=Max('pk'))['upper']
+    if upper is None:
+        return
+    rows = (
+        OrderItem.objects.filter(pk__gt=checkpoint.position, pk__lte=upper, product__isnull=False)
+        .values('product_id')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(ExpressionWrapper(
+                F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)
+            )),
+            orders=Count('order', distinct=True),
+            last_ordered_at=Max('order__created_at'),
+        )
+        .order_by()
+    )
+    totals = {row['product_id']: row for row in rows}
+    now = timezone.now()
+    products = Product.objects.only('aggregated_order_info').in_bulk(list(totals))
+    for pk, product in products.items():
+        row = totals[pk]
+        product.aggregated_order_info = merge_order_totals(
+            product.aggregated_order_info,
+            row['units'], Decimal(row['revenue'] or 0), row['orders'], row['last_ordered_at'],
+        )
+        product.updated_at = now
+    Product.objects.bulk_update(products.values(), ['aggregated_order_info', 'updated_at'], batch_size=500)
+    checkpoint.position = upper
+    checkpoint.save(update_fields=['position', 'updated_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_stock_conflict_status'),
+        ('product', '0011_product_cooccurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_existing_orders, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,7 @@ class Order(models.Model):
         ("shipped", "Shipped"),
         ("delivered", "Delivered"),
         ("cancelled", "Cancelled"),
+        ("stock_conflict", "Paid, out of stock"),
     ]
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     payment_intent_id = models.CharField(max_length=100, unique=True)
@@ -30,4 +31,32 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     color = models.CharField(max_length=50, blank=True, default="Default")
-    size = models.CharField(max_length=50, blank=True, default="Default")
\ No newline at end of file
+    size = models.CharField(max_length=50, blank=True, default="Default")
+
+
+class RollupCheckpoint(models.Model):
+    """
+    High-water mark for batch jobs that scan orders incrementally.
+    `position` is the last primary key the job named `name` has processed.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock taken from a product for a pending order. Confirmed (deleted, the
+    stock staying taken) when the order is paid; after `expires_at`, the
+    sweep in orders.reservations gives the stock back.
+    """
+    order = models.ForeignKey(Order, related_name="reservations", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="+", on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id}"
@@ -0,0 +1,172 @@
+# orders/reservations.py
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from product.models import Product
+from product.signals import scores_updated
+from .models import Order, OrderItem, StockReservation
+
+# How long a pending order holds its stock before the sweep returns it.
+RESERVATION_TIMEOUT = timedelta(minutes=30)
+SWEEP_BATCH_SIZE = 500
+# Status of paid orders whose stock had been released and was sold meanwhile;
+# staff refund or restock them.
+STOCK_CONFLICT_STATUS = 'stock_conflict'
+
+
+class InsufficientStock(Exception):
+    """Raised by reserve_stock; `shortages` maps each short product id to the stock it has."""
+
+    def __init__(self, shortages):
+        super().__init__(f"Insufficient stock for products {sorted(shortages)}")
+        self.shortages = shortages
+
+
+def _lock_stock(product_ids):
+    """
+    {pk: current_stock} for `product_ids`, with their rows locked until the
+    transaction ends. Every stock writer here locks in id order, with one
+    query, so concurrent checkouts and sweeps queue on the rows they share
+    instead of deadlocking.
+    """
+    return dict(
+        Product.objects.select_for_update().filter(pk__in=list(product_ids))
+        .order_by('pk').values_list('pk', 'current_stock')
+    )
+
+
+def _adjust_stock(changes, now):
+    """Add `changes` ({pk: delta}) to current_stock in one UPDATE, on rows locked by _lock_stock."""
+    Product.objects.filter(pk__in=list(changes)).update(
+        current_stock=F('current_stock') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in changes.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        # Queryset updates skip auto_now; the change feed reads updated_at.
+        updated_at=now,
+    )
+    # Product detail, sections, facets and the landing snapshot render or filter on stock
+    scores_updated.send(sender=Product, product_ids=list(changes), fields=['current_stock', 'updated_at'])
+
+
+def _take_stock(quantities, now):
+    """
+    Lock the products of `quantities` ({product id: quantity}), check every
+    line and decrement them all, or raise InsufficientStock listing every
+    short product (unknown products count as out of stock).
+    """
+    stock = _lock_stock(quantities)
+    shortages = {pk: stock.get(pk, 0) for pk, quantity in quantities.items() if quantity > stock.get(pk, 0)}
+    if shortages:
+        raise InsufficientStock(shortages)
+    _adjust_stock({pk: -quantity for pk, quantity in quantities.items()}, now)
+
+
+def reserve_stock(order, quantities, now=None):
+    """
+    Take `quantities` ({product id: quantity}) out of stock for `order` and
+    record them as StockReservations expiring after RESERVATION_TIMEOUT.
+
+    The products are locked, every line is checked against their stock and
+    all of them are decremented with one UPDATE, in one transaction (a
+    savepoint if the caller's is open). If any line is short, nothing changes
+    and InsufficientStock lists every short product; unknown products count
+    as out of stock.
+    """
+    now = now or timezone.now()
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return []
+    with transaction.atomic():
+        _take_stock(quantities, now)
+        return StockReservation.objects.bulk_create([
+            StockReservation(order=order, product_id=pk, quantity=quantity, expires_at=now + RESERVATION_TIMEOUT)
+            for pk, quantity in sorted(quantities.items())
+        ])
+
+
+def confirm_reservations(order_id):
+    """
+    Keep the stock reserved for an order: its reservations are deleted, so
+    the sweep no longer returns them. Returns the number confirmed, 0 if the
+    order had none or they had expired and been released already.
+    """
+    deleted, _ = StockReservation.objects.filter(order_id=order_id).delete()
+    return deleted
+
+
+def confirm_paid_order(order_id, now=None):
+    """
+    Mark a pending order paid and keep its stock. Returns the order's new
+    status; orders that are no longer pending (a repeated payment event) are
+    left alone. Raises Order.DoesNotExist for unknown ids.
+
+    The order row is locked first, so repeated events for one order run one
+    after the other. Its reservations are confirmed; if the sweep released
+    them already, the order's lines are taken out of stock again under the
+    same product locks. If they have been sold meanwhile, the order gets
+    STOCK_CONFLICT_STATUS instead of overselling.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+        if order.status != 'pending':
+            return order.status
+        if not confirm_reservations(order.pk):
+            quantities = dict(
+                OrderItem.objects.filter(order=order, product__isnull=False)
+                .values('product_id').annotate(total=Sum('quantity'))
+                .order_by().values_list('product_id', 'total')
+            )
+            if quantities:
+                try:
+                    with transaction.atomic():
+                        _take_stock(quantities, now)
+                except InsufficientStock:
+                    order.status = STOCK_CONFLICT_STATUS
+        if order.status == 'pending':
+            order.status = 'paid'
+        order.save(update_fields=['status'])
+    return order.status
+
+
+def release_expired_reservations(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Give back the stock of reservations past their expiry, for orders whose
+    payment never came.
+
+    Works through batches of `batch_size` reservations, each in its own
+    transaction: the batch is locked (skipping rows a concurrent sweep or
+    confirmation holds), its quantities are summed per product and returned
+    with one UPDATE under the same id-ordered product locks as reserve_stock,
+    and its rows are deleted. Returns the number of reservations and
+    products released.
+    """
+    now = now or timezone.now()
+    released = 0
+    products = set()
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('pk')
+                .values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not batch:
+                break
+            totals = defaultdict(int)
+            for _, product_id, quantity in batch:
+                totals[product_id] += quantity
+            _lock_stock(totals)
+            _adjust_stock(totals, now)
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+        released += len(batch)
+        products.update(totals)
+    return {'reservations': released, 'products': len(products)}
@@ -1,6 +1,11 @@
+from collections import defaultdict
+
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem
-from product.serializers import ProductSerializer
+from product.detail_cache import ProductFragmentField
+from product.trending import record_activity
+from .reservations import InsufficientStock, reserve_stock
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -9,7 +14,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         source='product',
         write_only=True
     )
-    product = ProductSerializer(read_only=True)
+    product = ProductFragmentField()
     order = serializers.PrimaryKeyRelatedField(read_only=True) 
 
     class Meta:
@@ -32,7 +37,20 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
-        return order
\ No newline at end of file
+        sales = defaultdict(int)
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            for item_data in items_data:
+                OrderItem.objects.create(order=order, **item_data)
+                if item_data.get('product') is not None:
+                    sales[item_data['product'].pk] += item_data['quantity']
+            # Hold the stock until the payment arrives; short lines fail the whole order
+            try:
+                reserve_stock(order, sales)
+            except InsufficientStock as e:
+                raise serializers.ValidationError({
+                    "items": [f"Only {available} items of product {pk} available" for pk, available in sorted(e.shortages.items())]
+                })
+        # Feed the hourly trending buckets
+        record_activity({pk: (0, quantity) for pk, quantity in sales.items()})
+        return order
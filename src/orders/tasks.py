@@ -0,0 +1,43 @@
+# orders/tasks.py
+
+import logging
+
+from celery import shared_task
+from .cooccurrence import build_product_cooccurrence
+from .reservations import release_expired_reservations
+from .rollups import rollup_product_order_totals
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def rollup_order_totals():
+    """
+    Task to fold new order items into Product.aggregated_order_info.
+    Schedule it periodically (e.g., every 5 minutes) via Celery beat.
+    """
+    stats = rollup_product_order_totals()
+    logger.info("Order rollup: items=%(items)d products=%(products)d", stats)
+    return stats
+
+
+@shared_task
+def build_product_cooccurrence_index():
+    """
+    Task to fold new orders into the frequently-bought-together index.
+    Schedule it periodically (e.g., hourly) via Celery beat.
+    """
+    stats = build_product_cooccurrence()
+    logger.info("Co-occurrence build: orders=%(orders)d products=%(products)d", stats)
+    return stats
+
+
+@shared_task
+def release_expired_stock_reservations():
+    """
+    Task to give back the stock of orders whose payment never came.
+    Schedule it periodically (e.g., every minute) via Celery beat.
+    """
+    stats = release_expired_reservations()
+    logger.info("Stock reservations released: reservations=%(reservations)d products=%(products)d", stats)
+    return stats
@@ -1,3 +1,309 @@
+from datetime import timedelta
+from importlib import import_module
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from orders.cooccurrence import build_product_cooccurrence
+from orders.models import Order, OrderItem, RollupCheckpoint, StockReservation
+from orders.reservations import (
+    RESERVATION_TIMEOUT, STOCK_CONFLICT_STATUS, InsufficientStock, confirm_paid_order, confirm_reservations,
+    release_expired_reservations, reserve_stock,
+)
+from orders.rollups import PRODUCT_TOTALS_CHECKPOINT, rollup_product_order_totals
+from main.snapshot import current_version as landing_version
+from product.detail_cache import detail_stamp
+from product.facets import current_version as facets_version
+from product.models import Product, ProductCoOccurrence, ProductNeighbours
+from product.sections import section_key
+from product.tests.test_query_budget import create_catalog
+
+
+class ProductOrderRollupTest(TestCase):
+    def setUp(self):
+        self.phone = Product.objects.create(name="Phone", price=100, sales_count=3)
+        self.case = Product.objects.create(name="Case", price=10)
+        self.later = timezone.now() + timedelta(hours=1)
+
+    def create_order(self, intent, items):
+        order = Order.objects.create(
+            payment_intent_id=intent, amount=0, currency="aud", shipping_info={},
+            subtotal=0, shipping=0, total=0,
+        )
+        for product, quantity, price in items:
+            OrderItem.objects.create(order=order, product=product, name=product.name, quantity=quantity, price=price)
+        return order
+
+    def test_totals_use_price_paid(self):
+        self.create_order("pi_1", [(self.phone, 2, Decimal("90.00")), (self.case, 1, Decimal("10.00"))])
+        self.create_order("pi_2", [(self.phone, 1, Decimal("95.50"))])
+
+        updated_at = self.phone.updated_at
+        stats = rollup_product_order_totals(now=self.later)
+
+        self.assertEqual(stats, {'items': 3, 'products': 2})
+        self.phone.refresh_from_db()
+        info = self.phone.aggregated_order_info
+        self.assertEqual(info['total_units'], 3)
+        self.assertEqual(info['total_revenue'], 275.5)
+        self.assertEqual(info['total_orders'], 2)
+        self.assertIsNotNone(info['last_ordered_at'])
+        # sales_count is not derived from orders.
+        self.assertEqual(self.phone.sales_count, 3)
+        # The change feed picks rolled-up products up again.
+        self.assertGreater(self.phone.updated_at, updated_at)
+
+    def test_runs_are_incremental(self):
+        self.create_order("pi_1", [(self.case, 1, Decimal("10.00"))])
+        rollup_product_order_totals(now=self.later)
+        self.assertEqual(rollup_product_order_totals(now=self.later), {'items': 0, 'products': 0})
+
+        self.create_order("pi_2", [(self.case, 4, Decimal("8.00"))])
+        rollup_product_order_totals(now=self.later)
+
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.aggregated_order_info['total_units'], 5)
+        self.assertEqual(self.case.aggregated_order_info['total_revenue'], 42.0)
+        self.assertEqual(self.case.aggregated_order_info['total_orders'], 2)
+
+    def test_migration_folds_existing_orders_once(self):
+        migration = import_module('orders.migrations.0006_initialise_product_totals_checkpoint')
+        self.create_order("pi_1", [(self.phone, 2, Decimal("90.00"))])
+        migration.fold_existing_orders(apps, None)
+        self.create_order("pi_2", [(self.phone, 1, Decimal("95.00"))])
+        rollup_product_order_totals(now=self.later)
+
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.aggregated_order_info['total_units'], 3)
+        self.assertEqual(self.phone.aggregated_order_info['total_revenue'], 275.0)
+        self.assertEqual(self.phone.aggregated_order_info['total_orders'], 2)
+
+    def test_recent_orders_wait_for_next_run(self):
+        self.create_order("pi_1", [(self.case, 1, Decimal("10.00"))])
+        self.assertEqual(rollup_product_order_totals(), {'items': 0, 'products': 0})
+        self.assertEqual(RollupCheckpoint.objects.get(name=PRODUCT_TOTALS_CHECKPOINT).position, 0)
+
+    def test_product_save_leaves_totals_alone(self):
+        self.phone.name = "Phone 2"
+        self.phone.save()
+        self.phone.refresh_from_db()
+        self.assertIsNone(self.phone.aggregated_order_info)
+
+
+class OrderQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="buyer", password="password123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_orders(self, count):
+        products = create_catalog(count)
+        for i, product in enumerate(products):
+            order = Order.objects.create(
+                user=self.user, payment_intent_id=f"pi_{count}_{i}", amount=10, currency="aud",
+                shipping_info={}, subtotal=10, shipping=0, total=10,
+            )
+            for _ in range(2):
+                OrderItem.objects.create(order=order, product=product, name=product.name, quantity=1, price=10)
+
+    def test_order_list(self):
+        # orders, items (+products), product images, product tags
+        for count in (2, 8):
+            Order.objects.all().delete()
+            self.create_orders(count)
+            with self.assertNumQueries(4):
+                response = self.client.get('/api/orders/orders/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), count)
+
+
+class ProductCoOccurrenceTest(TestCase):
+    def setUp(self):
+        self.dress, self.belt, self.bag, self.hat = [
+            Product.objects.create(name=name, description="", price=10) for name in ("Dress", "Belt", "Bag", "Hat")
+        ]
+        self.later = timezone.now() + timedelta(hours=1)
+        self.orders = 0
+
+    def order(self, *products):
+        self.orders += 1
+        order = Order.objects.create(
+            payment_intent_id=f"pi_{self.orders}", amount=0, currency="aud", shipping_info={},
+            subtotal=0, shipping=0, total=0,
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, name="", quantity=1, price=10)
+
+    def neighbours(self, product):
+        return ProductNeighbours.objects.get(product=product).neighbours
+
+    def test_counts_orders_per_pair(self):
+        self.order(self.dress, self.belt, self.belt)
+        self.order(self.dress, self.belt, self.bag)
+        self.order(self.hat, None)
+
+        self.assertEqual(build_product_cooccurrence(now=self.later), {'orders': 3, 'products': 3})
+        self.assertEqual(self.neighbours(self.dress), [[self.belt.pk, 2], [self.bag.pk, 1]])
+        self.assertEqual(self.neighbours(self.bag), [[self.dress.pk, 1], [self.belt.pk, 1]])
+        self.assertFalse(ProductNeighbours.objects.filter(product=self.hat).exists())
+
+    def test_runs_are_incremental(self):
+        self.order(self.dress, self.bag)
+        build_product_cooccurrence(now=self.later)
+        self.assertEqual(build_product_cooccurrence(now=self.later), {'orders': 0, 'products': 0})
+
+        self.order(self.dress, self.belt)
+        self.order(self.dress, self.belt)
+        self.assertEqual(build_product_cooccurrence(now=self.later), {'orders': 2, 'products': 2})
+        self.assertEqual(self.neighbours(self.dress), [[self.belt.pk, 2], [self.bag.pk, 1]])
+        self.assertEqual(ProductCoOccurrence.objects.get(product=self.dress, related=self.bag).orders, 1)
+
+    def test_keeps_top_neighbours(self):
+        self.order(self.dress, self.belt, self.bag, self.hat)
+        self.order(self.dress, self.hat)
+        with mock.patch('orders.cooccurrence.NEIGHBOURS_SIZE', 2):
+            build_product_cooccurrence(now=self.later)
+        self.assertEqual(self.neighbours(self.dress), [[self.hat.pk, 2], [self.belt.pk, 1]])
+
+    def test_related_endpoint(self):
+        self.order(self.dress, self.belt)
+        self.order(self.dress, self.belt, self.bag)
+        build_product_cooccurrence(now=self.later)
+        self.bag.delete()
+
+        response = APIClient().get(f'/api/product/products/{self.dress.pk}/related/')
+        self.assertEqual([p['name'] for p in response.data], ["Belt"])
+        self.assertEqual(APIClient().get(f'/api/product/products/{self.hat.pk}/related/').data, [])
+        self.assertEqual(APIClient().get('/api/product/products/999999/related/').status_code, 404)
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.dress = Product.objects.create(name="Dress", description="", price=10, current_stock=5)
+        self.belt = Product.objects.create(name="Belt", description="", price=10, current_stock=1)
+        self.orders = 0
+
+    def order(self):
+        self.orders += 1
+        return Order.objects.create(
+            payment_intent_id=f"pi_{self.orders}", amount=0, currency="aud", shipping_info={},
+            subtotal=0, shipping=0, total=0,
+        )
+
+    def stock(self):
+        return dict(Product.objects.values_list('name', 'current_stock'))
+
+    def test_reserves_all_lines_or_none(self):
+        order = self.order()
+        reserve_stock(order, {self.dress.pk: 2, self.belt.pk: 1})
+        self.assertEqual(self.stock(), {"Dress": 3, "Belt": 0})
+        self.assertEqual(
+            sorted(StockReservation.objects.filter(order=order).values_list('product_id', 'quantity')),
+            [(self.dress.pk, 2), (self.belt.pk, 1)],
+        )
+
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock(self.order(), {self.dress.pk: 3, self.belt.pk: 1, 999: 1})
+        self.assertEqual(raised.exception.shortages, {self.belt.pk: 0, 999: 0})
+        self.assertEqual(self.stock(), {"Dress": 3, "Belt": 0})
+        self.assertEqual(StockReservation.objects.count(), 2)
+
+    def test_query_count_is_constant(self):
+        products = create_catalog(10)
+        Product.objects.update(current_stock=5)
+        # savepoint, lock, update, insert, release
+        for quantities in ({self.dress.pk: 1}, {product.pk: 2 for product in products}):
+            order = self.order()
+            with self.assertNumQueries(5):
+                reserve_stock(order, quantities)
+
+    def test_sweep_releases_expired_reservations(self):
+        now = timezone.now()
+        for _ in range(3):
+            reserve_stock(self.order(), {self.dress.pk: 1}, now=now - RESERVATION_TIMEOUT)
+        paid = self.order()
+        reserve_stock(paid, {self.dress.pk: 1, self.belt.pk: 1}, now=now - RESERVATION_TIMEOUT)
+        reserve_stock(self.order(), {self.dress.pk: 1}, now=now)
+        self.assertEqual(confirm_reservations(paid.pk), 2)
+
+        stats = release_expired_reservations(now=now, batch_size=2)
+        self.assertEqual(stats, {'reservations': 3, 'products': 1})
+        self.assertEqual(self.stock(), {"Dress": 3, "Belt": 0})
+        self.assertEqual(StockReservation.objects.count(), 1)
+        self.assertEqual(confirm_reservations(paid.pk), 0)
+
+    def test_stock_changes_invalidate_caches(self):
+        def versions():
+            return (
+                facets_version(), landing_version(), detail_stamp(self.dress.pk), section_key('bestsellers'),
+            )
+
+        before = versions()
+        reserve_stock(self.order(), {self.dress.pk: 1}, now=timezone.now() - RESERVATION_TIMEOUT)
+        reserved = versions()
+        release_expired_reservations()
+        released = versions()
+        for old, new in zip(before, reserved):
+            self.assertNotEqual(old, new)
+        for old, new in zip(reserved, released):
+            self.assertNotEqual(old, new)
+
+    def paid_after_expiry(self, quantity):
+        now = timezone.now()
+        order = self.order()
+        OrderItem.objects.create(order=order, product=self.dress, name="Dress", quantity=quantity, price=10)
+        reserve_stock(order, {self.dress.pk: quantity}, now=now - RESERVATION_TIMEOUT)
+        release_expired_reservations(now=now)
+        self.assertEqual(self.stock()["Dress"], 5)
+        return order
+
+    def test_payment_confirms_reservations(self):
+        order = self.order()
+        reserve_stock(order, {self.dress.pk: 2})
+        self.assertEqual(confirm_paid_order(order.pk), 'paid')
+        # A repeated event changes nothing
+        self.assertEqual(confirm_paid_order(order.pk), 'paid')
+        self.assertEqual(self.stock()["Dress"], 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_paid_after_expiry_takes_stock_again(self):
+        order = self.paid_after_expiry(2)
+        self.assertEqual(confirm_paid_order(order.pk), 'paid')
+        self.assertEqual(self.stock()["Dress"], 3)
+        self.assertEqual(confirm_paid_order(order.pk), 'paid')
+        self.assertEqual(self.stock()["Dress"], 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_paid_after_expiry_and_sold_out_is_flagged(self):
+        order = self.paid_after_expiry(2)
+        reserve_stock(self.order(), {self.dress.pk: 4})
+        self.assertEqual(confirm_paid_order(order.pk), STOCK_CONFLICT_STATUS)
+        self.assertEqual(self.stock()["Dress"], 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, STOCK_CONFLICT_STATUS)
+
+    def test_checkout_reserves_stock(self):
+        client = APIClient()
+        client.force_authenticate(user=get_user_model().objects.create_user(username="shopper", password="password123"))
+
+        def checkout(intent, quantity):
+            return client.post('/api/orders/orders/', {
+                'payment_intent_id': intent, 'amount': "20.00", 'currency': "aud", 'shipping_info': {},
+                'subtotal': "20.00", 'shipping': "0.00", 'total': "20.00",
+                'items': [
+                    {'product_id': self.dress.pk, 'name': "Dress", 'quantity': quantity, 'price': "10.00"},
+                    {'product_id': self.belt.pk, 'name': "Belt", 'quantity': 1, 'price': "10.00"},
+                ],
+            }, format='json')
 
-# Create your tests here.
+        with mock.patch('orders.serializers.record_activity'):
+            self.assertEqual(checkout("pi_a", 2).status_code, 201)
+            response = checkout("pi_b", 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'], [f"Only 0 items of product {self.belt.pk} available"])
+        self.assertEqual(self.stock(), {"Dress": 3, "Belt": 0})
+        self.assertEqual(list(Order.objects.values_list('payment_intent_id', flat=True)), ["pi_a"])
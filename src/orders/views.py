@@ -1,14 +1,37 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets, permissions
+from rest_framework.response import Response
+from product.detail_cache import get_product_fragments
+from product.querysets import product_serializer_lookups
 from .models import Order, OrderItem
 from .serializers import OrderSerializer, OrderItemSerializer
 
 
+def order_list_queryset():
+    """
+    Orders with items and their products preloaded for OrderSerializer. Product
+    images and tags come with the cached fragments (see list()).
+    """
+    select, _ = product_serializer_lookups('product')
+    items = OrderItem.objects.select_related(*select)
+    return Order.objects.prefetch_related(Prefetch('items', queryset=items))
+
+
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().select_related('manufacturer', 'user').prefetch_related('items')
+    queryset = order_list_queryset()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        orders = list(self.filter_queryset(self.get_queryset()))
+        # Every product on the page in one fragment lookup, rendered by ProductFragmentField
+        context = self.get_serializer_context()
+        context['product_fragments'] = get_product_fragments(
+            item.product for order in orders for item in order.items.all() if item.product is not None
+        )
+        return Response(OrderSerializer(orders, many=True, context=context).data)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -16,8 +39,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Users see their own orders; staff see all
         user = self.request.user
         if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=user)
+            return order_list_queryset()
+        return order_list_queryset().filter(user=user)
 
 # class OrderItemViewSet(viewsets.ModelViewSet):
 #     queryset = OrderItem.objects.all().select_related('order', 'product')
@@ -5,6 +5,8 @@ from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import ListAPIView
 
+from orders.models import Order
+from orders.reservations import STOCK_CONFLICT_STATUS, confirm_paid_order
 from .models import Payment
 from .serializers import PaymentSerializer, CreatePaymentIntentSerializer
 from drf_spectacular.types import OpenApiTypes
@@ -13,6 +15,8 @@ from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParamete
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 
+import logging
+
 import stripe
 
 
@@ -21,6 +25,8 @@ from django.conf import settings
 
 from drf_spectacular.utils import extend_schema
 
+logger = logging.getLogger(__name__)
+
 class CreatePaymentIntentView(APIView):
     @extend_schema(
         request=CreatePaymentIntentSerializer,
@@ -127,6 +133,13 @@ class StripeWebhookView(generics.GenericAPIView):
                 currency=intent.currency,
                 status=intent.status,
             )
+            # Keep the stock reserved when the order was placed
+            if order_id and str(order_id).isdigit():
+                try:
+                    if confirm_paid_order(int(order_id)) == STOCK_CONFLICT_STATUS:
+                        logger.error("Order %s paid after its stock reservation expired and sold out; needs a refund", order_id)
+                except Order.DoesNotExist:
+                    logger.warning("Payment %s names unknown order %s", intent.id, order_id)
         elif event['type'] == 'payment_intent.payment_failed':
             intent = event['data']['object']
             
@@ -0,0 +1,376 @@
+# product/bitmaps.py
+
+import logging
+import random
+import re
+import threading
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Product, ProductTag, Tag
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'product:bitmaps:generation'
+LOG_KEY = 'product:bitmaps:log:{}'
+# Change-log entries kept in the cache. A worker further behind than this, or
+# one that finds an entry evicted, rebuilds from the database instead.
+LOG_LIMIT = 1000
+LOG_TIMEOUT = 60 * 60
+# Result sets up to this size are applied as `pk IN (...)`; larger ones fall
+# back to the equivalent subquery filter.
+MAX_INLINE_IDS = 2000
+
+_TOKEN_RE = re.compile(r'\s*(\(|\)|"[^"]*"|[^\s()"]+)')
+_KEYWORDS = ('AND', 'OR', 'NOT')
+_FIELD_TERMS = ('tag', 'category', 'manufacturer')
+
+
+def _label(name, value):
+    return (name.casefold(), value.casefold())
+
+
+# -- expressions --------------------------------------------------------------
+
+def parse_expression(text):
+    """
+    Parse a tag expression into a tree of ('and'|'or', left, right),
+    ('not', operand) and ('term', kind, key) tuples.
+
+    Terms are `Name=Value` for a tag by label, or `tag:<id>`,
+    `category:<id>` and `manufacturer:<id>`. Quote terms with spaces
+    ("Color=Navy Blue"). NOT binds tightest, then AND, then OR; adjacent
+    terms without an operator are ANDed. Raises ValueError on bad input.
+    """
+    tokens = []
+    position = 0
+    text = text or ''
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            if text[position:].strip():
+                raise ValueError(f"Unexpected input at position {position}")
+            break
+        tokens.append(match.group(1))
+        position = match.end()
+    if not tokens:
+        raise ValueError("Empty expression")
+
+    def peek():
+        return tokens[0] if tokens else None
+
+    def keyword(token):
+        return token is not None and token.upper() in _KEYWORDS and token.upper()
+
+    def parse_or():
+        node = parse_and()
+        while keyword(peek()) == 'OR':
+            tokens.pop(0)
+            node = ('or', node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() is not None and peek() != ')' and keyword(peek()) != 'OR':
+            if keyword(peek()) == 'AND':
+                tokens.pop(0)
+            node = ('and', node, parse_not())
+        return node
+
+    def parse_not():
+        if keyword(peek()) == 'NOT':
+            tokens.pop(0)
+            return ('not', parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        if not tokens:
+            raise ValueError("Unexpected end of expression")
+        token = tokens.pop(0)
+        if token == '(':
+            node = parse_or()
+            if not tokens or tokens.pop(0) != ')':
+                raise ValueError("Missing closing parenthesis")
+            return node
+        if token == ')' or keyword(token):
+            raise ValueError(f"Unexpected {token!r}")
+        return parse_term(token.strip('"'))
+
+    def parse_term(token):
+        kind, sep, key = token.partition(':')
+        if sep and kind.lower() in _FIELD_TERMS:
+            if not key.isdigit():
+                raise ValueError(f"Invalid id in {token!r}")
+            return ('term', kind.lower(), int(key))
+        name, sep, value = token.partition('=')
+        if not sep or not name or not value:
+            raise ValueError(f"Invalid term {token!r}")
+        return ('term', 'label', _label(name, value))
+
+    node = parse_or()
+    if tokens:
+        raise ValueError(f"Unexpected {tokens[0]!r}")
+    return node
+
+
+def expression_q(node):
+    """The database equivalent of an expression tree, as a Product Q object."""
+    op = node[0]
+    if op == 'and':
+        return expression_q(node[1]) & expression_q(node[2])
+    if op == 'or':
+        return expression_q(node[1]) | expression_q(node[2])
+    if op == 'not':
+        return ~expression_q(node[1])
+    _, kind, key = node
+    if kind == 'category':
+        return Q(category_id=key)
+    if kind == 'manufacturer':
+        return Q(manufacturer_id=key)
+    if kind == 'tag':
+        links = ProductTag.objects.filter(tag_id=key)
+    else:
+        links = ProductTag.objects.filter(tag__name__iexact=key[0], tag__value__iexact=key[1])
+    return Q(pk__in=links.values('product_id'))
+
+
+# -- index --------------------------------------------------------------------
+
+class ProductBitmapIndex:
+    """
+    Per-worker sets of product ids keyed by tag, category and manufacturer.
+
+    Each set holds only the ids it contains, so memory follows the number of
+    links rather than tags × the highest id, and AND/OR/NOT over any number
+    of terms are set operations that never touch the database. A reverse map
+    of each product's tags lets deletes and tag-set changes touch only the
+    tags involved. Writes are published after commit to a change log in the
+    cache (see publish_change); sync() replays the entries this worker has
+    not seen, and only rebuilds from the database when it has fallen further
+    behind than the log reaches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._reset()
+
+    def _reset(self):
+        self._all = set()
+        self._tags = defaultdict(set)
+        self._categories = defaultdict(set)
+        self._manufacturers = defaultdict(set)
+        self._product_category = {}
+        self._product_manufacturer = {}
+        self._product_tags = defaultdict(set)
+        self._labels = defaultdict(set)
+        self._tag_labels = {}
+
+    def sync(self):
+        generation = current_generation()
+        with self._lock:
+            if generation == self._generation:
+                return
+            if self._generation is not None and 0 < generation - self._generation <= LOG_LIMIT:
+                keys = [LOG_KEY.format(seq) for seq in range(self._generation + 1, generation + 1)]
+                entries = cache.get_many(keys)
+                if len(entries) == len(keys):
+                    for key in keys:
+                        for change in entries[key]:
+                            self._apply(change)
+                    self._generation = generation
+                    return
+            self._rebuild(generation)
+
+    def _rebuild(self, generation):
+        self._reset()
+        for pk, category_id, manufacturer_id in Product.objects.values_list('pk', 'category_id', 'manufacturer_id').iterator():
+            self._set_product(pk, category_id, manufacturer_id)
+        for tag_id, product_id in ProductTag.objects.values_list('tag_id', 'product_id').iterator():
+            self._link(tag_id, product_id)
+        for pk, name, value in Tag.objects.values_list('pk', 'name', 'value').iterator():
+            self._set_tag(pk, name, value)
+        self._generation = generation
+        logger.debug("Rebuilt product bitmap index at generation %s", generation)
+
+    def _set_product(self, pk, category_id, manufacturer_id):
+        self._remove_product_groups(pk)
+        self._all.add(pk)
+        self._product_category[pk] = category_id
+        self._product_manufacturer[pk] = manufacturer_id
+        if category_id is not None:
+            self._categories[category_id].add(pk)
+        if manufacturer_id is not None:
+            self._manufacturers[manufacturer_id].add(pk)
+
+    def _remove_product_groups(self, pk):
+        category_id = self._product_category.pop(pk, None)
+        if category_id is not None:
+            self._categories[category_id].discard(pk)
+        manufacturer_id = self._product_manufacturer.pop(pk, None)
+        if manufacturer_id is not None:
+            self._manufacturers[manufacturer_id].discard(pk)
+
+    def _link(self, tag_id, pk):
+        self._tags[tag_id].add(pk)
+        self._product_tags[pk].add(tag_id)
+
+    def _unlink_product(self, pk):
+        for tag_id in self._product_tags.pop(pk, ()):
+            self._tags[tag_id].discard(pk)
+
+    def _set_tag(self, pk, name, value):
+        old = self._tag_labels.pop(pk, None)
+        if old is not None:
+            self._labels[old].discard(pk)
+        if name is not None:
+            label = _label(name, value)
+            self._tag_labels[pk] = label
+            self._labels[label].add(pk)
+
+    def _apply(self, change):
+        op, *args = change
+        if op == 'product':
+            self._set_product(*args)
+        elif op == 'product_deleted':
+            pk, = args
+            self._remove_product_groups(pk)
+            self._all.discard(pk)
+            self._unlink_product(pk)
+        elif op == 'tag_links':
+            tag_id, product_ids, present = args
+            for pk in product_ids:
+                if present:
+                    self._link(tag_id, pk)
+                else:
+                    self._tags[tag_id].discard(pk)
+                    self._product_tags.get(pk, set()).discard(tag_id)
+        elif op == 'product_tag_set':
+            pk, tag_ids = args
+            self._unlink_product(pk)
+            for tag_id in tag_ids:
+                self._link(tag_id, pk)
+        elif op == 'tag':
+            self._set_tag(*args)
+        elif op == 'tag_deleted':
+            self._set_tag(args[0], None, None)
+            for pk in self._tags.pop(args[0], ()):
+                self._product_tags.get(pk, set()).discard(args[0])
+        elif op in ('category_deleted', 'manufacturer_deleted'):
+            # Products are detached by SET_NULL, which sends no per-product signals.
+            groups, owner = (
+                (self._categories, self._product_category) if op == 'category_deleted'
+                else (self._manufacturers, self._product_manufacturer)
+            )
+            for pk in groups.pop(args[0], ()):
+                owner[pk] = None
+
+    def _evaluate(self, node):
+        # Stored sets are returned as they are; callers copy before releasing the lock.
+        op = node[0]
+        if op == 'and':
+            return self._evaluate(node[1]) & self._evaluate(node[2])
+        if op == 'or':
+            return self._evaluate(node[1]) | self._evaluate(node[2])
+        if op == 'not':
+            return self._all - self._evaluate(node[1])
+        _, kind, key = node
+        if kind == 'tag':
+            return self._tags.get(key, set())
+        if kind == 'category':
+            return self._categories.get(key, set())
+        if kind == 'manufacturer':
+            return self._manufacturers.get(key, set())
+        return set().union(*(self._tags.get(tag_id, ()) for tag_id in self._labels.get(key, ())))
+
+    def evaluate(self, node):
+        """Set of the ids of the products matching a parsed expression."""
+        self.sync()
+        with self._lock:
+            return set(self._evaluate(node))
+
+    def filter(self, queryset, node):
+        """
+        Restrict `queryset` to products matching `node`. Small results become
+        a pk list; large ones use expression_q, which the database evaluates.
+        """
+        ids = self.evaluate(node)
+        if len(ids) > MAX_INLINE_IDS:
+            return queryset.filter(expression_q(node))
+        return queryset.filter(pk__in=sorted(ids))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'generation': self._generation,
+                'products': len(self._all),
+                'tags': len(self._tags),
+                'categories': len(self._categories),
+                'manufacturers': len(self._manufacturers),
+            }
+
+
+product_index = ProductBitmapIndex()
+
+
+def _new_sequence():
+    # Sequences start at a random point, so a worker that synced before the
+    # cache was flushed cannot mistake a restarted sequence for its own.
+    return random.getrandbits(48)
+
+
+def current_generation():
+    return cache.get_or_set(GENERATION_KEY, _new_sequence, timeout=None)
+
+
+def _append_log(changes):
+    current_generation()
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Generation evicted: restart the sequence, which forces a rebuild everywhere.
+        cache.add(GENERATION_KEY, _new_sequence(), timeout=None)
+        return
+    if changes:
+        cache.set(LOG_KEY.format(generation), changes, timeout=LOG_TIMEOUT)
+
+
+def publish_change(*change):
+    """
+    Append one change to the index log once the current transaction commits.
+    See ProductBitmapIndex._apply for the change formats.
+    """
+    transaction.on_commit(lambda: _append_log([change]))
+
+
+def invalidate_product_index():
+    """
+    Force every worker to rebuild on its next query, e.g. after bulk writes
+    that bypass signals.
+    """
+    transaction.on_commit(lambda: _append_log(None))
+
+
+class TagExpressionFilter(BaseFilterBackend):
+    """
+    ?tag_expr=Size=M AND (Color=Blue OR Color=Red) AND NOT category:3
+
+    Evaluated against product_index, so the cost does not grow with the
+    number of terms the way stacked ProductTag joins do.
+    """
+    expression_param = 'tag_expr'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.expression_param)
+        if not text:
+            return queryset
+        try:
+            node = parse_expression(text)
+        except ValueError as exc:
+            raise ValidationError({self.expression_param: [str(exc)]})
+        return product_index.filter(queryset, node)
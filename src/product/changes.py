@@ -0,0 +1,110 @@
+# product/changes.py
+
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .models import Product, ProductTombstone
+
+FEED_PAGE_SIZE = 100
+FEED_MAX_PAGE_SIZE = 500
+# Changes newer than this are held back for the next poll. updated_at is set
+# before commit, so a slow transaction can commit a timestamp older than one
+# the feed has already handed out; the lag keeps the cursor behind those.
+FEED_LAG = timedelta(seconds=5)
+# Tombstones older than this are pruned; cursors older than this can no
+# longer see every deletion, so clients holding one must resync from scratch.
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Cursor is older than the change feed retention; sync again without a cursor."
+    default_code = 'cursor_expired'
+
+
+def encode_cursor(changed_at, pk):
+    payload = {'t': changed_at.isoformat(), 'id': pk}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+
+
+def decode_cursor(token, now=None):
+    """(changed_at, pk) from an opaque cursor. Raises NotFound or CursorExpired."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        changed_at = parse_datetime(payload['t'])
+        pk = int(payload['id'])
+        if changed_at is None or timezone.is_naive(changed_at):
+            raise ValueError
+    except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+        raise NotFound('Invalid cursor')
+    if changed_at < (now or timezone.now()) - TOMBSTONE_RETENTION:
+        raise CursorExpired()
+    return changed_at, pk
+
+
+def record_tombstone(product):
+    ProductTombstone.objects.update_or_create(
+        product_id=product.pk, defaults={'sku': product.sku, 'deleted_at': timezone.now()},
+    )
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones past TOMBSTONE_RETENTION. Returns the number deleted."""
+    cutoff = (now or timezone.now()) - TOMBSTONE_RETENTION
+    deleted, _ = ProductTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+def changes_since(cursor=None, limit=FEED_PAGE_SIZE, now=None):
+    """
+    Product changes after `cursor`, oldest first, ordered by (timestamp, id).
+
+    Returns (changes, next cursor, has_more). Each change is a
+    ('product', Product) or ('deleted', ProductTombstone) pair. Live products
+    and tombstones are each read with one keyset query on their
+    (timestamp, id) index and merged, so a page costs O(limit) whatever the
+    catalog size. Without a cursor the feed starts at the beginning, which
+    amounts to a full sync. When nothing changed, the returned cursor moves
+    up to the feed horizon (now - FEED_LAG), with id 0 so no change stamped
+    exactly at the horizon is skipped; idle clients then never hold a cursor
+    that ages past TOMBSTONE_RETENTION.
+    """
+    horizon = (now or timezone.now()) - FEED_LAG
+
+    def after(field, id_field):
+        if cursor is None:
+            return Q()
+        changed_at, pk = cursor
+        return Q(**{f'{field}__gt': changed_at}) | Q(**{field: changed_at, f'{id_field}__gt': pk})
+
+    products = (
+        Product.objects.for_serializer()
+        .filter(after('updated_at', 'pk'), updated_at__lt=horizon)
+        .order_by('updated_at', 'pk')[:limit + 1]
+    )
+    tombstones = (
+        ProductTombstone.objects
+        .filter(after('deleted_at', 'product_id'), deleted_at__lt=horizon)
+        .order_by('deleted_at', 'product_id')[:limit + 1]
+    )
+    merged = sorted(
+        [(product.updated_at, product.pk, 'product', product) for product in products]
+        + [(tombstone.deleted_at, tombstone.product_id, 'deleted', tombstone) for tombstone in tombstones],
+        key=lambda change: change[:2],
+    )
+    has_more = len(merged) > limit
+    page = merged[:limit]
+    if page:
+        next_cursor = encode_cursor(*page[-1][:2])
+    else:
+        # Nothing before the horizon is left after the cursor.
+        next_cursor = encode_cursor(*max(cursor or (horizon, 0), (horizon, 0)))
+    return [(kind, obj) for _, _, kind, obj in page], next_cursor, has_more
@@ -0,0 +1,222 @@
+# product/counters.py
+
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product
+from .trending import record_activity
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes; also the most view counts a crashed worker can lose.
+VIEW_FLUSH_INTERVAL = 10
+
+# Flushed hits wait in the shared cache as a log of numbered batches until
+# apply_view_counts (the flush_view_counts task) writes them to the database.
+VIEW_SEQUENCE_KEY = 'product:views:sequence'
+VIEW_BATCH_KEY = 'product:views:batch:{}'
+VIEW_DRAINED_KEY = 'product:views:drained'
+VIEW_LOCK_KEY = 'product:views:lock'
+VIEW_BATCH_TIMEOUT = 24 * 60 * 60
+VIEW_LOCK_TIMEOUT = 60
+# Batches applied per transaction. A run drains chunk after chunk until it
+# catches up or has used half of VIEW_LOCK_TIMEOUT; the next run goes on.
+VIEW_DRAIN_SIZE = 5000
+# Sequence numbers are an epoch in the bits above VIEW_EPOCH_SHIFT and a
+# batch counter below them. A sequence restarted after eviction starts a new
+# random epoch, which is how apply_view_counts tells a restart from a backlog.
+VIEW_EPOCH_SHIFT = 32
+
+
+def _new_sequence():
+    return random.getrandbits(24) << VIEW_EPOCH_SHIFT
+
+
+def _epoch(sequence):
+    return sequence >> VIEW_EPOCH_SHIFT
+
+
+def publish_view_counts(counts):
+    """Append {product id: views} to the shared view log as one batch."""
+    cache.get_or_set(VIEW_SEQUENCE_KEY, _new_sequence, timeout=None)
+    try:
+        sequence = cache.incr(VIEW_SEQUENCE_KEY)
+    except ValueError:
+        # Evicted between the two calls: restart the sequence.
+        cache.add(VIEW_SEQUENCE_KEY, _new_sequence(), timeout=None)
+        sequence = cache.incr(VIEW_SEQUENCE_KEY)
+    cache.set(VIEW_BATCH_KEY.format(sequence), counts, timeout=VIEW_BATCH_TIMEOUT)
+
+
+class ViewCountBuffer:
+    """
+    Write-behind accumulator for Product.views_count.
+
+    Detail views only bump an in-process counter. A daemon thread, started
+    by the first hit in each process, hands the buffer to the shared cache
+    every flush interval (and once more at process exit), whether or not
+    more hits come, so a crashed or killed worker loses at most one interval
+    of views. The database is written by apply_view_counts, never on the
+    request path.
+    """
+
+    def __init__(self, flush_interval=VIEW_FLUSH_INTERVAL, autostart=True):
+        self.flush_interval = flush_interval
+        self.autostart = autostart
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._pid = None
+        self._last_flush_stats = {'products': 0, 'views': 0, 'latency_ms': 0.0}
+
+    def record(self, product_id, count=1):
+        with self._lock:
+            self._counts[product_id] += count
+            # Per process: a thread started before a fork does not run in the child.
+            if self.autostart and self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='view-count-flush', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Hand buffered hits to the shared view log. Returns the number of
+        products handed off. On failure the hits are put back so the next
+        flush retries them.
+        """
+        with self._lock:
+            pending, self._counts = self._counts, Counter()
+        if not pending:
+            return 0
+
+        started = time.monotonic()
+        try:
+            publish_view_counts(dict(pending))
+        except Exception:
+            with self._lock:
+                self._counts.update(pending)
+            logger.exception("View count flush failed; %d products re-queued", len(pending))
+            return 0
+
+        stats = {
+            'products': len(pending),
+            'views': sum(pending.values()),
+            'latency_ms': (time.monotonic() - started) * 1000,
+        }
+        self._last_flush_stats = stats
+        logger.debug(
+            "Flushed views: products=%(products)d views=%(views)d latency_ms=%(latency_ms).1f", stats
+        )
+        return stats['products']
+
+    def stats(self):
+        """Current buffer size and figures from the last successful flush."""
+        with self._lock:
+            return {
+                'pending_products': len(self._counts),
+                'pending_views': sum(self._counts.values()),
+                'last_flush': dict(self._last_flush_stats),
+            }
+
+
+def _apply_counts(pending):
+    """Add {product id: views} to views_count and the activity windows in one transaction."""
+    by_delta = defaultdict(list)
+    for product_id, delta in pending.items():
+        by_delta[delta].append(product_id)
+    now = timezone.now()
+    with transaction.atomic():
+        for delta, product_ids in by_delta.items():
+            # Queryset updates skip auto_now; the change feed reads updated_at.
+            Product.objects.filter(pk__in=product_ids).update(views_count=F('views_count') + delta, updated_at=now)
+        existing = list(Product.objects.filter(pk__in=list(pending)).values_list('pk', flat=True))
+        record_activity({pk: (pending[pk], 0) for pk in existing})
+        # Cached product details render views_count.
+        from .signals import scores_updated
+        scores_updated.send(sender=Product, product_ids=existing, fields=['views_count'])
+
+
+def apply_view_counts():
+    """
+    Drain the shared view log into Product.views_count and the activity
+    windows. Returns {'batches', 'products', 'views', 'latency_ms'}, or None
+    if another run holds the lock.
+
+    Batches are read in sequence order from the drained position, in chunks
+    of VIEW_DRAIN_SIZE. Each chunk's summed deltas are applied with F()
+    updates (products with the same delta share one UPDATE) in one
+    transaction; then its batches are deleted and the position moves, so a
+    backlog is drained rather than skipped. A batch whose number is taken but
+    that is not stored yet is retried on the next run, then given up. Only a
+    restarted sequence (a new epoch) moves the position without draining:
+    the new sequence is then read from its start. A run that dies between a
+    commit and moving the position applies that chunk again on the next.
+    The products' cached details are invalidated through scores_updated.
+    """
+    token = uuid.uuid4().hex
+    if not cache.add(VIEW_LOCK_KEY, token, timeout=VIEW_LOCK_TIMEOUT):
+        return None
+    started = time.monotonic()
+    applied = 0
+    total = Counter()
+    try:
+        current = cache.get(VIEW_SEQUENCE_KEY)
+        drained = cache.get(VIEW_DRAINED_KEY) or {}
+        position = drained.get('position')
+        retry = drained.get('missing', [])
+        if current is not None and (position is None or current < position or _epoch(current) != _epoch(position)):
+            # First run, or the sequence restarted: read the new one from its start.
+            position, retry = _epoch(current) << VIEW_EPOCH_SHIFT, []
+        missing = []
+        while current is not None:
+            upper = min(current, position + VIEW_DRAIN_SIZE)
+            sequences = [*retry, *range(position + 1, upper + 1)]
+            batches = cache.get_many([VIEW_BATCH_KEY.format(sequence) for sequence in sequences])
+            pending = Counter()
+            for counts in batches.values():
+                pending.update(counts)
+            if pending:
+                _apply_counts(pending)
+            cache.delete_many(list(batches))
+            missing += [
+                sequence for sequence in range(position + 1, upper + 1)
+                if VIEW_BATCH_KEY.format(sequence) not in batches
+            ]
+            cache.set(VIEW_DRAINED_KEY, {'position': upper, 'missing': missing}, timeout=None)
+            applied += len(batches)
+            total.update(pending)
+            position, retry = upper, []
+            if upper >= current or time.monotonic() - started > VIEW_LOCK_TIMEOUT / 2:
+                break
+    finally:
+        if cache.get(VIEW_LOCK_KEY) == token:
+            cache.delete(VIEW_LOCK_KEY)
+
+    stats = {
+        'batches': applied,
+        'products': len(total),
+        'views': sum(total.values()),
+        'latency_ms': (time.monotonic() - started) * 1000,
+    }
+    logger.info(
+        "Applied views: batches=%(batches)d products=%(products)d views=%(views)d latency_ms=%(latency_ms).1f", stats
+    )
+    return stats
+
+
+view_counter = ViewCountBuffer()
+atexit.register(view_counter.flush)
@@ -0,0 +1,210 @@
+# product/detail_cache.py
+
+import random
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from drf_spectacular.utils import extend_schema_field
+from rest_framework import serializers
+
+from .models import Product
+from .querysets import PRODUCT_PREFETCH_RELATED
+from .serializers import ProductSerializer
+
+ENTRY_KEY = 'product:detail:{}'
+VERSION_KEY = 'product:detail:{}:version'
+# Bumped by writes that can change many products at once (tags, categories,
+# manufacturers, bulk imports); part of every entry's stamp.
+SHARED_VERSION_KEY = 'product:detail:shared-version'
+DETAIL_TIMEOUT = 60 * 60
+# Serialized products kept per worker in front of the shared cache.
+L1_SIZE = 1024
+
+
+def _new_version():
+    # Versions start at a random point, so an evicted and re-created version
+    # key cannot match an entry built before the eviction.
+    return random.getrandbits(48)
+
+
+class LocalLRU:
+    """A small thread-safe LRU mapping, bounded to `size` entries."""
+
+    def __init__(self, size=L1_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_details = LocalLRU()
+
+
+def _stamps(pks):
+    """{pk: (product version, shared version)}, the stamp each cached entry must match."""
+    keys = {pk: VERSION_KEY.format(pk) for pk in pks}
+    versions = cache.get_many([*keys.values(), SHARED_VERSION_KEY])
+    for key in [*keys.values(), SHARED_VERSION_KEY]:
+        if key not in versions:
+            versions[key] = cache.get_or_set(key, _new_version, timeout=None)
+    return {pk: (versions[key], versions[SHARED_VERSION_KEY]) for pk, key in keys.items()}
+
+
+def detail_stamp(pk):
+    """The (product version, shared version) pair a cached entry must match."""
+    return _stamps([pk])[pk]
+
+
+def _cached(stamps):
+    """{pk: data} for the entries matching `stamps`, from the L1 or the shared cache."""
+    found = {}
+    for pk, stamp in stamps.items():
+        data = local_details.get((pk, stamp))
+        if data is not None:
+            found[pk] = data
+    missing = [ENTRY_KEY.format(pk) for pk in stamps if pk not in found]
+    if missing:
+        entries = cache.get_many(missing)
+        for pk, stamp in stamps.items():
+            entry = entries.get(ENTRY_KEY.format(pk))
+            if pk not in found and entry is not None and entry['stamp'] == stamp:
+                found[pk] = entry['data']
+                local_details.set((pk, stamp), entry['data'])
+    return found
+
+
+def _store(products, stamps, context):
+    """Serialize `products` in one pass and cache each one under its stamp."""
+    data = ProductSerializer(products, many=True, context=context).data
+    fragments = {product.pk: dict(item) for product, item in zip(products, data)}
+    cache.set_many(
+        {ENTRY_KEY.format(pk): {'stamp': stamps[pk], 'data': item} for pk, item in fragments.items()},
+        timeout=DETAIL_TIMEOUT,
+    )
+    for pk, item in fragments.items():
+        local_details.set((pk, stamps[pk]), item)
+    return fragments
+
+
+def get_product_detail(pk, context=None):
+    """
+    Serialized ProductSerializer data for product `pk`, read through the
+    per-worker L1 and the shared cache.
+
+    Entries are stamped with the product's version and the shared version,
+    which writes bump (see invalidate_product_details), so a stale entry is
+    never served. A hit costs one cache round trip for the stamp and no
+    database queries; a miss also fetches the entry and, if that misses too,
+    loads the product with for_serializer(). Raises Product.DoesNotExist for
+    unknown ids.
+    """
+    stamps = _stamps([pk])
+    found = _cached(stamps)
+    if pk not in found:
+        found = _store([Product.objects.for_serializer().get(pk=pk)], stamps, context)
+    return found[pk]
+
+
+def get_product_fragments(products, context=None):
+    """
+    {pk: serialized ProductSerializer data} for `products`, from the same
+    entries get_product_detail uses, so lists, sections and nested products
+    share one cached fragment per product version.
+
+    `products` only need their category and manufacturer loaded
+    (Product.objects.for_fragments()). Images and tags are prefetched for the
+    products without a current entry, and only those are serialized. When
+    every product is cached this costs two cache round trips (stamps, then
+    entries; none for L1 hits) and no queries.
+    """
+    products = {product.pk: product for product in products}
+    if not products:
+        return {}
+    stamps = _stamps(products)
+    found = _cached(stamps)
+    missing = [product for pk, product in products.items() if pk not in found]
+    if missing:
+        prefetch_related_objects(missing, *PRODUCT_PREFETCH_RELATED)
+        found.update(_store(missing, stamps, context))
+    return found
+
+
+def get_product_details(pks, context=None):
+    """
+    {pk: serialized ProductSerializer data} for product ids, for callers that
+    hold ids rather than instances. Cached products cost no queries; the
+    others are loaded in one for_serializer() query. Unknown ids are left out.
+    """
+    stamps = _stamps(pks)
+    found = _cached(stamps)
+    missing = [pk for pk in stamps if pk not in found]
+    if missing:
+        found.update(_store(list(Product.objects.for_serializer().filter(pk__in=missing)), stamps, context))
+    return found
+
+
+@extend_schema_field(ProductSerializer)
+class ProductFragmentField(serializers.Field):
+    """
+    Read-only ProductSerializer output for a related product, served by
+    get_product_fragments. Views that render many rows fetch all their
+    fragments at once and pass them in context['product_fragments']
+    ({pk: data}); otherwise each product is looked up on its own.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, product):
+        fragments = self.context.get('product_fragments')
+        if fragments is None or product.pk not in fragments:
+            fragments = get_product_fragments([product], self.context)
+        return fragments[product.pk]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def _bump_now_and_on_commit(keys):
+    # The bump after commit catches entries rebuilt from pre-commit data by
+    # readers that ran while the transaction was open.
+    def bump():
+        for key in keys:
+            _bump(key)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_product_details(product_ids):
+    """Invalidate the cached detail of each product."""
+    _bump_now_and_on_commit([VERSION_KEY.format(pk) for pk in product_ids])
+
+
+def invalidate_all_product_details():
+    _bump_now_and_on_commit([SHARED_VERSION_KEY])
@@ -0,0 +1,99 @@
+# product/exports.py
+
+import csv
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Product
+
+# Rows fetched (and prefetched for) per database round trip while streaming.
+EXPORT_CHUNK_SIZE = 500
+
+# A superset of the columns import_catalog reads, so an export can be re-imported.
+CSV_COLUMNS = (
+    'id', 'sku', 'name', 'description', 'price', 'category', 'manufacturer',
+    'current_stock', 'is_launch', 'release_date', 'updated_at', 'tags', 'images',
+)
+
+
+def parse_timestamp(value):
+    """An aware datetime from an ISO 8601 date or datetime string, or None if invalid."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_queryset(updated_since=None):
+    """
+    Products to export in primary key order. With `updated_since`, only
+    products whose own row, tags or images changed at or after that time
+    (tag and image writes touch Product.updated_at).
+    """
+    queryset = Product.objects.for_serializer().order_by('pk')
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    return queryset
+
+
+def product_record(product):
+    """A flat, JSON-ready dict for one product loaded through for_serializer()."""
+    return {
+        'id': product.pk,
+        'sku': product.sku,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'category': product.category.name if product.category else None,
+        'manufacturer': product.manufacturer.name if product.manufacturer else None,
+        'current_stock': product.current_stock,
+        'is_launch': product.is_launch,
+        'release_date': product.release_date,
+        'updated_at': product.updated_at,
+        'tags': [f'{tag.name}={tag.value}' for tag in product.tags.all()],
+        'images': [
+            {'image': image.image, 'media_type': image.media_type, 'alt_text': image.alt_text, 'is_primary': image.is_primary}
+            for image in product.images.all()
+        ],
+    }
+
+
+def iter_records(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    # iterator() streams rows and runs the prefetches once per chunk, so only
+    # one chunk of products and their tags/images is in memory at a time.
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield product_record(product)
+
+
+def ndjson_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    for record in iter_records(queryset, chunk_size):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in iter_records(queryset, chunk_size):
+        record['tags'] = ';'.join(record['tags'])
+        record['images'] = ' '.join(image['image'] for image in record['images'])
+        for field in ('release_date', 'updated_at'):
+            if record[field] is not None:
+                record[field] = record[field].isoformat()
+        yield writer.writerow([record[column] for column in CSV_COLUMNS])
@@ -0,0 +1,118 @@
+# product/facets.py
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Product, ProductTag
+
+VERSION_KEY = 'product:facets:version'
+FACETS_TIMEOUT = 10 * 60
+# Lower bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (0, 25, 50, 100, 200)
+# Query parameters that change paging or order but not the matching set.
+NON_FILTER_PARAMS = frozenset({'cursor', 'page_size', 'ordering', 'search_boost', 'facets'})
+# Product fields that facets are computed over; saves touching none of them
+# leave cached facets valid.
+FACET_FIELDS = frozenset({'category', 'category_id', 'manufacturer', 'manufacturer_id', 'price'})
+# Product fields the product list filters (?field=) and searches on; the
+# ProductViewSet declares its filterset_fields and search_fields from these.
+PRODUCT_FILTER_FIELDS = ('category', 'is_launch', 'current_stock', 'tags')
+PRODUCT_SEARCH_FIELDS = ('name', 'description')
+# Saves touching any of these change the facets of some cached filter set.
+FACET_INVALIDATION_FIELDS = FACET_FIELDS.union(PRODUCT_FILTER_FIELDS, PRODUCT_SEARCH_FIELDS)
+
+
+def _price_ranges():
+    bounds = PRICE_BUCKETS + (None,)
+    return list(zip(bounds, bounds[1:]))
+
+
+def compute_facets(queryset):
+    """
+    Counts for the products matched by `queryset`, grouped by category,
+    manufacturer, tag (name -> value) and price bucket.
+
+    Four grouped queries whatever the number of facet values: the matched
+    set is taken as a pk subquery, so joins added by filters and search
+    neither duplicate rows nor leak into the counts.
+    """
+    matched = Product.objects.filter(pk__in=queryset.order_by().values('pk'))
+
+    ranges = _price_ranges()
+    price_counts = matched.aggregate(
+        total=Count('pk'),
+        **{
+            f'price_{i}': Count('pk', filter=Q(price__gte=low) & (Q(price__lt=high) if high is not None else Q()))
+            for i, (low, high) in enumerate(ranges)
+        },
+    )
+
+    def grouped(field):
+        rows = (
+            matched.filter(**{f'{field}__isnull': False})
+            .order_by()
+            .values(f'{field}_id', f'{field}__name')
+            .annotate(count=Count('pk'))
+            .order_by('-count', f'{field}__name')
+        )
+        return [{'id': row[f'{field}_id'], 'name': row[f'{field}__name'], 'count': row['count']} for row in rows]
+
+    tag_rows = (
+        ProductTag.objects.filter(product__in=matched)
+        .values('tag_id', 'tag__name', 'tag__value')
+        .annotate(count=Count('product', distinct=True))
+        .order_by('tag__name', '-count', 'tag__value')
+    )
+    tags = {}
+    for row in tag_rows:
+        tags.setdefault(row['tag__name'], []).append(
+            {'id': row['tag_id'], 'value': row['tag__value'], 'count': row['count']}
+        )
+
+    return {
+        'count': price_counts['total'],
+        'category': grouped('category'),
+        'manufacturer': grouped('manufacturer'),
+        'tags': tags,
+        'price': [
+            {'min': low, 'max': high, 'count': price_counts[f'price_{i}']}
+            for i, (low, high) in enumerate(ranges)
+        ],
+    }
+
+
+def current_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def facets_cache_key(params, version):
+    filters = sorted(
+        (key, value) for key, values in params.lists() if key not in NON_FILTER_PARAMS for value in values
+    )
+    digest = hashlib.sha1(repr(filters).encode()).hexdigest()
+    return f'product:facets:{version}:{digest}'
+
+
+def get_facets(queryset, params):
+    """
+    Facets for `queryset`, cached per catalog version and set of filter
+    parameters (a QueryDict), so repeated requests for the same filters are
+    served without touching the database.
+    """
+    key = facets_cache_key(params, current_version())
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, timeout=FACETS_TIMEOUT)
+    return facets
+
+
+def invalidate_facets():
+    """Start a new catalog version; facets cached under older ones are never read again."""
+    current_version()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
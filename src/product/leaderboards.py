@@ -0,0 +1,220 @@
+# product/leaderboards.py
+
+import bisect
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Product
+
+# Sections served from leaderboards, and the Product field each ranks by.
+LEADERBOARD_METRICS = {
+    'bestsellers': 'sales_count',
+    'trending': 'trending_score',
+}
+# Query parameters that select a leaderboard, and the Product field they filter on.
+LEADERBOARD_SCOPES = {
+    'category': 'category_id',
+    'manufacturer': 'manufacturer_id',
+}
+
+GENERATION_KEY = 'product:leaderboards:generation'
+BOARD_KEY = 'product:leaderboards:{}:{}:{}'
+# Per board: held while the board is built or updated, and set by updates
+# that found it held, so the holder drops what it stores.
+LOCK_KEY = '{}:lock'
+DROPPED_KEY = '{}:dropped'
+
+# Entries a board is guaranteed to serve (K).
+LEADERBOARD_SIZE = 50
+# Entries kept per board. The slack above K lets members drop out of a board
+# without a rebuild until fewer than K are left.
+LEADERBOARD_CAPACITY = 2 * LEADERBOARD_SIZE
+LEADERBOARD_TIMEOUT = 24 * 60 * 60
+LOCK_TIMEOUT = 10
+
+
+def _new_generation():
+    # Random start, so an evicted and re-created generation key cannot match
+    # boards stored before the eviction.
+    return random.getrandbits(48)
+
+
+def _generation():
+    return cache.get_or_set(GENERATION_KEY, _new_generation, timeout=None)
+
+
+def board_key(metric, scope, generation=None):
+    """Cache key of one board; `scope` is a (field, value) pair such as ('category_id', 3)."""
+    field, value = scope
+    return BOARD_KEY.format(generation or _generation(), metric, f'{field}={value}')
+
+
+def leaderboard_scope(params):
+    """
+    The (field, id) scope selected by section query parameters, or None if
+    they select none or more than one. Raises ValueError for ids that are not
+    integers.
+    """
+    scopes = [(LEADERBOARD_SCOPES[param], int(value)) for param, value in params.items() if param in LEADERBOARD_SCOPES]
+    return scopes[0] if len(scopes) == 1 else None
+
+
+def build_board(metric, scope):
+    """
+    Load a board from the database: the top LEADERBOARD_CAPACITY
+    (score, pk) pairs of the scope, best first, read off the
+    (scope, metric, id) index.
+
+    A board is exact above its `floor`: every product in the scope ranking at
+    or above the floor is in `entries`. Boards holding the whole scope have
+    no floor.
+    """
+    field, value = scope
+    rows = list(
+        Product.objects.filter(**{field: value})
+        .order_by(f'-{metric}', '-pk')
+        .values_list(metric, 'pk')[:LEADERBOARD_CAPACITY + 1]
+    )
+    floor = None
+    if len(rows) > LEADERBOARD_CAPACITY:
+        rows = rows[:LEADERBOARD_CAPACITY]
+        floor = rows[-1]
+    return {'entries': rows, 'floor': floor}
+
+
+def apply_score(board, pk, score):
+    """
+    Move product `pk` to `score` on `board` in place. Returns False if the
+    board no longer holds LEADERBOARD_SIZE exact entries and must be rebuilt.
+    """
+    entries = [entry for entry in board['entries'] if entry[1] != pk]
+    ranked = (score, pk)
+    floor = board['floor']
+    if floor is None or ranked >= tuple(floor):
+        # Entries are sorted best first; bisect over the negated keys.
+        keys = [(-s, -p) for s, p in entries]
+        entries.insert(bisect.bisect_left(keys, (-score, -pk)), ranked)
+    if len(entries) > LEADERBOARD_CAPACITY:
+        entries = entries[:LEADERBOARD_CAPACITY]
+        floor = entries[-1]
+    board['entries'] = entries
+    board['floor'] = floor
+    return floor is None or len(entries) >= LEADERBOARD_SIZE
+
+
+def _lock(key):
+    """Take the lock of board `key`; False if a build or update holds it."""
+    if not cache.add(LOCK_KEY.format(key), True, timeout=LOCK_TIMEOUT):
+        return False
+    cache.delete(DROPPED_KEY.format(key))
+    return True
+
+
+def _store_and_unlock(boards, keys):
+    """
+    Store `boards` and release the locks of `keys`. Boards an update marked
+    while the lock was held are deleted instead: their data may predate it.
+    """
+    if boards:
+        cache.set_many(boards, timeout=LEADERBOARD_TIMEOUT)
+    dropped = cache.get_many([DROPPED_KEY.format(key) for key in keys])
+    cache.delete_many([key for key in keys if DROPPED_KEY.format(key) in dropped])
+    cache.delete_many([LOCK_KEY.format(key) for key in keys])
+
+
+def _drop(keys):
+    """Delete boards whose lock another worker holds, and mark them so it does not store them again."""
+    cache.set_many({DROPPED_KEY.format(key): True for key in keys}, timeout=LOCK_TIMEOUT)
+    cache.delete_many(keys)
+
+
+def top_product_ids(metric, scope, count):
+    """
+    Ids of the `count` (at most LEADERBOARD_SIZE) best products of a scope by
+    `metric`, best first.
+
+    Served from the cached board, so a hit costs no queries and O(K) work. A
+    missing or depleted board is rebuilt with one indexed query under the
+    board's own lock, so builds of other boards never wait on it. An update
+    that finds the lock held marks the board, and the build drops its result
+    instead of storing it; a build that cannot take the lock serves its
+    result without storing it.
+    """
+    key = board_key(metric, scope)
+    board = cache.get(key)
+    if board is None or (board['floor'] is not None and len(board['entries']) < count):
+        if _lock(key):
+            stored = {}
+            try:
+                board = build_board(metric, scope)
+                stored[key] = board
+            finally:
+                _store_and_unlock(stored, [key])
+        else:
+            board = build_board(metric, scope)
+    return [pk for _, pk in board['entries'][:count]]
+
+
+def update_leaderboards(product_ids, fields):
+    """
+    Apply new scores of `product_ids` to the cached boards that rank by any of
+    `fields`. Boards that are not cached are left to be built on their next
+    read; boards left with too few exact entries are dropped. Each board is
+    updated under its own lock; the boards this update touches whose lock a
+    build or another update holds are dropped, and no others.
+    """
+    metrics = set(LEADERBOARD_METRICS.values()) & set(fields)
+    if not metrics or not product_ids:
+        return
+    generation = _generation()
+    rows = Product.objects.filter(pk__in=list(product_ids)).values('pk', *LEADERBOARD_SCOPES.values(), *metrics)
+    updates = {}
+    for row in rows:
+        for metric in metrics:
+            for field in LEADERBOARD_SCOPES.values():
+                if row[field] is not None:
+                    key = board_key(metric, (field, row[field]), generation)
+                    updates.setdefault(key, []).append((row['pk'], row[metric]))
+    boards = cache.get_many(list(updates))
+    # Boards being built now may have read the old scores.
+    building = cache.get_many([LOCK_KEY.format(key) for key in updates if key not in boards])
+    contended = [key for key in updates if LOCK_KEY.format(key) in building]
+    locked = []
+    for key in list(boards):
+        if _lock(key):
+            locked.append(key)
+        else:
+            contended.append(key)
+            del boards[key]
+    _drop(contended)
+    stored = {}
+    try:
+        stale = []
+        for key, board in boards.items():
+            for pk, score in updates[key]:
+                if not apply_score(board, pk, score):
+                    stale.append(key)
+                    break
+        cache.delete_many(stale)
+        stored = {key: board for key, board in boards.items() if key not in stale}
+    finally:
+        _store_and_unlock(stored, locked)
+
+
+def _bump():
+    _generation()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, _new_generation(), timeout=None)
+
+
+def invalidate_leaderboards():
+    """
+    Drop every board, for writes that can move products between scopes. The
+    bump after commit discards boards built from pre-commit data meanwhile.
+    """
+    _bump()
+    transaction.on_commit(_bump)
@@ -0,0 +1,343 @@
+import csv
+import json
+import mimetypes
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import BooleanField
+from django.utils import timezone
+from product.models import Category, Manufacturer, Product, ProductImage, ProductTag, Tag
+from product.signals import catalog_bulk_changed
+from product.trending import recompute_trending_scores
+
+DEFAULT_BATCH_SIZE = 2000
+
+MANUFACTURER_FIELDS = ('address', 'contact_email', 'contact_phone')
+PRODUCT_FIELDS = ('name', 'description', 'price', 'current_stock', 'is_launch', 'release_date')
+IMAGE_FIELDS = ('media_type', 'alt_text', 'is_primary')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path):
+    """
+    Yield (line number, row dict) from a CSV file with a header row or a JSONL
+    file, one row at a time. Malformed JSONL lines yield a None row.
+    """
+    if not path.endswith(('.csv', '.jsonl', '.ndjson')):
+        raise CommandError(f"Unsupported file type for {path}; expected .csv or .jsonl")
+    try:
+        handle = open(path, newline='', encoding='utf-8')
+    except OSError as exc:
+        raise CommandError(f"Cannot open {path}: {exc}")
+    with handle:
+        if path.endswith('.csv'):
+            # Line numbers count the header.
+            yield from enumerate(csv.DictReader(handle), start=2)
+            return
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def present(row, fields):
+    """The subset of `fields` the row sets; blank CSV cells count as absent."""
+    return tuple(field for field in fields if text(row, field))
+
+
+BOOLEAN_STRINGS = {'true': True, 't': True, 'yes': True, '1': True, 'false': False, 'f': False, 'no': False, '0': False}
+
+
+def clean_value(model, field, value):
+    model_field = model._meta.get_field(field)
+    if isinstance(model_field, BooleanField) and isinstance(value, str):
+        value = BOOLEAN_STRINGS.get(value.strip().lower(), value)
+    try:
+        return model_field.clean(value, None)
+    except ValidationError as exc:
+        raise RowError(f"{field}: {'; '.join(exc.messages)}")
+
+
+def tag_label(name, value):
+    name, value = name.strip(), value.strip()
+    if not name or not value:
+        raise RowError("tag name and value are required")
+    if name == value:
+        raise RowError(f"tag {name}={value}: Name and value cannot be the same.")
+    return name, value
+
+
+def parse_tags(value):
+    """Tags as a list of "Name=Value" strings (JSONL) or one ';'-separated string (CSV)."""
+    if value in (None, ''):
+        return []
+    items = value.split(';') if isinstance(value, str) else value
+    labels = []
+    for item in items:
+        name, sep, tag_value = str(item).partition('=')
+        if not sep:
+            raise RowError(f"tags: invalid tag {item!r}; expected Name=Value")
+        labels.append(tag_label(name, tag_value))
+    return labels
+
+
+def group_by_fields(rows):
+    """
+    Group (key, values) rows by the set of fields they provide, so an upsert
+    never overwrites a column the file left out. When a key repeats, the last
+    row wins; one upsert statement cannot touch the same row twice.
+    """
+    groups = {}
+    for key, values in dict(rows).items():
+        groups.setdefault(tuple(sorted(values)), []).append((key, values))
+    return groups.items()
+
+
+def upsert(model, objs, unique_fields, update_fields):
+    if update_fields:
+        model.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=unique_fields, update_fields=list(update_fields),
+        )
+    else:
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream manufacturers, tags, products and images from CSV/JSONL files into the catalog in "
+        "fixed-size batches. Existing rows are updated (manufacturers by name, tags by name/value, "
+        "products by sku, images by product and URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--manufacturers', help="Columns: name, address, contact_email, contact_phone")
+        parser.add_argument('--tags', help="Columns: name, value, description")
+        parser.add_argument(
+            '--products',
+            help="Columns: sku, name, price, description, category, manufacturer, current_stock, "
+                 "is_launch, release_date, tags (Name=Value;Name=Value, or a list in JSONL)",
+        )
+        parser.add_argument('--images', help="Columns: sku, image, media_type, alt_text, is_primary")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--max-errors', type=int, default=100, help="Abort after this many rejected rows")
+
+    def handle(self, *args, **options):
+        # Dependency order: products reference manufacturers and tags, images reference products.
+        steps = [
+            ('manufacturers', self.prepare_manufacturer, self.save_manufacturers),
+            ('tags', self.prepare_tag, self.save_tags),
+            ('products', self.prepare_product, self.save_products),
+            ('images', self.prepare_image, self.save_images),
+        ]
+        if not any(options[name] for name, _, _ in steps):
+            raise CommandError("Nothing to import; pass at least one of --manufacturers, --tags, --products, --images")
+        self.batch_size = options['batch_size']
+        self.max_errors = options['max_errors']
+        self.errors = 0
+
+        started = time.monotonic()
+        # Foreign keys are resolved from these maps rather than per-row queries.
+        self.categories = dict(Category.objects.values_list('name', 'pk'))
+        self.manufacturers = dict(Manufacturer.objects.values_list('name', 'pk'))
+        self.tags = {(name, value): pk for pk, name, value in Tag.objects.values_list('pk', 'name', 'value')}
+
+        for name, prepare, save in steps:
+            if options[name]:
+                count = self.import_file(options[name], prepare, save)
+                self.stdout.write(f"{name}: {count} rows imported")
+
+        # Bulk writes fire no per-row signals; refresh derived state once instead.
+        stats = recompute_trending_scores()
+        catalog_bulk_changed.send(sender=self.__class__)
+        self.stdout.write(self.style.SUCCESS(
+            f"Import finished in {time.monotonic() - started:.1f}s: {self.errors} rows rejected, "
+            f"{stats['written']} trending scores updated."
+        ))
+
+    def import_file(self, path, prepare, save):
+        """Validate and write `path` one batch (and one transaction) at a time."""
+        imported = 0
+        self.path = path
+        for batch in batches(read_rows(path), self.batch_size):
+            rows = []
+            for number, row in batch:
+                try:
+                    if row is None:
+                        raise RowError("not a JSON object")
+                    rows.append((number, prepare(row)))
+                except RowError as exc:
+                    self.reject(number, str(exc))
+            if rows:
+                with transaction.atomic():
+                    imported += save(rows)
+        return imported
+
+    def reject(self, number, message):
+        self.errors += 1
+        self.stderr.write(f"{self.path}:{number}: {message}")
+        if self.errors >= self.max_errors:
+            raise CommandError(f"Aborting after {self.errors} rejected rows")
+
+    # Each prepare_* validates one row and returns plain values; the matching
+    # save_* writes a batch of (line number, values) pairs and returns the count.
+
+    def prepare_manufacturer(self, row):
+        name = text(row, 'name')
+        if not name:
+            raise RowError("name is required")
+        return name, {field: clean_value(Manufacturer, field, text(row, field)) for field in present(row, MANUFACTURER_FIELDS)}
+
+    def save_manufacturers(self, rows):
+        for fields, group in group_by_fields(values for _, values in rows):
+            upsert(Manufacturer, [Manufacturer(name=name, **values) for name, values in group], ['name'], fields)
+        self.load_manufacturers({name for _, (name, _) in rows})
+        return len(rows)
+
+    def prepare_tag(self, row):
+        label = tag_label(text(row, 'name'), text(row, 'value'))
+        return label, {field: text(row, field) for field in present(row, ('description',))}
+
+    def save_tags(self, rows):
+        for fields, group in group_by_fields(values for _, values in rows):
+            upsert(Tag, [Tag(name=name, value=value, **values) for (name, value), values in group], ['name', 'value'], fields)
+        self.load_tags({label for _, (label, _) in rows})
+        return len(rows)
+
+    def prepare_product(self, row):
+        sku = text(row, 'sku')
+        if not sku:
+            raise RowError("sku is required")
+        if not text(row, 'name') or not text(row, 'price'):
+            raise RowError("name and price are required")
+        fields = present(row, PRODUCT_FIELDS)
+        values = {field: clean_value(Product, field, row[field]) for field in fields}
+        if 'release_date' in values and timezone.is_naive(values['release_date']):
+            values['release_date'] = timezone.make_aware(values['release_date'])
+        for relation in ('category', 'manufacturer'):
+            if text(row, relation):
+                values[relation] = text(row, relation)
+        tags = parse_tags(row['tags']) if 'tags' in row else None
+        return sku, values, tags
+
+    def save_products(self, rows):
+        rows = [values for _, values in rows]
+        self.create_missing(
+            Category, self.categories, {values['category'] for _, values, _ in rows if 'category' in values},
+        )
+        self.create_missing(
+            Manufacturer, self.manufacturers,
+            {values['manufacturer'] for _, values, _ in rows if 'manufacturer' in values},
+        )
+        labels = {label for _, _, tags in rows for label in tags or ()} - set(self.tags)
+        if labels:
+            Tag.objects.bulk_create([Tag(name=name, value=value) for name, value in labels], ignore_conflicts=True)
+            self.load_tags(labels)
+
+        resolved = []
+        for sku, values, _ in rows:
+            values = dict(values)
+            if 'category' in values:
+                values['category_id'] = self.categories[values.pop('category')]
+            if 'manufacturer' in values:
+                values['manufacturer_id'] = self.manufacturers[values.pop('manufacturer')]
+            resolved.append((sku, values))
+        for fields, group in group_by_fields(resolved):
+            objs = [Product(sku=sku, **{'description': '', **values}) for sku, values in group]
+            upsert(Product, objs, ['sku'], fields + ('updated_at',))
+
+        # Rows that list tags replace the product's tag set.
+        tagged = {sku: tags for sku, _, tags in rows if tags is not None}
+        if tagged:
+            self.replace_product_tags(tagged)
+        return len(rows)
+
+    def replace_product_tags(self, tagged):
+        product_ids = dict(Product.objects.filter(sku__in=tagged).values_list('sku', 'pk'))
+        wanted = {(product_ids[sku], self.tags[label]) for sku, labels in tagged.items() for label in labels}
+        stale = []
+        links = ProductTag.objects.filter(product_id__in=product_ids.values()).values_list('pk', 'product_id', 'tag_id')
+        for pk, product_id, tag_id in links:
+            if (product_id, tag_id) in wanted:
+                wanted.discard((product_id, tag_id))
+            else:
+                stale.append(pk)
+        if stale:
+            # Plain DELETE without per-row post_delete signals, like the rest of
+            # the import; catalog_bulk_changed at the end covers the removed links.
+            stale_links = ProductTag.objects.filter(pk__in=stale)
+            stale_links._raw_delete(stale_links.db)
+        ProductTag.objects.bulk_create([ProductTag(product_id=p, tag_id=t) for p, t in wanted])
+
+    def prepare_image(self, row):
+        sku = text(row, 'sku')
+        if not sku:
+            raise RowError("sku is required")
+        url = clean_value(ProductImage, 'image', text(row, 'image'))
+        values = {field: clean_value(ProductImage, field, row[field]) for field in present(row, IMAGE_FIELDS)}
+        values.setdefault('media_type', mimetypes.guess_type(url)[0] or 'image/jpeg')
+        return sku, url, values
+
+    def save_images(self, rows):
+        product_ids = dict(Product.objects.filter(sku__in={sku for _, (sku, _, _) in rows}).values_list('sku', 'pk'))
+        # Images have no natural key; (product, URL) identifies one.
+        existing = {
+            (product_id, url): pk
+            for pk, product_id, url in ProductImage.objects.filter(
+                product_id__in=product_ids.values()
+            ).values_list('pk', 'product_id', 'image')
+        }
+        now = timezone.now()
+        create, update = {}, {}
+        for number, (sku, url, values) in rows:
+            if sku not in product_ids:
+                self.reject(number, f"unknown product sku {sku!r}")
+                continue
+            key = (product_ids[sku], url)
+            image = ProductImage(product_id=key[0], image=url, **values)
+            if key in existing:
+                image.pk = existing[key]
+                image.updated_at = now
+                update[key] = (image, values)
+            else:
+                create[key] = image
+        ProductImage.objects.bulk_create(create.values())
+        # What the touch_product_on_related_change signal does for single saves.
+        Product.objects.filter(pk__in={key[0] for key in (*create, *update)}).update(updated_at=now)
+        for fields, group in group_by_fields(update.values()):
+            ProductImage.objects.bulk_update([image for image, _ in group], fields + ('updated_at',))
+        return len(create) + len(update)
+
+    def create_missing(self, model, lookup, names):
+        missing = names - set(lookup)
+        if missing:
+            model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+            lookup.update(model.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def load_manufacturers(self, names):
+        self.manufacturers.update(Manufacturer.objects.filter(name__in=names).values_list('name', 'pk'))
+
+    def load_tags(self, labels):
+        names = {name for name, _ in labels}
+        for pk, name, value in Tag.objects.filter(name__in=names).values_list('pk', 'name', 'value'):
+            self.tags[(name, value)] = pk
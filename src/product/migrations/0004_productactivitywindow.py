@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_dirtytrendingproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductActivityWindow',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_window', serialize=False, to='product.product')),
+                ('hour', models.PositiveIntegerField(default=0)),
+                ('views', models.JSONField(default=list)),
+                ('sales', models.JSONField(default=list)),
+                ('score', models.FloatField(default=0.0)),
+            ],
+        ),
+    ]
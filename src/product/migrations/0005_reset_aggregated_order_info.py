@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:07
+
+from django.db import migrations
+
+
+def reset_aggregated_order_info(apps, schema_editor):
+    # Old values were derived from sales_count * current price; the orders
+    # rollup rebuilds real totals from OrderItem.
+    Product = apps.get_model("product", "Product")
+    Product.objects.update(aggregated_order_info=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_productactivitywindow'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_aggregated_order_info, migrations.RunPython.noop),
+    ]
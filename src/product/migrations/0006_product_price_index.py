@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_reset_aggregated_order_info'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_pro_price_3acd1d_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:40
+
+from django.db import migrations
+
+# External-content FTS5 index over product_product(name, description), kept in
+# sync by triggers. Other databases use product.search.BasicSearchBackend.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        name, description,
+        content='product_product', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product_product BEGIN
+        INSERT INTO product_search(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE OF name, description ON product_product BEGIN
+        INSERT INTO product_search(product_search, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_search(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO product_search(product_search) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS product_search_au",
+    "DROP TRIGGER IF EXISTS product_search_ad",
+    "DROP TRIGGER IF EXISTS product_search_ai",
+    "DROP TABLE IF EXISTS product_search",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_product_price_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(FORWARD_SQL), run_on_sqlite(REVERSE_SQL)),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_product_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-sales_count', '-id'], name='product_pro_categor_530f77_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-trending_score', '-id'], name='product_pro_categor_0e53cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['manufacturer', '-sales_count', '-id'], name='product_pro_manufac_9584ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['manufacturer', '-trending_score', '-id'], name='product_pro_manufac_c75daf_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.core.validators import MinValueValidator, URLValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal
+from .querysets import ProductQuerySet
+from .utils import compute_trending_score
 
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -53,12 +55,15 @@ class Manufacturer(models.Model):
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name="products")
     name = models.CharField(max_length=255)
+    # Merchant stock-keeping unit; the upsert key for import_catalog
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal(0.01))])
     
     # Metrics for dynamic sections
     sales_count = models.PositiveIntegerField(default=0, db_index=True)
     views_count = models.PositiveIntegerField(default=0)
+    # Time-decayed score over the product's ProductActivityWindow, refreshed by product.trending
     trending_score = models.FloatField(default=0.0, db_index=True)
     
     # Aggregated order information
@@ -78,6 +83,8 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['sales_count']),
@@ -85,6 +92,14 @@ class Product(models.Model):
             models.Index(fields=['release_date']),
             models.Index(fields=['current_stock']),
             models.Index(fields=['is_launch']),
+            models.Index(fields=['price']),
+            # Change feed order (product.changes)
+            models.Index(fields=['updated_at', 'id']),
+            # Per-category and per-manufacturer leaderboards (product.leaderboards)
+            models.Index(fields=['category', '-sales_count', '-id']),
+            models.Index(fields=['category', '-trending_score', '-id']),
+            models.Index(fields=['manufacturer', '-sales_count', '-id']),
+            models.Index(fields=['manufacturer', '-trending_score', '-id']),
         ]
         ordering = ['-created_at']
 
@@ -121,4 +136,133 @@ class ProductImage(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Image for {self.product.name} ({'Primary' if self.is_primary else 'Secondary'})"
\ No newline at end of file
+        return f"Image for {self.product.name} ({'Primary' if self.is_primary else 'Secondary'})"
+
+
+class DirtyTrendingProduct(models.Model):
+    """
+    Products whose trending_score needs recomputing.
+    Saves only mark rows here; a coalesced background run recomputes and clears them.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Dirty trending score for product {self.product_id}"
+
+
+class ProductActivityWindow(models.Model):
+    """
+    Hourly view/sale buckets for a product, kept in a fixed-size ring.
+
+    `hour` is the newest bucket (hours since the unix epoch); bucket h lives in
+    slot h % WINDOW_HOURS. `score` is the exponentially decayed weighted sum of
+    the buckets as of `hour` and is maintained incrementally, so storage and
+    write cost stay bounded per product no matter how much history there is.
+    """
+    WINDOW_HOURS = 168
+    HALF_LIFE_HOURS = 24
+    DECAY_PER_HOUR = 0.5 ** (1 / HALF_LIFE_HOURS)
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='activity_window')
+    hour = models.PositiveIntegerField(default=0)
+    views = models.JSONField(default=list)
+    sales = models.JSONField(default=list)
+    score = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return f"Activity window for product {self.product_id}"
+
+    def advance(self, hour):
+        """
+        Move the head of the ring to `hour`, decaying the score and dropping
+        buckets that fall out of the window.
+        """
+        size = self.WINDOW_HOURS
+        if len(self.views) != size:
+            self.views = [0] * size
+            self.sales = [0] * size
+        elapsed = hour - self.hour
+        if elapsed <= 0:
+            return
+        if elapsed >= size:
+            self.views = [0] * size
+            self.sales = [0] * size
+            self.score = 0.0
+        else:
+            self.score *= self.DECAY_PER_HOUR ** elapsed
+            for h in range(self.hour + 1, hour + 1):
+                slot = h % size
+                # Slot held bucket h - size, which is now hour - h + size hours old.
+                dropped = compute_trending_score(self.sales[slot], self.views[slot])
+                if dropped:
+                    self.score -= dropped * self.DECAY_PER_HOUR ** (hour - h + size)
+                    self.views[slot] = 0
+                    self.sales[slot] = 0
+            self.score = max(self.score, 0.0)
+        self.hour = hour
+
+    def add(self, hour, views=0, sales=0):
+        """
+        Record activity in the bucket for `hour`. Activity older than the head
+        is applied to its own bucket with the matching decay.
+        """
+        self.advance(hour)
+        age = self.hour - hour
+        if age >= self.WINDOW_HOURS:
+            return
+        slot = hour % self.WINDOW_HOURS
+        self.views[slot] += views
+        self.sales[slot] += sales
+        self.score += compute_trending_score(sales, views) * self.DECAY_PER_HOUR ** age
+
+
+class ProductTombstone(models.Model):
+    """
+    Marks a deleted product for the change feed (product.changes), so
+    incremental clients learn about deletions. Pruned after
+    product.changes.TOMBSTONE_RETENTION.
+    """
+    product_id = models.BigIntegerField(primary_key=True)
+    sku = models.CharField(max_length=64, null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'product_id']),
+        ]
+
+    def __str__(self):
+        return f"Deleted product {self.product_id}"
+
+
+class ProductCoOccurrence(models.Model):
+    """
+    Number of orders containing both `product` and `related`: one cell of the
+    sparse co-occurrence matrix built from order items by
+    orders.cooccurrence. Stored for both orderings of each pair.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_product_cooccurrence'),
+        ]
+
+    def __str__(self):
+        return f"Products {self.product_id} and {self.related_id} in {self.orders} orders"
+
+
+class ProductNeighbours(models.Model):
+    """
+    The products most often bought together with `product`, best first, as
+    [[product id, orders], ...]; at most orders.cooccurrence.NEIGHBOURS_SIZE.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    neighbours = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbours of product {self.product_id}"
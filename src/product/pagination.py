@@ -0,0 +1,187 @@
+# product/pagination.py
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import RANK_ANNOTATION
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Cursor pagination keyed on (ordering field, pk).
+
+    Each page is a `WHERE (field, pk) > (last value, last pk) ORDER BY field, pk
+    LIMIT n` query, so its cost does not depend on how deep the client is,
+    unlike OFFSET. The ordering comes from the same `ordering` query parameter
+    OrderingFilter reads (first recognised term wins) and is baked into the
+    cursor, which is an opaque token; a cursor used with a different ordering
+    is rejected. Nullable fields sort their NULLs last. If the queryset carries
+    the `rank_annotation` (e.g. search relevance) and no ordering is requested,
+    pages are ordered by it, best first.
+    """
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering_fields = ()
+    default_ordering = None
+    rank_annotation = None
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.limit = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.field = self.ordering.lstrip('-')
+        self.nullable = self._is_nullable(queryset.model, self.field)
+
+        cursor = self.decode_cursor(request)
+        backwards = cursor is not None and cursor['d'] == 'prev'
+        descending = self.ordering.startswith('-') != backwards
+        # Walking backwards flips every sort key, NULL placement included.
+        nulls_last = not backwards
+
+        queryset = queryset.order_by(*self._order_by(descending, nulls_last))
+        if cursor is not None:
+            queryset = queryset.filter(self._after(cursor['v'], cursor['pk'], descending, nulls_last, queryset.model))
+
+        rows = list(queryset[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        param = request.query_params.get(self.ordering_param, '')
+        for term in param.split(','):
+            term = term.strip()
+            if term.lstrip('-') in self.ordering_fields:
+                return term
+        if self.rank_annotation and self.rank_annotation in queryset.query.annotations:
+            return f'-{self.rank_annotation}'
+        return self.default_ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], 'next')
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], 'prev')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            if cursor['o'] != self.ordering or cursor['d'] not in ('next', 'prev'):
+                raise ValueError
+            cursor['pk'] = int(cursor['pk'])
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, direction):
+        payload = {'o': self.ordering, 'v': self._encode_value(getattr(row, self.field)), 'pk': row.pk, 'd': direction}
+        return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+
+    def _link(self, row, direction):
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, direction))
+
+    def _order_by(self, descending, nulls_last):
+        key = F(self.field)
+        if self.nullable:
+            key = key.desc(nulls_last=nulls_last) if descending else key.asc(nulls_last=nulls_last)
+        else:
+            key = key.desc() if descending else key.asc()
+        return [key, '-pk' if descending else 'pk']
+
+    def _after(self, value, pk, descending, nulls_last, model):
+        """Rows that sort strictly after (value, pk) in the current scan order."""
+        cmp = 'lt' if descending else 'gt'
+        pk_after = Q(**{f'pk__{cmp}': pk})
+        if value is None:
+            condition = Q(**{f'{self.field}__isnull': True}) & pk_after
+            if not nulls_last:
+                condition |= Q(**{f'{self.field}__isnull': False})
+            return condition
+        value = self._decode_value(model, value)
+        condition = Q(**{f'{self.field}__{cmp}': value}) | (Q(**{self.field: value}) & pk_after)
+        if self.nullable and nulls_last:
+            condition |= Q(**{f'{self.field}__isnull': True})
+        return condition
+
+    @staticmethod
+    def _is_nullable(model, field):
+        try:
+            return model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            return False
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def _decode_value(self, model, value):
+        try:
+            return model._meta.get_field(self.field).to_python(value)
+        except FieldDoesNotExist:
+            return value
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    ordering_fields = ('created_at', 'sales_count', 'trending_score', 'price', 'release_date')
+    default_ordering = '-created_at'
+    rank_annotation = RANK_ANNOTATION
@@ -0,0 +1,35 @@
+# product/querysets.py
+
+from django.db import models
+
+# Relations rendered by ProductSerializer. Every product-listing path loads
+# them through the helpers below so a list costs a fixed number of queries.
+PRODUCT_SELECT_RELATED = ('category', 'manufacturer')
+PRODUCT_PREFETCH_RELATED = ('images', 'tags')
+
+
+def product_serializer_lookups(prefix=None):
+    """
+    (select_related, prefetch_related) lookups for serializing products that
+    are reached through `prefix` from another model, e.g. 'product' on a review.
+    """
+    def join(field):
+        return f'{prefix}__{field}' if prefix else field
+    return (
+        [join(field) for field in PRODUCT_SELECT_RELATED],
+        [join(field) for field in PRODUCT_PREFETCH_RELATED],
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def for_serializer(self):
+        """Preload everything ProductSerializer renders."""
+        select, prefetch = product_serializer_lookups()
+        return self.select_related(*select).prefetch_related(*prefetch)
+
+    def for_fragments(self):
+        """
+        Just what product.detail_cache.get_product_fragments needs; it
+        prefetches images and tags itself, for cache misses only.
+        """
+        return self.select_related(*PRODUCT_SELECT_RELATED)
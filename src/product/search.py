@@ -0,0 +1,196 @@
+# product/search.py
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import ExpressionWrapper, F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Ln
+from rest_framework.filters import SearchFilter
+
+from .models import Product
+
+# Annotation holding relevance on searched querysets; higher is better.
+RANK_ANNOTATION = 'search_rank'
+# Fields a client may boost relevance with, via ?search_boost=<key>.
+BOOST_FIELDS = {
+    'sales': 'sales_count',
+    'trending': 'trending_score',
+}
+BOOST_WEIGHT = 0.25
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    return _TERM_RE.findall(query or '')
+
+
+class BaseSearchBackend:
+    """
+    Product full-text search backend.
+
+    search() filters a Product queryset to the matches for `query` and
+    annotates it with RANK_ANNOTATION. Backends are responsible for keeping
+    their index in sync with Product writes; rebuild() reindexes everything.
+    """
+
+    def search(self, queryset, query, boost=None):
+        raise NotImplementedError
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        pass
+
+    def install(self, using=DEFAULT_DB_ALIAS):
+        """Make sure the index exists and is kept in sync; returns True if it had to be repaired."""
+        return False
+
+    def apply_boost(self, rank, boost):
+        field = BOOST_FIELDS.get(boost)
+        if field is None:
+            return rank
+        # Multiplicative, so the boost does not depend on the relevance scale.
+        return rank * (Value(1.0) + Value(BOOST_WEIGHT) * Ln(F(field) + Value(1.0)))
+
+    def annotate_rank(self, queryset, rank, boost):
+        return queryset.annotate(**{
+            RANK_ANNOTATION: ExpressionWrapper(self.apply_boost(rank, boost), output_field=FloatField())
+        })
+
+
+class FTSRank(Func):
+    """
+    bm25 relevance of the row's pk against an FTS5 `table`, negated so higher
+    is better. Compiled as a correlated subquery on the pk column, so it stays
+    valid when the queryset is aliased inside another query.
+    """
+    output_field = FloatField()
+
+    def __init__(self, table, match, weights, **extra):
+        self.table = table
+        self.match = match
+        self.weights = tuple(weights)
+        super().__init__(F('pk'), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk_sql, pk_params = compiler.compile(self.source_expressions[0])
+        weights = ', '.join(['%s'] * len(self.weights))
+        sql = (
+            f'(SELECT -bm25({self.table}, {weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND {self.table}.rowid = {pk_sql})'
+        )
+        return sql, (*self.weights, self.match, *pk_params)
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index over name and description.
+
+    `product_search` is an external-content FTS5 table over product_product,
+    kept in sync by triggers (see migration 0007), so queryset updates and
+    bulk writes are indexed too. Relevance is bm25 with name matches weighted
+    above description matches; the last term is a prefix match so results
+    work while the user is still typing.
+    """
+    table = 'product_search'
+    name_weight = 10.0
+    description_weight = 1.0
+
+    def match_expression(self, terms):
+        quoted = ['"%s"' % term.replace('"', '""') for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, queryset, query, boost=None):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        match = self.match_expression(terms)
+        queryset = queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (match,))
+        )
+        rank = FTSRank(self.table, match, (self.name_weight, self.description_weight))
+        return self.annotate_rank(queryset, rank, boost)
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES('rebuild')")
+
+    def install(self, using=DEFAULT_DB_ALIAS):
+        """
+        Recreate missing sync triggers and reindex if any were missing. SQLite
+        drops a table's triggers whenever a migration rebuilds the table (as
+        most product_product schema changes do), so this runs after migrate.
+        """
+        product_table = Product._meta.db_table
+        triggers = {
+            f'{self.table}_ai': f"""
+                CREATE TRIGGER {self.table}_ai AFTER INSERT ON {product_table} BEGIN
+                    INSERT INTO {self.table}(rowid, name, description) VALUES (new.id, new.name, new.description);
+                END""",
+            f'{self.table}_ad': f"""
+                CREATE TRIGGER {self.table}_ad AFTER DELETE ON {product_table} BEGIN
+                    INSERT INTO {self.table}({self.table}, rowid, name, description)
+                    VALUES ('delete', old.id, old.name, old.description);
+                END""",
+            f'{self.table}_au': f"""
+                CREATE TRIGGER {self.table}_au AFTER UPDATE OF name, description ON {product_table} BEGIN
+                    INSERT INTO {self.table}({self.table}, rowid, name, description)
+                    VALUES ('delete', old.id, old.name, old.description);
+                    INSERT INTO {self.table}(rowid, name, description) VALUES (new.id, new.name, new.description);
+                END""",
+        }
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table])
+            if cursor.fetchone() is None:
+                # Not migrated yet; migration 0007 creates the index.
+                return False
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [product_table])
+            missing = set(triggers) - {name for name, in cursor.fetchall()}
+            for name in sorted(missing):
+                cursor.execute(triggers[name])
+        if missing:
+            self.rebuild(using)
+        return bool(missing)
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """
+    Fallback for databases without a text index: every term must appear in the
+    name or description. Rank is constant, so only boosts change the order.
+    """
+
+    def search(self, queryset, query, boost=None):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return self.annotate_rank(queryset, Value(1.0), boost)
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    if connections[using].vendor == 'sqlite':
+        return SQLiteFTSSearchBackend()
+    return BasicSearchBackend()
+
+
+def install_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver; see SQLiteFTSSearchBackend.install."""
+    get_search_backend(using).install(using)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    SearchFilter backed by the product text index instead of icontains scans.
+    Results carry RANK_ANNOTATION, which ProductCursorPagination orders by when
+    no explicit ordering is requested.
+    """
+    boost_param = 'search_boost'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not search_terms(query):
+            return queryset
+        boost = request.query_params.get(self.boost_param)
+        return get_search_backend().search(queryset, query, boost=boost)
@@ -0,0 +1,200 @@
+# product/sections.py
+
+import hashlib
+import logging
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Product
+from .detail_cache import get_product_fragments
+from .leaderboards import LEADERBOARD_METRICS, LEADERBOARD_SCOPES, leaderboard_scope, top_product_ids
+
+# Every rendered product field feeds every section; a write to any of them
+# bumps this generation. Each section also has its own generation for the
+# field it ranks by, so e.g. a sales rollup does not invalidate new arrivals;
+# other sections show the new count after their next background refresh.
+CATALOG_GENERATION_KEY = 'product:sections:generation'
+SECTION_GENERATION_KEY = 'product:sections:{}:generation'
+ENTRY_KEY = 'product:sections:{}:{}'
+
+SECTION_SIZE = 10
+# Entries are rebuilt in the background once they are this old, which picks up
+# ranking changes too frequent to invalidate on, and rendered fields that are
+# never invalidated on (UNTRACKED_FIELDS), so those are at most REFRESH_AFTER
+# behind the product.detail_cache fragments they are copied from. Requests
+# never wait for that refresh; SECTION_TIMEOUT only bounds how long an entry
+# nobody reads stays in the cache.
+REFRESH_AFTER = 5 * 60
+SECTION_TIMEOUT = 60 * 60
+# How long one build may hold the single-flight lock, and how long other
+# requests wait for its result before building for themselves (seconds).
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT = 2
+BUILD_POLL_INTERVAL = 0.05
+
+# Product fields each section ranks or filters by.
+SECTION_FIELDS = {
+    'bestsellers': frozenset({'sales_count'}),
+    'trending': frozenset({'trending_score'}),
+    'new_arrivals': frozenset({'release_date'}),
+}
+# Fields that are rendered but not worth an invalidation per write.
+UNTRACKED_FIELDS = frozenset({'views_count', 'aggregated_order_info'})
+
+logger = logging.getLogger(__name__)
+
+
+def section_queryset(name, params, now):
+    products = Product.objects.for_fragments().filter(**{
+        LEADERBOARD_SCOPES[param]: value for param, value in params.items() if param in LEADERBOARD_SCOPES
+    })
+    if name == 'bestsellers':
+        return products.order_by('-sales_count')
+    if name == 'trending':
+        # trending_score holds the time-decayed activity score (see product.trending)
+        return products.order_by('-trending_score')
+    if name == 'new_arrivals':
+        return products.filter(release_date__lte=now).order_by('-release_date')
+    raise ValueError(f"Unknown product section {name!r}")
+
+
+def build_section(name, params=None):
+    """
+    Serialize a section and return a cache entry:
+    {'data', 'built_at', 'expires_at'}. `expires_at` is set when the result
+    will change by itself, e.g. when an upcoming product is released.
+    Bestsellers and trending for one category or manufacturer are read from
+    product.leaderboards.
+    """
+    params = params or {}
+    now = timezone.now()
+    scope = leaderboard_scope(params)
+    if scope is not None and name in LEADERBOARD_METRICS:
+        ids = top_product_ids(LEADERBOARD_METRICS[name], scope, SECTION_SIZE)
+        found = Product.objects.for_fragments().in_bulk(ids)
+        products = [found[pk] for pk in ids if pk in found]
+    else:
+        products = list(section_queryset(name, params, now)[:SECTION_SIZE])
+    expires_at = None
+    if name == 'new_arrivals':
+        upcoming = (
+            Product.objects.filter(release_date__gt=now)
+            .order_by('release_date').values_list('release_date', flat=True).first()
+        )
+        expires_at = upcoming.timestamp() if upcoming else None
+    fragments = get_product_fragments(products)
+    return {
+        'data': [fragments[product.pk] for product in products],
+        'built_at': time.time(),
+        'expires_at': expires_at,
+    }
+
+
+def _generation(key):
+    return cache.get_or_set(key, 1, timeout=None)
+
+
+def _bump(key):
+    _generation(key)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def section_key(name, params=None):
+    """
+    Cache key for a section: the generations it depends on plus the query
+    parameters that change its content (sorted, so order does not matter).
+    """
+    generations = cache.get_many([CATALOG_GENERATION_KEY, SECTION_GENERATION_KEY.format(name)])
+    catalog = generations.get(CATALOG_GENERATION_KEY) or _generation(CATALOG_GENERATION_KEY)
+    section = generations.get(SECTION_GENERATION_KEY.format(name)) or _generation(SECTION_GENERATION_KEY.format(name))
+    variant = hashlib.sha1(repr(sorted((params or {}).items())).encode()).hexdigest()[:16]
+    return ENTRY_KEY.format(name, f'{catalog}.{section}.{variant}')
+
+
+def store_section(name, params=None):
+    """Build a section and cache it under the current generations. Returns (key, entry)."""
+    key = section_key(name, params)
+    entry = build_section(name, params)
+    cache.set(key, entry, timeout=SECTION_TIMEOUT)
+    return key, entry
+
+
+def get_section(name, params=None):
+    """
+    Return (cache key, entry) for a section, building it if needed.
+
+    An entry is valid until one of its generations is bumped, so hits never
+    serve data older than the last relevant write. Entries past
+    REFRESH_AFTER are still served while one background refresh runs. On a
+    miss only the request that wins the lock builds; the others wait for its
+    result rather than all querying the database at once.
+    """
+    key = section_key(name, params)
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and (entry['expires_at'] is None or entry['expires_at'] > now):
+        if now - entry['built_at'] >= REFRESH_AFTER:
+            try:
+                schedule_section_refresh(name, params, key)
+            except Exception:
+                logger.exception("Could not queue refresh of product section %s; serving cached entry", name)
+        return key, entry
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, timeout=BUILD_LOCK_TIMEOUT):
+        try:
+            entry = build_section(name, params)
+            cache.set(key, entry, timeout=SECTION_TIMEOUT)
+            return key, entry
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + BUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(BUILD_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return key, entry
+    return key, build_section(name, params)
+
+
+def schedule_section_refresh(name, params, key):
+    """
+    Queue a background rebuild of one section entry unless one is pending.
+    Returns True if queued.
+    """
+    from .tasks import refresh_product_section
+
+    scheduled_key = f'{key}:refresh-scheduled'
+    if not cache.add(scheduled_key, True, timeout=REFRESH_AFTER):
+        return False
+    try:
+        refresh_product_section.delay(name, params or {})
+    except Exception:
+        cache.delete(scheduled_key)
+        raise
+    return True
+
+
+def invalidate_sections(fields=None):
+    """
+    Bump the generations that depend on `fields` (Product field names).
+    None means any rendered data may have changed, which affects every
+    section.
+    """
+    if fields is None:
+        _bump(CATALOG_GENERATION_KEY)
+        return
+    fields = set(fields) - UNTRACKED_FIELDS
+    ranked = set()
+    for name, section_fields in SECTION_FIELDS.items():
+        if section_fields & fields:
+            _bump(SECTION_GENERATION_KEY.format(name))
+            ranked |= section_fields
+    if fields - ranked:
+        _bump(CATALOG_GENERATION_KEY)
@@ -1,21 +1,267 @@
 # product/signals.py
 
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import Product
-from .tasks import update_trending_scores
-from .utils import aggregate_order_info
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .bitmaps import invalidate_product_index, publish_change
+from .changes import record_tombstone
+from .detail_cache import invalidate_all_product_details, invalidate_product_details
+from .facets import FACET_INVALIDATION_FIELDS, invalidate_facets
+from .leaderboards import invalidate_leaderboards, update_leaderboards
+from .sections import invalidate_sections
+from .models import Category, Manufacturer, Product, ProductImage, ProductTag, Tag
+from .trending import mark_trending_dirty
+
+# Sent with product_ids and the rewritten `fields` after bulk jobs update
+# product fields (trending_score, sales_count, current_stock, ...) through
+# queryset updates, which do not fire post_save.
+scores_updated = Signal()
+# Sent once after bulk catalog writes (e.g. import_catalog) that bypass the
+# per-row signals below.
+catalog_bulk_changed = Signal()
+
+# Activity counters; saves that touch none of them skip the trending recompute.
+TRENDING_INPUT_FIELDS = frozenset({'sales_count', 'views_count'})
 
 @receiver(post_save, sender=Product)
-def update_product_fields(sender, instance, created, **kwargs):
+def update_product_fields(sender, instance, created, update_fields=None, **kwargs):
     """
     Trigger background updates when a product is saved.
-    - Schedule a task to update the trending score.
-    - Update aggregated order info without recursion by using queryset update.
+    - Mark the product dirty; a coalesced task recomputes dirty scores at most once per window.
+    aggregated_order_info is maintained by orders.rollups, not on save.
     """
-    # Schedule trending score update (this task can be optimized to update only when needed)
-    update_trending_scores.delay()
+    if update_fields is None or TRENDING_INPUT_FIELDS.intersection(update_fields):
+        mark_trending_dirty([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_facets_on_product_change(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or FACET_INVALIDATION_FIELDS.intersection(update_fields):
+        invalidate_facets()
+
+
+@receiver(scores_updated)
+def invalidate_facets_on_scores(sender, fields=None, **kwargs):
+    if fields is None or FACET_INVALIDATION_FIELDS.intersection(fields):
+        invalidate_facets()
+
+
+def invalidate_facets_on_catalog_change(sender, **kwargs):
+    invalidate_facets()
+
+
+# Facet labels and tag assignments; Product.tags.add() bulk-creates ProductTag
+# rows, which only fires m2m_changed.
+for model in (Category, Manufacturer, Tag, ProductTag):
+    post_save.connect(invalidate_facets_on_catalog_change, sender=model)
+    post_delete.connect(invalidate_facets_on_catalog_change, sender=model)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_facets_on_tags_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_facets()
+
+
+# -- product.bitmaps change log -------------------------------------------------
+
+INDEXED_PRODUCT_FIELDS = frozenset({'category', 'category_id', 'manufacturer', 'manufacturer_id'})
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or INDEXED_PRODUCT_FIELDS.intersection(update_fields):
+        publish_change('product', instance.pk, instance.category_id, instance.manufacturer_id)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    publish_change('product_deleted', instance.pk)
+
+
+@receiver(post_save, sender=ProductTag)
+def index_product_tag(sender, instance, created, **kwargs):
+    if created:
+        publish_change('tag_links', instance.tag_id, [instance.product_id], True)
+    else:
+        # The row may have moved to another tag; publish the product's full tag set.
+        tag_ids = list(ProductTag.objects.filter(product_id=instance.product_id).values_list('tag_id', flat=True))
+        publish_change('product_tag_set', instance.product_id, tag_ids)
+
+
+@receiver(post_delete, sender=ProductTag)
+def unindex_product_tag(sender, instance, **kwargs):
+    # Also covers tags.remove() and tags.clear(), which delete through the queryset.
+    publish_change('tag_links', instance.tag_id, [instance.product_id], False)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def index_added_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    # tags.add() bulk-creates ProductTag rows without post_save.
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        publish_change('tag_links', instance.pk, sorted(pk_set), True)
+    else:
+        for tag_id in sorted(pk_set):
+            publish_change('tag_links', tag_id, [instance.pk], True)
+
+
+@receiver(post_save, sender=Tag)
+def index_tag(sender, instance, **kwargs):
+    publish_change('tag', instance.pk, instance.name, instance.value)
+
+
+@receiver(post_delete, sender=Tag)
+def unindex_tag(sender, instance, **kwargs):
+    publish_change('tag_deleted', instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    publish_change('category_deleted', instance.pk)
+
+
+@receiver(post_delete, sender=Manufacturer)
+def unindex_manufacturer(sender, instance, **kwargs):
+    publish_change('manufacturer_deleted', instance.pk)
+
+
+@receiver(catalog_bulk_changed)
+def invalidate_after_bulk_change(sender, **kwargs):
+    invalidate_facets()
+    invalidate_product_index()
+    invalidate_sections()
+    invalidate_all_product_details()
+    invalidate_leaderboards()
+
+
+# -- Product.updated_at --------------------------------------------------------
+
+def touch_products(product_ids):
+    """
+    Bump updated_at for products whose tags or images changed, so incremental
+    exports see them. A queryset update, so no post_save cascade.
+    """
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_on_related_change(sender, instance, **kwargs):
+    touch_products([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def touch_products_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    touch_products(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def tombstone_product(sender, instance, **kwargs):
+    # Lets change-feed clients (product.changes) see the deletion.
+    record_tombstone(instance)
+
+
+# -- product.leaderboards ----------------------------------------------------------
+# Connected before the section receivers, so a section rebuilt after a score
+# change reads the updated boards.
+
+LEADERBOARD_FIELDS = frozenset({'category', 'category_id', 'manufacturer', 'manufacturer_id', 'sales_count', 'trending_score'})
+
+
+@receiver(post_save, sender=Product)
+def invalidate_leaderboards_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or LEADERBOARD_FIELDS.intersection(update_fields):
+        invalidate_leaderboards()
+
+
+def invalidate_leaderboards_on_scope_change(sender, **kwargs):
+    invalidate_leaderboards()
+
+
+# Deleting a category or manufacturer nulls the products' foreign key in the database.
+for model in (Product, Category, Manufacturer):
+    post_delete.connect(invalidate_leaderboards_on_scope_change, sender=model)
+
+
+@receiver(scores_updated)
+def update_leaderboards_on_scores(sender, product_ids=None, fields=None, **kwargs):
+    if product_ids is None or fields is None:
+        invalidate_leaderboards()
+    else:
+        transaction.on_commit(lambda: update_leaderboards(product_ids, fields))
+
+
+# -- product.sections generations ------------------------------------------------
+
+@receiver(post_save, sender=Product)
+def invalidate_sections_on_save(sender, instance, update_fields=None, **kwargs):
+    invalidate_sections(update_fields)
+
+
+def invalidate_sections_on_catalog_change(sender, **kwargs):
+    invalidate_sections()
+
+
+for model in (ProductImage, ProductTag, Tag, Category, Manufacturer):
+    post_save.connect(invalidate_sections_on_catalog_change, sender=model)
+    post_delete.connect(invalidate_sections_on_catalog_change, sender=model)
+post_delete.connect(invalidate_sections_on_catalog_change, sender=Product)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_sections_on_tags_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_sections()
+
+
+@receiver(scores_updated)
+def invalidate_sections_on_scores(sender, fields=None, **kwargs):
+    invalidate_sections(fields)
+
+
+# -- product.detail_cache versions ------------------------------------------------
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_detail_on_product_change(sender, instance, **kwargs):
+    invalidate_product_details([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+def invalidate_detail_on_related_change(sender, instance, **kwargs):
+    invalidate_product_details([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_detail_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add' and pk_set:
+        invalidate_product_details(pk_set if reverse else [instance.pk])
+
+
+def invalidate_details_on_shared_change(sender, **kwargs):
+    invalidate_all_product_details()
+
+
+# Rendered on every product that uses them.
+for model in (Tag, Category, Manufacturer):
+    post_save.connect(invalidate_details_on_shared_change, sender=model)
+    post_delete.connect(invalidate_details_on_shared_change, sender=model)
+
 
-    # Update aggregated order info; avoid recursion by using the queryset update.
-    info = aggregate_order_info(instance)
-    sender.objects.filter(pk=instance.pk).update(aggregated_order_info=info)
+@receiver(scores_updated)
+def invalidate_detail_on_scores(sender, product_ids=None, **kwargs):
+    if product_ids is None:
+        invalidate_all_product_details()
+    else:
+        invalidate_product_details(product_ids)
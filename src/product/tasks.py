@@ -1,20 +1,64 @@
 # product/tasks.py
 
+import logging
+
 from celery import shared_task
-from .models import Product
-from .utils import compute_trending_score
+from . import changes, counters, sections, trending
+
+logger = logging.getLogger(__name__)
+
 
 @shared_task
-def update_trending_scores():
+def update_trending_scores(chunk_size=trending.DEFAULT_CHUNK_SIZE):
     """
     Task to update trending_score for all products.
-    This can be scheduled periodically (e.g., every 5 minutes) via Celery beat.
-    """
-    weight_sales = 0.7
-    weight_views = 0.3
-    products = Product.objects.all()
-    for product in products:
-        new_score = compute_trending_score(product.sales_count, product.views_count, weight_sales, weight_views)
-        # Update only the trending_score field to avoid unnecessary writes
-        product.trending_score = new_score
-        product.save(update_fields=['trending_score'])
+    Schedule it hourly via Celery beat so scores keep decaying for idle products.
+    Work is done in chunked, set-based UPDATEs; only rows whose score changes are written.
+    """
+    stats = trending.recompute_trending_scores(chunk_size=chunk_size)
+    logger.info("Trending recompute: scanned=%(scanned)d written=%(written)d", stats)
+    return stats
+
+
+@shared_task
+def recompute_dirty_trending_scores(chunk_size=trending.DEFAULT_CHUNK_SIZE):
+    """
+    Coalesced recompute for products marked dirty by saves.
+    Queued at most once per trending.RECOMPUTE_WINDOW by trending.schedule_trending_recompute.
+    """
+    stats = trending.recompute_dirty_trending_scores(chunk_size=chunk_size)
+    if stats is None:
+        logger.info("Dirty trending recompute deferred: another run holds the lock")
+    else:
+        logger.info("Dirty trending recompute: scanned=%(scanned)d written=%(written)d", stats)
+    return stats
+
+
+@shared_task
+def prune_product_tombstones():
+    """
+    Delete change-feed tombstones older than changes.TOMBSTONE_RETENTION.
+    Schedule it daily via Celery beat.
+    """
+    deleted = changes.prune_tombstones()
+    logger.info("Pruned %d product tombstones", deleted)
+    return deleted
+
+
+@shared_task
+def refresh_product_section(name, params=None):
+    """
+    Rebuild one cached product section ahead of time.
+    Queued by sections.schedule_section_refresh when an entry gets old.
+    """
+    key, _ = sections.store_section(name, params)
+    return key
+
+
+@shared_task
+def flush_view_counts():
+    """
+    Write the product views workers hand to the cache into views_count.
+    Schedule it every minute via Celery beat.
+    """
+    return counters.apply_view_counts()
@@ -49,9 +49,9 @@ class ProductAPITestCase(APITestCase):
     def test_list_products(self):
         response = self.client.get('/api/product/products/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['name'], "Laptop")
-        self.assertEqual(response.data[1]['name'], "Smartphone")
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['name'], "Laptop")
+        self.assertEqual(response.data['results'][1]['name'], "Smartphone")
 
     # Test: Retrieve a single product
     def test_retrieve_product(self):
@@ -117,18 +117,18 @@ class ProductAPITestCase(APITestCase):
     def test_search_products(self):
         response = self.client.get('/api/product/products/?search=Smartphone')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], "Smartphone")
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], "Smartphone")
 
     # Test: Filter products by category
     def test_filter_products_by_category(self):
         response = self.client.get(f'/api/product/products/?category={self.category.id}')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
     # Test: Order products by price
     def test_order_products_by_price(self):
         response = self.client.get('/api/product/products/?ordering=price')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data[0]['name'], "Smartphone")  # Lowest price first
-        self.assertEqual(response.data[1]['name'], "Laptop")      # Highest price last
\ No newline at end of file
+        self.assertEqual(response.data['results'][0]['name'], "Smartphone")  # Lowest price first
+        self.assertEqual(response.data['results'][1]['name'], "Laptop")      # Highest price last
\ No newline at end of file
@@ -0,0 +1,141 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from product.bitmaps import LOG_KEY, ProductBitmapIndex, current_generation, parse_expression
+from product.models import Category, Product, ProductTag, Tag
+
+class ParseExpressionTest(APITestCase):
+    def test_precedence(self):
+        self.assertEqual(
+            parse_expression("Size=M AND Color=Blue OR NOT Color=Red"),
+            ('or',
+             ('and', ('term', 'label', ('size', 'm')), ('term', 'label', ('color', 'blue'))),
+             ('not', ('term', 'label', ('color', 'red')))),
+        )
+
+    def test_parentheses_ids_and_implicit_and(self):
+        self.assertEqual(
+            parse_expression('(tag:1 or "Color=Navy Blue") category:2'),
+            ('and',
+             ('or', ('term', 'tag', 1), ('term', 'label', ('color', 'navy blue'))),
+             ('term', 'category', 2)),
+        )
+
+    def test_invalid(self):
+        for text in ("", "Color", "(Color=Red", "Color=Red OR", "tag:x", "Color=Red )"):
+            with self.assertRaises(ValueError, msg=text):
+                parse_expression(text)
+
+
+class ProductBitmapIndexTest(APITestCase):
+    def test_sparse_ids_and_reverse_links(self):
+        index = ProductBitmapIndex()
+        # Far-apart ids cost one entry each, not a bit for every smaller id.
+        for change in (
+            ('product', 7, None, None),
+            ('product', 10 ** 12, None, None),
+            ('tag_links', 1, [7, 10 ** 12], True),
+            ('tag_links', 2, [10 ** 12], True),
+            ('product_tag_set', 7, [2]),
+        ):
+            index._apply(change)
+        self.assertEqual(index._evaluate(('term', 'tag', 1)), {10 ** 12})
+        self.assertEqual(index._evaluate(('term', 'tag', 2)), {7, 10 ** 12})
+        self.assertEqual(index._evaluate(('not', ('term', 'tag', 1))), {7})
+
+        index._apply(('product_deleted', 10 ** 12))
+        self.assertEqual(index._evaluate(('term', 'tag', 1)), set())
+        self.assertEqual(index._evaluate(('term', 'tag', 2)), {7})
+        self.assertEqual(dict(index._product_tags), {7: {2}})
+
+
+class TagExpressionFilterTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = ProductBitmapIndex()
+        for target, value in (
+            ('product.bitmaps.product_index', self.index),
+            # Committed writes also queue these; keep them off the broker.
+            ('product.tasks.recompute_dirty_trending_scores.apply_async', mock.DEFAULT),
+            ('main.tasks.rebuild_landing_snapshot.apply_async', mock.DEFAULT),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.women = Category.objects.create(name="Women")
+            self.medium = Tag.objects.create(name="Size", value="Medium")
+            self.blue = Tag.objects.create(name="Color", value="Blue")
+            self.red = Tag.objects.create(name="Color", value="Red")
+            self.a = self.create("A", [self.medium, self.blue], category=self.women)
+            self.b = self.create("B", [self.medium, self.red])
+            self.c = self.create("C", [self.red])
+            self.d = self.create("D", [])
+
+    def tearDown(self):
+        cache.clear()
+
+    def create(self, name, tags, category=None):
+        product = Product.objects.create(name=name, price=10, category=category)
+        for tag in tags:
+            ProductTag.objects.create(product=product, tag=tag)
+        return product
+
+    def names(self, expression):
+        response = self.client.get('/api/product/products/', {'tag_expr': expression, 'ordering': 'price'})
+        self.assertEqual(response.status_code, 200)
+        return sorted(p['name'] for p in response.data['results'])
+
+    def test_expressions(self):
+        self.assertEqual(self.names("Size=Medium AND Color=Blue OR Color=Red"), ["A", "B", "C"])
+        self.assertEqual(self.names("Size=Medium AND (Color=Blue OR Color=Red)"), ["A", "B"])
+        self.assertEqual(self.names("NOT Color=Red"), ["A", "D"])
+        self.assertEqual(self.names(f"tag:{self.red.id} NOT category:{self.women.id}"), ["B", "C"])
+        self.assertEqual(self.names("color=red size=MEDIUM"), ["B"])
+        self.assertEqual(self.names("Color=Green"), [])
+
+    def test_matches_database_fallback(self):
+        expected = self.names("Size=Medium AND (Color=Blue OR NOT Color=Red)")
+        with mock.patch('product.bitmaps.MAX_INLINE_IDS', 0):
+            self.assertEqual(self.names("Size=Medium AND (Color=Blue OR NOT Color=Red)"), expected)
+
+    def test_invalid_expression(self):
+        response = self.client.get('/api/product/products/', {'tag_expr': "Color=Red AND"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tag_expr', response.data)
+
+    def test_query_cost_does_not_grow_with_terms(self):
+        complex_expr = "(Size=Medium AND Color=Blue) OR (Color=Red AND NOT category:1) OR Size=Large"
+        self.names("Color=Red")
+        self.names(complex_expr)
+        # the product page only; products are rendered from cached fragments
+        with self.assertNumQueries(1):
+            self.names("Color=Red")
+        with self.assertNumQueries(1):
+            self.names(complex_expr)
+
+    def test_writes_replay_incrementally(self):
+        self.names("Color=Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.d.tags.add(self.red)
+            ProductTag.objects.filter(product=self.c).delete()
+            self.a.category = None
+            self.a.save()
+            self.b.delete()
+            self.blue.value = "Navy"
+            self.blue.save()
+        with mock.patch.object(self.index, '_rebuild') as rebuild:
+            self.assertEqual(self.names("Color=Red"), ["D"])
+            self.assertEqual(self.names(f"category:{self.women.id}"), [])
+            self.assertEqual(self.names("Color=Navy"), ["A"])
+            self.assertEqual(self.names("Size=Medium"), ["A"])
+        rebuild.assert_not_called()
+
+    def test_rebuilds_when_log_is_lost(self):
+        self.names("Color=Red")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.d.tags.add(self.red)
+        cache.delete(LOG_KEY.format(current_generation()))
+        self.assertEqual(self.names("Color=Red"), ["B", "C", "D"])
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from product.changes import FEED_LAG, TOMBSTONE_RETENTION, changes_since, decode_cursor, encode_cursor, prune_tombstones
+from product.counters import ViewCountBuffer, apply_view_counts
+from product.models import Product, ProductTombstone
+from product.tests.test_query_budget import create_catalog
+from product.trending import record_activity, recompute_trending_scores
+
+@mock.patch('product.changes.FEED_LAG', timedelta(0))
+class ProductChangeFeedTest(APITestCase):
+    def setUp(self):
+        self.products = [Product.objects.create(name=f"P{i}", description="", price=10) for i in range(5)]
+        self.ids = [p.pk for p in self.products]
+
+    def poll(self, cursor=None, limit=2):
+        params = {'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get('/api/product/products/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def sync(self, cursor=None):
+        seen = []
+        while True:
+            data = self.poll(cursor)
+            seen.extend((row['id'], row['deleted']) for row in data['results'])
+            cursor = data['cursor']
+            if not data['has_more']:
+                return seen, cursor
+
+    def test_full_sync_then_deltas(self):
+        seen, cursor = self.sync()
+        self.assertEqual(seen, [(p.pk, False) for p in self.products])
+
+        data = self.poll(cursor)
+        self.assertEqual((data['results'], data['has_more']), ([], False))
+        cursor = data['cursor']
+
+        self.products[1].price = 12
+        self.products[1].save()
+        self.products[3].delete()
+        seen, cursor = self.sync(cursor)
+        self.assertEqual(seen, [(self.ids[1], False), (self.ids[3], True)])
+        self.assertEqual(self.sync(cursor)[0], [])
+
+    def test_counter_and_score_updates_reach_the_feed(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        _, cursor = self.sync()
+        buffer = ViewCountBuffer(autostart=False)
+        buffer.record(self.ids[0])
+        buffer.flush()
+        apply_view_counts()
+        seen, cursor = self.sync(cursor)
+        self.assertEqual(seen, [(self.ids[0], False)])
+
+        record_activity({self.ids[2]: (0, 3)})
+        recompute_trending_scores(product_ids=[self.ids[2]])
+        data = self.poll(cursor)
+        self.assertEqual([row['id'] for row in data['results']], [self.ids[2]])
+        self.assertGreater(data['results'][0]['product']['trending_score'], 0)
+
+    def test_product_payload(self):
+        row = self.poll(limit=1)['results'][0]
+        self.assertEqual(row['product']['name'], "P0")
+        self.products[0].delete()
+        self.products[1].delete()
+        rows = self.sync()[0]
+        self.assertEqual(rows[-2:], [(self.ids[0], True), (self.ids[1], True)])
+
+    def test_ties_on_timestamp_break_on_id(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        seen, _ = self.sync()
+        self.assertEqual([pk for pk, _ in seen], [p.pk for p in self.products])
+
+    def test_bad_cursors(self):
+        response = self.client.get('/api/product/products/changes/', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 404)
+        old = encode_cursor(timezone.now() - TOMBSTONE_RETENTION - timedelta(days=1), 1)
+        response = self.client.get('/api/product/products/changes/', {'cursor': old})
+        self.assertEqual(response.status_code, 410)
+
+    def test_page_cost_is_independent_of_catalog_size(self):
+        create_catalog(20)
+        _, cursor, _ = changes_since(limit=3)
+        # products, images, tags, tombstones
+        with self.assertNumQueries(4):
+            changes, _, has_more = changes_since(decode_cursor(cursor), limit=3)
+        self.assertEqual(len(changes), 3)
+        self.assertTrue(has_more)
+
+    def test_prune_tombstones(self):
+        self.products[0].delete()
+        self.products[1].delete()
+        ProductTombstone.objects.filter(product_id=self.ids[0]).update(
+            deleted_at=timezone.now() - TOMBSTONE_RETENTION - timedelta(hours=1)
+        )
+        self.assertEqual(prune_tombstones(), 1)
+        self.assertEqual(list(ProductTombstone.objects.values_list('product_id', flat=True)), [self.ids[1]])
+
+
+class ProductChangeFeedLagTest(APITestCase):
+    def test_recent_changes_wait_for_the_lag(self):
+        product = Product.objects.create(name="Fresh", description="", price=10)
+        self.assertEqual(changes_since()[0], [])
+        changes, cursor, _ = changes_since(now=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(changes, [('product', product)])
+        self.assertIsNotNone(cursor)
+
+    def test_empty_page_advances_cursor_to_the_horizon(self):
+        start = timezone.now() - timedelta(days=1)
+        product = Product.objects.create(name="Idle", description="", price=10)
+        Product.objects.filter(pk=product.pk).update(updated_at=start)
+        _, cursor, _ = changes_since()
+        self.assertEqual(decode_cursor(cursor), (start, product.pk))
+
+        now = timezone.now()
+        changes, cursor, has_more = changes_since(decode_cursor(cursor), now=now)
+        self.assertEqual((changes, has_more), ([], False))
+        self.assertEqual(decode_cursor(cursor), (now - FEED_LAG, 0))
+
+        # A change stamped exactly at the old horizon is still delivered.
+        Product.objects.filter(pk=product.pk).update(updated_at=now - FEED_LAG)
+        changes, _, _ = changes_since(decode_cursor(cursor), now=now + FEED_LAG)
+        self.assertEqual(changes, [('product', product)])
@@ -0,0 +1,136 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from product import counters
+from product.counters import ViewCountBuffer, apply_view_counts, view_counter
+from product.detail_cache import detail_stamp
+from product.models import Category, Product, ProductActivityWindow
+
+class ViewCountBufferTest(TestCase):
+    def setUp(self):
+        view_counter.flush()
+        cache.clear()
+        self.category = Category.objects.create(name="Electronics")
+        self.phone = Product.objects.create(category=self.category, name="Phone", price=10, views_count=5)
+        self.tablet = Product.objects.create(category=self.category, name="Tablet", price=10)
+        self.buffer = ViewCountBuffer(flush_interval=3600, autostart=False)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_hits_are_buffered_until_flush(self):
+        for _ in range(3):
+            self.buffer.record(self.phone.pk)
+        self.buffer.record(self.tablet.pk)
+
+        self.assertEqual(self.buffer.stats()['pending_products'], 2)
+        self.assertEqual(self.buffer.stats()['pending_views'], 4)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.buffer.stats()['pending_views'], 0)
+        self.assertEqual(self.buffer.stats()['last_flush']['views'], 4)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 5)
+
+        stats = apply_view_counts()
+        self.assertEqual((stats['batches'], stats['products'], stats['views']), (1, 2, 4))
+        self.assertGreaterEqual(stats['latency_ms'], 0)
+        self.phone.refresh_from_db()
+        self.tablet.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 8)
+        self.assertEqual(self.tablet.views_count, 1)
+        self.assertEqual(apply_view_counts()['batches'], 0)
+
+    def test_applied_views_invalidate_product_details(self):
+        stamp = detail_stamp(self.phone.pk)
+        self.buffer.record(self.phone.pk)
+        self.buffer.flush()
+        apply_view_counts()
+        self.assertNotEqual(detail_stamp(self.phone.pk), stamp)
+
+    def test_batches_of_several_workers_are_summed(self):
+        other = ViewCountBuffer(autostart=False)
+        self.buffer.record(self.phone.pk, count=2)
+        other.record(self.phone.pk, count=3)
+        self.buffer.flush()
+        other.flush()
+        apply_view_counts()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 10)
+        self.assertEqual(sum(ProductActivityWindow.objects.get(pk=self.phone.pk).views), 5)
+
+    def test_unstored_batch_is_retried_once(self):
+        self.buffer.record(self.phone.pk)
+        self.buffer.flush()
+        apply_view_counts()
+        # A batch number taken by a worker that has not stored the batch yet
+        sequence = cache.incr(counters.VIEW_SEQUENCE_KEY)
+        apply_view_counts()
+        cache.set(counters.VIEW_BATCH_KEY.format(sequence), {self.phone.pk: 4})
+        apply_view_counts()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 10)
+
+    @mock.patch('product.counters.VIEW_DRAIN_SIZE', 2)
+    def test_backlog_is_drained_in_chunks(self):
+        for _ in range(7):
+            self.buffer.record(self.phone.pk)
+            self.buffer.flush()
+        self.assertEqual(apply_view_counts()['batches'], 7)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 12)
+
+    def test_restarted_sequence_is_read_from_its_start(self):
+        self.buffer.record(self.phone.pk)
+        self.buffer.flush()
+        apply_view_counts()
+        cache.delete(counters.VIEW_SEQUENCE_KEY)
+        for count in (2, 3):
+            self.buffer.record(self.phone.pk, count=count)
+            self.buffer.flush()
+        self.assertEqual(apply_view_counts()['views'], 5)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 11)
+
+    def test_lock_of_a_later_run_is_kept(self):
+        self.buffer.record(self.phone.pk)
+        self.buffer.flush()
+
+        def expire_and_relock(counts):
+            # This run outlived its lock and the next run took it.
+            cache.set(counters.VIEW_LOCK_KEY, 'next-run')
+
+        with mock.patch('product.counters._apply_counts', side_effect=expire_and_relock):
+            apply_view_counts()
+        self.assertEqual(cache.get(counters.VIEW_LOCK_KEY), 'next-run')
+        self.assertIsNone(apply_view_counts())
+
+    def test_timer_flushes_idle_buffer(self):
+        buffer = ViewCountBuffer(flush_interval=0.01)
+        buffer.record(self.phone.pk)
+        for _ in range(100):
+            if not buffer.stats()['pending_views']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(buffer.stats()['pending_views'], 0)
+        apply_view_counts()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 6)
+
+    def test_deleted_products_are_ignored(self):
+        self.buffer.record(self.tablet.pk)
+        self.buffer.flush()
+        self.tablet.delete()
+        self.assertEqual(apply_view_counts()['products'], 1)
+        self.assertFalse(ProductActivityWindow.objects.exists())
+
+    def test_retrieve_records_view(self):
+        APIClient().get(f'/api/product/products/{self.phone.pk}/')
+        self.assertEqual(view_counter.stats()['pending_views'], 1)
+        view_counter.flush()
+        apply_view_counts()
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.views_count, 6)
@@ -0,0 +1,126 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from product.detail_cache import LocalLRU, get_product_fragments, local_details
+from product.models import Category, Product, ProductImage, Tag
+from product.serializers import ProductSerializer
+from product.tests.test_query_budget import create_catalog
+
+class ProductDetailCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_details.clear()
+        self.product = create_catalog(1)[0]
+        self.url = f'/api/product/products/{self.product.pk}/'
+
+    def tearDown(self):
+        cache.clear()
+        local_details.clear()
+
+    def get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    @mock.patch('product.views.view_counter.record')
+    def test_hit_costs_no_queries_and_still_counts_the_view(self, record):
+        self.get()
+        with self.assertNumQueries(0):
+            data = self.get()
+        self.assertEqual(data['name'], self.product.name)
+        self.assertEqual(record.call_count, 2)
+
+    def test_shared_cache_serves_other_workers(self):
+        self.get()
+        local_details.clear()
+        with self.assertNumQueries(0):
+            self.get()
+
+    def test_writes_invalidate(self):
+        self.get()
+        self.product.price = 99
+        self.product.save()
+        self.assertEqual(self.get()['price'], "99.00")
+
+        ProductImage.objects.create(product=self.product, image="http://cdn.test/c.jpg", media_type="image/jpeg")
+        self.assertEqual(len(self.get()['images']), 3)
+
+        tag = self.product.tags.first()
+        tag.value = "renamed"
+        tag.save()
+        self.assertIn("renamed", [t['value'] for t in self.get()['tags']])
+
+        self.product.tags.add(Tag.objects.create(name="Fit", value="Slim"))
+        self.assertEqual(len(self.get()['tags']), 3)
+
+        Category.objects.filter(pk=self.product.category_id).get().delete()
+        self.assertIsNone(self.get()['category'])
+
+    def test_commit_bumps_again(self):
+        self.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.name = "Renamed"
+            self.product.save()
+        # A reader during the transaction caches the old row under the new stamp...
+        with mock.patch('product.detail_cache.Product.objects.for_serializer') as for_serializer:
+            for_serializer.return_value.get.return_value = Product.objects.get(pk=self.product.pk)
+            for_serializer.return_value.get.return_value.name = "Stale"
+            self.assertEqual(self.get()['name'], "Stale")
+        # ...which the post-commit bump discards.
+        with mock.patch('product.tasks.recompute_dirty_trending_scores.apply_async'), \
+                mock.patch('main.tasks.rebuild_landing_snapshot.apply_async'):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.get()['name'], "Renamed")
+
+    def test_missing_product(self):
+        self.assertEqual(self.client.get('/api/product/products/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/product/products/abc/').status_code, 404)
+
+    def test_l1_is_bounded(self):
+        lru = LocalLRU(size=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+class ProductFragmentTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_details.clear()
+        self.products = create_catalog(4)
+
+    def tearDown(self):
+        cache.clear()
+        local_details.clear()
+
+    def list_products(self):
+        response = self.client.get('/api/product/products/', {'ordering': 'created_at'})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_list_serializes_only_misses(self):
+        self.list_products()
+        self.products[1].price = 12
+        self.products[1].save()
+        with mock.patch('product.detail_cache.ProductSerializer', wraps=ProductSerializer) as serializer:
+            results = self.list_products()
+        self.assertEqual([product.pk for product in serializer.call_args.args[0]], [self.products[1].pk])
+        self.assertEqual([r['price'] for r in results], ["10.00", "12.00", "10.00", "10.00"])
+
+    def test_cached_list_costs_the_page_query(self):
+        self.list_products()
+        local_details.clear()
+        with self.assertNumQueries(1):
+            self.list_products()
+
+    def test_shared_with_detail(self):
+        product = self.products[0]
+        self.client.get(f'/api/product/products/{product.pk}/')
+        with mock.patch('product.detail_cache.ProductSerializer') as serializer:
+            fragments = get_product_fragments([Product.objects.for_fragments().get(pk=product.pk)])
+        serializer.assert_not_called()
+        self.assertEqual(fragments[product.pk], self.list_products()[0])
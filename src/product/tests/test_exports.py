@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from product.exports import export_queryset, iter_records
+from product.models import Category, Product, ProductImage, Tag
+from product.tests.test_query_budget import create_catalog
+
+class ProductExportTest(APITestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(username="staff", password="password123", is_staff=True)
+        self.category = Category.objects.create(name="Women")
+        self.dress = Product.objects.create(sku="DR-1", name="Dress", description="Red", price=40, category=self.category)
+        self.red = Tag.objects.create(name="Color", value="Red")
+        self.dress.tags.add(self.red)
+        ProductImage.objects.create(product=self.dress, image="http://cdn.test/dress.jpg", media_type="image/jpeg", is_primary=True)
+        self.mug = Product.objects.create(sku="MG-1", name="Mug", description="Ceramic", price=5)
+
+    def export(self, **params):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get('/api/product/products/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        self.assertIn(self.client.get('/api/product/products/export/').status_code, (401, 403))
+        user = get_user_model().objects.create_user(username="shopper", password="password123")
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/api/product/products/export/').status_code, 403)
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row['sku'] for row in rows], ["DR-1", "MG-1"])
+        self.assertEqual(rows[0]['category'], "Women")
+        self.assertEqual(rows[0]['tags'], ["Color=Red"])
+        self.assertEqual(rows[0]['images'][0]['image'], "http://cdn.test/dress.jpg")
+        self.assertEqual(rows[0]['price'], "40.00")
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(export_format='csv'))))
+        self.assertEqual([row['sku'] for row in rows], ["DR-1", "MG-1"])
+        self.assertEqual((rows[0]['tags'], rows[0]['images']), ("Color=Red", "http://cdn.test/dress.jpg"))
+        self.assertEqual(rows[1]['category'], "")
+
+    def test_updated_since(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=3))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.export(updated_since=since), "")
+
+        # Tag and image changes count as product changes.
+        self.mug.tags.add(self.red)
+        self.assertEqual([json.loads(line)['sku'] for line in self.export(updated_since=since).splitlines()], ["MG-1"])
+        self.assertEqual(len(self.export(updated_since=timezone.now().date().isoformat()).splitlines()), 1)
+
+    def test_invalid_parameters(self):
+        self.client.force_authenticate(user=self.staff)
+        for params in ({'updated_since': 'yesterday'}, {'updated_since': '2024-13-01'}, {'export_format': 'xml'}):
+            self.assertEqual(self.client.get('/api/product/products/export/', params).status_code, 400, params)
+
+    def test_prefetches_per_chunk(self):
+        Product.objects.all().delete()
+        create_catalog(6)
+        # One streamed product query, plus images and tags for each chunk of 2.
+        with self.assertNumQueries(1 + 2 * 3):
+            records = list(iter_records(export_queryset(), chunk_size=2))
+        self.assertEqual(len(records), 6)
+        self.assertTrue(all(len(r['tags']) == 2 and len(r['images']) == 2 for r in records))
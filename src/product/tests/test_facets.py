@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from product.facets import FACET_INVALIDATION_FIELDS, compute_facets
+from product.models import Category, Manufacturer, Product, ProductTag, Tag
+from product.views import ProductViewSet
+
+class ProductFacetsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.women = Category.objects.create(name="Women")
+        self.men = Category.objects.create(name="Men")
+        self.acme = Manufacturer.objects.create(name="Acme")
+        self.red = Tag.objects.create(name="Color", value="Red")
+        self.blue = Tag.objects.create(name="Color", value="Blue")
+        self.small = Tag.objects.create(name="Size", value="S")
+        self.dress = self.create("Dress", self.women, 30, [self.red, self.small])
+        self.skirt = self.create("Skirt", self.women, 20, [self.red, self.blue])
+        self.shirt = self.create("Shirt", self.men, 250, [self.blue], manufacturer=self.acme)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create(self, name, category, price, tags, manufacturer=None):
+        product = Product.objects.create(name=name, category=category, price=price, manufacturer=manufacturer)
+        for tag in tags:
+            ProductTag.objects.create(product=product, tag=tag)
+        return product
+
+    def facets(self, **params):
+        response = self.client.get('/api/product/products/', {'facets': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['facets']
+
+    def test_counts(self):
+        facets = self.facets()
+        self.assertEqual(facets['count'], 3)
+        self.assertEqual([(c['name'], c['count']) for c in facets['category']], [("Women", 2), ("Men", 1)])
+        self.assertEqual([(m['name'], m['count']) for m in facets['manufacturer']], [("Acme", 1)])
+        self.assertEqual([(t['value'], t['count']) for t in facets['tags']['Color']], [("Blue", 2), ("Red", 2)])
+        self.assertEqual([(t['value'], t['count']) for t in facets['tags']['Size']], [("S", 1)])
+        self.assertEqual([b['count'] for b in facets['price']], [1, 1, 0, 0, 1])
+
+    def test_counts_follow_filters(self):
+        facets = self.facets(tags=self.red.id)
+        self.assertEqual(facets['count'], 2)
+        self.assertEqual([(c['name'], c['count']) for c in facets['category']], [("Women", 2)])
+        self.assertEqual({t['value']: t['count'] for t in facets['tags']['Color']}, {"Red": 2, "Blue": 1})
+
+    def test_counts_follow_search(self):
+        self.assertEqual(self.facets(search="shirt")['count'], 1)
+
+    def test_omitted_unless_requested(self):
+        response = self.client.get('/api/product/products/')
+        self.assertNotIn('facets', response.data)
+
+    def test_bounded_queries(self):
+        for i in range(10):
+            self.create(f"Extra {i}", Category.objects.create(name=f"Extra {i}"), 60, [Tag.objects.create(name=f"T{i}", value="x")])
+        with self.assertNumQueries(4):
+            compute_facets(Product.objects.all())
+
+    def test_cached_until_catalog_changes(self):
+        self.facets()
+        with self.assertNumQueries(1):
+            # the product page only; products are rendered from cached fragments
+            self.client.get('/api/product/products/', {'facets': 'true'})
+
+        self.shirt.price = 40
+        self.shirt.save()
+        self.assertEqual([b['count'] for b in self.facets()['price']], [1, 2, 0, 0, 0])
+
+        self.dress.tags.add(self.blue)
+        self.assertEqual({t['value']: t['count'] for t in self.facets()['tags']['Color']}, {"Red": 2, "Blue": 3})
+
+    def test_cache_ignores_paging_params(self):
+        self.facets()
+        with self.assertNumQueries(1):
+            self.client.get('/api/product/products/', {'facets': 'true', 'page_size': 1, 'ordering': 'price'})
+
+    def test_saves_of_filtered_and_searched_fields_invalidate(self):
+        self.assertEqual(self.facets(current_stock=5)['count'], 0)
+        self.assertEqual(self.facets(search="blouse")['count'], 0)
+        self.shirt.current_stock = 5
+        self.shirt.save(update_fields=['current_stock'])
+        self.assertEqual(self.facets(current_stock=5)['count'], 1)
+        self.shirt.name = "Blouse"
+        self.shirt.save(update_fields=['name'])
+        self.assertEqual(self.facets(search="blouse")['count'], 1)
+
+    def test_list_filters_are_invalidation_fields(self):
+        self.assertLessEqual(
+            {*ProductViewSet.filterset_fields, *ProductViewSet.search_fields}, FACET_INVALIDATION_FIELDS,
+        )
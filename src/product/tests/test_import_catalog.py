@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from product.models import Category, Manufacturer, Product, ProductImage, ProductTag, Tag
+from product.search import get_search_backend
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def write_jsonl(self, name, rows):
+        return self.write(name, ''.join(json.dumps(row) + '\n' for row in rows))
+
+    def run_import(self, **files):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', stdout=stdout, stderr=stderr, **files)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_imports_every_kind(self):
+        self.run_import(
+            manufacturers=self.write('m.csv', "name,contact_email\nAcme,sales@acme.test\n"),
+            tags=self.write('t.csv', "name,value,description\nColor,Red,Bright\n"),
+            products=self.write_jsonl('p.jsonl', [
+                {"sku": "TS-1", "name": "Red Shirt", "price": "19.99", "category": "Men",
+                 "manufacturer": "Acme", "tags": ["Color=Red", "Size=M"], "release_date": "2024-05-01T10:00:00"},
+                {"sku": "JN-1", "name": "Jeans", "price": 49.5, "description": "Denim", "is_launch": True},
+            ]),
+            images=self.write('i.csv', "sku,image,is_primary\nTS-1,http://cdn.test/ts1.png,true\n"),
+        )
+        shirt = Product.objects.get(sku="TS-1")
+        self.assertEqual(shirt.category.name, "Men")
+        self.assertEqual(shirt.manufacturer.contact_email, "sales@acme.test")
+        self.assertEqual(sorted((t.name, t.value) for t in shirt.tags.all()), [("Color", "Red"), ("Size", "M")])
+        self.assertEqual(Tag.objects.get(name="Color", value="Red").description, "Bright")
+        image = shirt.images.get()
+        self.assertEqual((image.media_type, image.is_primary), ("image/png", True))
+        self.assertTrue(Product.objects.get(sku="JN-1").is_launch)
+        # The search index is maintained by database triggers, not signals.
+        results = get_search_backend().search(Product.objects.all(), "denim")
+        self.assertEqual([p.sku for p in results], ["JN-1"])
+
+    def test_reimport_updates_in_place(self):
+        self.run_import(products=self.write_jsonl('p.jsonl', [
+            {"sku": "TS-1", "name": "Shirt", "price": "10", "description": "Cotton", "tags": "Color=Red;Size=M"},
+        ]))
+        self.run_import(
+            products=self.write_jsonl('p2.jsonl', [
+                {"sku": "TS-1", "name": "Shirt v2", "price": "12", "tags": ["Color=Blue"]},
+            ]),
+            images=self.write('i.csv', "sku,image,alt_text\nTS-1,http://cdn.test/a.jpg,Front\nTS-1,http://cdn.test/a.jpg,Front view\n"),
+        )
+        self.run_import(images=self.write('i2.csv', "sku,image,alt_text\nTS-1,http://cdn.test/a.jpg,Back\n"))
+
+        shirt = Product.objects.get()
+        self.assertEqual((shirt.name, shirt.price), ("Shirt v2", 12))
+        # Columns missing from the file keep their values.
+        self.assertEqual(shirt.description, "Cotton")
+        self.assertEqual([t.value for t in shirt.tags.all()], ["Blue"])
+        self.assertEqual(ProductImage.objects.get().alt_text, "Back")
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        path = self.write_jsonl('p.jsonl', [
+            {"sku": "A", "name": "Good", "price": "5"},
+            {"sku": "B", "name": "Free", "price": "0"},
+            {"name": "No sku", "price": "5"},
+            {"sku": "C", "name": "Bad tag", "price": "5", "tags": ["Red=Red"]},
+        ])
+        with open(path, 'a') as handle:
+            handle.write("not json\n")
+        _, stderr = self.run_import(products=path)
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ["A"])
+        for line in (2, 3, 4, 5):
+            self.assertIn(f"p.jsonl:{line}:", stderr)
+
+    @mock.patch('product.signals.mark_trending_dirty')
+    @mock.patch('product.signals.publish_change')
+    @mock.patch('product.signals.invalidate_facets')
+    def test_no_per_row_signals(self, invalidate_facets, publish_change, mark_trending_dirty):
+        self.run_import(products=self.write_jsonl('p.jsonl', [
+            {"sku": f"S{i}", "name": f"P{i}", "price": "5", "category": "Men", "tags": ["Color=Red"]} for i in range(20)
+        ]))
+        self.assertEqual(Product.objects.count(), 20)
+        mark_trending_dirty.assert_not_called()
+        publish_change.assert_not_called()
+        # Once, for the whole import.
+        invalidate_facets.assert_called_once_with()
+
+    def test_replaced_tags_fire_no_per_row_signals(self):
+        rows = [{"sku": f"S{i}", "name": f"P{i}", "price": "5", "tags": ["Color=Red", "Size=M"]} for i in range(10)]
+        self.run_import(products=self.write_jsonl('p.jsonl', rows))
+        for row in rows:
+            row['tags'] = ["Color=Blue"]
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=ProductTag, weak=False)
+        self.addCleanup(post_delete.disconnect, receiver, sender=ProductTag)
+        with mock.patch('product.signals.invalidate_facets') as invalidate_facets:
+            self.run_import(products=self.write_jsonl('p2.jsonl', rows))
+        receiver.assert_not_called()
+        # Once, for the whole import.
+        invalidate_facets.assert_called_once_with()
+        self.assertEqual(set(ProductTag.objects.values_list('tag__value', flat=True)), {"Blue"})
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        def count_queries(rows):
+            Product.objects.all().delete()
+            path = self.write_jsonl(f'p{rows}.jsonl', [
+                {"sku": f"S{i}", "name": f"P{i}", "price": "5", "category": "Men", "tags": [f"Color=C{i % 3}"]}
+                for i in range(rows)
+            ])
+            with CaptureQueriesContext(connection) as queries:
+                self.run_import(products=path)
+            return len(queries)
+
+        count_queries(5)  # first run creates the category and tags
+        self.assertEqual(count_queries(10), count_queries(50))
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(Manufacturer.objects.count(), 0)
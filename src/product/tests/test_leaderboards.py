@@ -0,0 +1,119 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APITestCase
+from product import leaderboards
+from product.leaderboards import apply_score, top_product_ids
+from product.models import Category, Manufacturer, Product
+from product.signals import scores_updated
+
+
+class ApplyScoreTest(TestCase):
+    def board(self, scores, floor=None):
+        return {'entries': [(score, pk) for pk, score in scores], 'floor': floor}
+
+    def test_moves_entry_to_its_rank(self):
+        board = self.board([(1, 30), (2, 20), (3, 10)])
+        self.assertTrue(apply_score(board, 3, 25))
+        self.assertEqual(board['entries'], [(30, 1), (25, 3), (20, 2)])
+
+    def test_ties_rank_higher_id_first(self):
+        board = self.board([(1, 30), (2, 20)])
+        apply_score(board, 3, 20)
+        self.assertEqual([pk for _, pk in board['entries']], [1, 3, 2])
+
+    @mock.patch('product.leaderboards.LEADERBOARD_SIZE', 2)
+    def test_entries_below_floor_leave_the_board(self):
+        board = self.board([(1, 30), (2, 20), (3, 10)], floor=(10, 3))
+        apply_score(board, 4, 5)
+        self.assertEqual(len(board['entries']), 3)
+        self.assertTrue(apply_score(board, 1, 1))
+        self.assertEqual(board['entries'], [(20, 2), (10, 3)])
+        # Fewer than K exact entries: the board must be rebuilt.
+        self.assertFalse(apply_score(board, 2, 1))
+
+
+class CategoryLeaderboardTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.women = Category.objects.create(name="Women")
+        self.men = Category.objects.create(name="Men")
+        self.brand = Manufacturer.objects.create(name="Brand")
+        self.dress = self.create("Dress", self.women, 30)
+        self.skirt = self.create("Skirt", self.women, 10)
+        self.shirt = self.create("Shirt", self.men, 50)
+
+    def tearDown(self):
+        cache.clear()
+
+    def create(self, name, category, sales):
+        return Product.objects.create(name=name, description="", price=10, category=category, manufacturer=self.brand, sales_count=sales)
+
+    def names(self, section, **params):
+        response = self.client.get(f'/api/product/products/{section}/', params)
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.data]
+
+    def set_sales(self, product, sales):
+        Product.objects.filter(pk=product.pk).update(sales_count=sales)
+        with mock.patch('main.tasks.rebuild_landing_snapshot.apply_async'), \
+                self.captureOnCommitCallbacks(execute=True):
+            scores_updated.send(sender=Product, product_ids=[product.pk], fields=['sales_count'])
+
+    def test_sections_by_category_and_manufacturer(self):
+        self.assertEqual(self.names('bestsellers', category=self.women.pk), ["Dress", "Skirt"])
+        self.assertEqual(self.names('bestsellers', manufacturer=self.brand.pk), ["Shirt", "Dress", "Skirt"])
+        self.assertEqual(self.client.get('/api/product/products/bestsellers/', {'category': 999}).data, {'data': []})
+        self.assertEqual(self.names('bestsellers'), ["Shirt", "Dress", "Skirt"])
+
+    def test_invalid_id(self):
+        response = self.client.get('/api/product/products/trending/', {'category': 'women'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.data)
+
+    def test_cached_board_costs_no_queries(self):
+        scope = ('category_id', self.women.pk)
+        top_product_ids('sales_count', scope, 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(top_product_ids('sales_count', scope, 10), [self.dress.pk, self.skirt.pk])
+
+    def test_score_changes_update_boards_in_place(self):
+        self.names('bestsellers', category=self.women.pk)
+        with mock.patch('product.leaderboards.build_board', wraps=leaderboards.build_board) as build:
+            self.set_sales(self.skirt, 40)
+            self.assertEqual(self.names('bestsellers', category=self.women.pk), ["Skirt", "Dress"])
+        build.assert_not_called()
+
+    def test_moving_category_rebuilds(self):
+        self.names('bestsellers', category=self.women.pk)
+        self.shirt.category = self.women
+        self.shirt.save()
+        self.assertEqual(self.names('bestsellers', category=self.women.pk), ["Shirt", "Dress", "Skirt"])
+
+    def test_concurrent_update_drops_only_the_locked_boards(self):
+        women, men = ('category_id', self.women.pk), ('category_id', self.men.pk)
+        top_product_ids('sales_count', women, 10)
+        top_product_ids('sales_count', men, 10)
+        key = leaderboards.board_key('sales_count', women)
+        cache.add(leaderboards.LOCK_KEY.format(key), True)
+        self.set_sales(self.skirt, 40)
+        cache.delete(leaderboards.LOCK_KEY.format(key))
+        self.assertIsNone(cache.get(key))
+        self.assertIsNotNone(cache.get(leaderboards.board_key('sales_count', men)))
+        self.assertEqual(top_product_ids('sales_count', women, 10), [self.skirt.pk, self.dress.pk])
+
+    def test_update_during_build_drops_the_built_board(self):
+        women = ('category_id', self.women.pk)
+        build_board = leaderboards.build_board
+
+        def build_then_update(metric, scope):
+            # The build read the old scores; the update lands before it stores them.
+            board = build_board(metric, scope)
+            self.set_sales(self.skirt, 40)
+            return board
+
+        with mock.patch('product.leaderboards.build_board', side_effect=build_then_update):
+            self.assertEqual(top_product_ids('sales_count', women, 10), [self.dress.pk, self.skirt.pk])
+        self.assertIsNone(cache.get(leaderboards.board_key('sales_count', women)))
+        self.assertEqual(top_product_ids('sales_count', women, 10), [self.skirt.pk, self.dress.pk])
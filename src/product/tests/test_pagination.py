@@ -0,0 +1,77 @@
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from product.models import Category, Product
+
+class ProductCursorPaginationTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        self.other = Category.objects.create(name="Garden")
+        now = timezone.now()
+        # Prices repeat so pages have to tie-break on id.
+        self.products = [
+            Product.objects.create(
+                category=self.category if i % 3 else self.other,
+                name=f"Product {i}",
+                description="gadget" if i % 2 else "tool",
+                price=10 + i % 4,
+                sales_count=i,
+                release_date=None if i % 5 == 0 else now - timedelta(days=i),
+            )
+            for i in range(20)
+        ]
+
+    def walk(self, query):
+        names = []
+        url = f'/api/product/products/?page_size=3&{query}'
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names.extend(p['name'] for p in response.data['results'])
+            pages.append(url)
+            url = response.data['next']
+        return names, pages
+
+    def test_default_ordering_is_newest_first(self):
+        names, _ = self.walk('')
+        expected = [p.name for p in sorted(self.products, key=lambda p: (p.created_at, p.pk), reverse=True)]
+        self.assertEqual(names, expected)
+
+    def test_pages_cover_every_row_once_with_ties(self):
+        for ordering in ('price', '-price', 'sales_count', '-trending_score', 'release_date', '-release_date'):
+            names, _ = self.walk(f'ordering={ordering}')
+            self.assertEqual(len(names), 20, ordering)
+            self.assertEqual(len(set(names)), 20, ordering)
+
+    def test_tie_break_on_id(self):
+        names, _ = self.walk('ordering=price')
+        expected = [p.name for p in sorted(self.products, key=lambda p: (p.price, p.pk))]
+        self.assertEqual(names, expected)
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get('/api/product/products/?page_size=4&ordering=-price')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_composes_with_filter_and_search(self):
+        names, _ = self.walk(f'category={self.category.id}&search=gadget&ordering=sales_count')
+        expected = [
+            p.name for p in self.products
+            if p.category_id == self.category.id and p.description == "gadget"
+        ]
+        self.assertEqual(names, expected)
+
+    def test_cursor_bound_to_ordering(self):
+        first = self.client.get('/api/product/products/?page_size=3&ordering=price')
+        cursor = parse_qs(urlparse(first.data['next']).query)['cursor'][0]
+        response = self.client.get('/api/product/products/', {'ordering': '-price', 'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/product/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from product.models import Category, Manufacturer, Product, ProductImage, ProductTag, Tag
+
+# Queries per product list: products (+category, manufacturer), images, tags.
+PRODUCT_LIST_QUERIES = 3
+
+
+def create_catalog(count):
+    """Products with a category, manufacturer, two images and two tags each."""
+    category = Category.objects.create(name=f"Category {count}")
+    manufacturer = Manufacturer.objects.create(name=f"Manufacturer {count}")
+    tags = [Tag.objects.create(name="Color", value=f"c{count}"), Tag.objects.create(name="Size", value=f"s{count}")]
+    products = []
+    for i in range(count):
+        product = Product.objects.create(
+            category=category, manufacturer=manufacturer, name=f"Product {count}-{i}",
+            price=10, sales_count=i, release_date=timezone.now(),
+        )
+        for primary in (True, False):
+            ProductImage.objects.create(product=product, image="http://example.com/p.jpg", media_type="image/jpeg", is_primary=primary)
+        for tag in tags:
+            ProductTag.objects.create(product=product, tag=tag)
+        products.append(product)
+    return products
+
+
+class ProductQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def tearDown(self):
+        cache.clear()
+
+    def assert_budget(self, url, queries=PRODUCT_LIST_QUERIES):
+        for size in (2, 8):
+            Product.objects.all().delete()
+            create_catalog(size)
+            cache.clear()
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_product_list(self):
+        self.assert_budget('/api/product/products/')
+
+    def test_bestsellers(self):
+        self.assert_budget('/api/product/products/bestsellers/')
+
+    def test_trending(self):
+        self.assert_budget('/api/product/products/trending/')
+
+    def test_new_arrivals(self):
+        # + the next upcoming release date, which bounds how long the entry is valid
+        self.assert_budget('/api/product/products/new_arrivals/', PRODUCT_LIST_QUERIES + 1)
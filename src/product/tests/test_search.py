@@ -0,0 +1,54 @@
+from rest_framework.test import APITestCase
+from product.models import Product
+from product.search import BasicSearchBackend, get_search_backend
+
+class ProductSearchTest(APITestCase):
+    def setUp(self):
+        self.shirt = Product.objects.create(name="Red Shirt", description="Cotton shirt", price=10, sales_count=1)
+        self.dress = Product.objects.create(name="Summer Dress", description="A red dress", price=30, sales_count=500)
+        self.mug = Product.objects.create(name="Coffee Mug", description="Ceramic", price=5)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/product/products/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("red"), ["Red Shirt", "Summer Dress"])
+
+    def test_boost_by_sales(self):
+        self.assertEqual(self.search("red", search_boost="sales")[0], "Summer Dress")
+
+    def test_prefix_match_on_last_term(self):
+        self.assertEqual(self.search("coff"), ["Coffee Mug"])
+
+    def test_stemming(self):
+        self.assertEqual(self.search("shirts"), ["Red Shirt"])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.mug.name = "Travel Tumbler"
+        self.mug.save()
+        self.assertEqual(self.search("mug"), [])
+        self.assertEqual(self.search("tumbler"), ["Travel Tumbler"])
+        Product.objects.filter(pk=self.shirt.pk).update(description="Linen")
+        self.assertEqual(self.search("cotton"), [])
+        self.dress.delete()
+        self.assertEqual(self.search("dress"), [])
+
+    def test_explicit_ordering_overrides_relevance(self):
+        self.assertEqual(self.search("red", ordering="-price"), ["Summer Dress", "Red Shirt"])
+
+    def test_paginates_by_relevance(self):
+        first = self.client.get('/api/product/products/', {'search': 'red', 'page_size': 1})
+        second = self.client.get(first.data['next'])
+        self.assertEqual(first.data['results'][0]['name'], "Red Shirt")
+        self.assertEqual(second.data['results'][0]['name'], "Summer Dress")
+        self.assertIsNone(second.data['next'])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('red" OR NEAR('), [])
+
+    def test_basic_backend(self):
+        results = BasicSearchBackend().search(Product.objects.all(), "red", boost="sales").order_by('-search_rank')
+        self.assertEqual([p.name for p in results], ["Summer Dress", "Red Shirt"])
+        self.assertEqual(get_search_backend().__class__.__name__, "SQLiteFTSSearchBackend")
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from product import sections
+from product.models import Product, ProductImage
+from product.trending import recompute_trending_scores
+
+class ProductSectionCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.top = Product.objects.create(name="Top", description="", price=10, sales_count=50, release_date=timezone.now())
+        self.other = Product.objects.create(name="Other", description="", price=20, sales_count=5, release_date=timezone.now())
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, section, **headers):
+        return self.client.get(f'/api/product/products/{section}/', **headers)
+
+    def names(self, section):
+        return [p['name'] for p in self.get(section).data]
+
+    def test_hits_cost_no_queries(self):
+        self.get('bestsellers')
+        with self.assertNumQueries(0):
+            response = self.get('bestsellers')
+        self.assertEqual([p['name'] for p in response.data], ["Top", "Other"])
+
+    def test_price_change_is_visible_immediately(self):
+        self.get('bestsellers')
+        self.top.price = 12
+        self.top.save()
+        self.assertEqual(self.get('bestsellers').data[0]['price'], "12.00")
+
+    def test_ranked_fields_only_invalidate_their_section(self):
+        self.get('bestsellers')
+        self.get('new_arrivals')
+        self.other.sales_count = 500
+        self.other.save(update_fields=['sales_count'])
+        with self.assertNumQueries(0):
+            self.get('new_arrivals')
+        self.assertEqual(self.names('bestsellers'), ["Other", "Top"])
+
+    def test_related_and_bulk_writes_invalidate(self):
+        self.get('trending')
+        ProductImage.objects.create(product=self.top, image="http://cdn.test/a.jpg", media_type="image/jpeg")
+        images = {p['name']: len(p['images']) for p in self.get('trending').data}
+        self.assertEqual(images, {"Top": 1, "Other": 0})
+
+        with mock.patch('product.trending.decayed_score_expression', return_value=5.0):
+            recompute_trending_scores()
+        self.assertEqual({p['trending_score'] for p in self.get('trending').data}, {5.0})
+
+    def test_upcoming_release_expires_new_arrivals(self):
+        Product.objects.create(name="Soon", description="", price=5, release_date=timezone.now() + timedelta(hours=1))
+        self.assertNotIn("Soon", self.names('new_arrivals'))
+        with mock.patch('product.sections.time.time', return_value=(timezone.now() + timedelta(hours=2)).timestamp()), \
+                mock.patch('product.sections.timezone.now', return_value=timezone.now() + timedelta(hours=2)):
+            self.assertIn("Soon", self.names('new_arrivals'))
+
+    @mock.patch('product.tasks.refresh_product_section.apply_async')
+    def test_old_entries_refresh_in_the_background(self, apply_async):
+        self.get('bestsellers')
+        later = (timezone.now() + timedelta(seconds=sections.REFRESH_AFTER + 1)).timestamp()
+        with mock.patch('product.sections.time.time', return_value=later):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.get('bestsellers').status_code, 200)
+            self.get('bestsellers')
+        apply_async.assert_called_once()
+
+    def test_single_flight_on_miss(self):
+        key = sections.section_key('bestsellers')
+        cache.add(f'{key}:lock', True)
+        built = {'data': [], 'built_at': 0, 'expires_at': None}
+        with mock.patch('product.sections.time.sleep', side_effect=lambda _: cache.set(key, built)), \
+                mock.patch('product.sections.build_section') as build:
+            self.assertEqual(sections.get_section('bestsellers'), (key, built))
+        build.assert_not_called()
+
+    def test_http_caching_headers(self):
+        response = self.get('bestsellers')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertEqual(self.get('bestsellers', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.top.price = 11
+        self.top.save()
+        self.assertEqual(self.get('bestsellers', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from product import trending
+from product.models import Category, DirtyTrendingProduct, Product, ProductActivityWindow
+from product.tasks import update_trending_scores
+from product.trending import record_activity, recompute_dirty_trending_scores, recompute_trending_scores
+from product.utils import compute_trending_score
+
+class TrendingRecomputeTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        self.products = [
+            Product.objects.create(category=self.category, name=f"Product {i}", price=10)
+            for i in range(5)
+        ]
+        # The first product has no activity and keeps its default 0.0 score.
+        record_activity({p.pk: (i * 100, i * 10) for i, p in enumerate(self.products)})
+
+    def test_scores_match_python_helper(self):
+        update_trending_scores()
+        for i, product in enumerate(self.products):
+            product.refresh_from_db()
+            self.assertAlmostEqual(product.trending_score, compute_trending_score(i * 10, i * 100))
+
+    def test_reports_scanned_and_written(self):
+        stats = recompute_trending_scores(chunk_size=2)
+        self.assertEqual(stats, {'scanned': 5, 'written': 4})
+
+    def test_unchanged_rows_are_skipped(self):
+        recompute_trending_scores()
+        stats = recompute_trending_scores()
+        self.assertEqual(stats, {'scanned': 5, 'written': 0})
+
+    def test_subset_of_products(self):
+        stats = recompute_trending_scores(product_ids=[self.products[1].pk])
+        self.assertEqual(stats, {'scanned': 1, 'written': 1})
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].trending_score, 0.0)
+
+    def test_lifetime_counters_do_not_trend(self):
+        Product.objects.filter(pk=self.products[0].pk).update(sales_count=10000, views_count=10000)
+        recompute_trending_scores()
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].trending_score, 0.0)
+
+
+class ActivityWindowTest(TestCase):
+    def setUp(self):
+        self.window = ProductActivityWindow()
+        self.hour = 500000
+
+    def test_score_decays_by_half_life(self):
+        self.window.add(self.hour, sales=10)
+        self.window.advance(self.hour + ProductActivityWindow.HALF_LIFE_HOURS)
+        self.assertAlmostEqual(self.window.score, compute_trending_score(10, 0) / 2)
+
+    def test_ring_size_is_bounded(self):
+        for h in range(self.hour, self.hour + 3 * ProductActivityWindow.WINDOW_HOURS, 7):
+            self.window.add(h, views=1)
+        self.assertEqual(len(self.window.views), ProductActivityWindow.WINDOW_HOURS)
+        self.assertEqual(len(self.window.sales), ProductActivityWindow.WINDOW_HOURS)
+
+    def test_buckets_leaving_the_window_are_dropped(self):
+        self.window.add(self.hour, sales=10)
+        self.window.add(self.hour + 1, views=10)
+        self.window.advance(self.hour + ProductActivityWindow.WINDOW_HOURS)
+        expected = compute_trending_score(0, 10) * ProductActivityWindow.DECAY_PER_HOUR ** (
+            ProductActivityWindow.WINDOW_HOURS - 1
+        )
+        self.assertAlmostEqual(self.window.score, expected)
+        self.assertEqual(sum(self.window.sales), 0)
+
+    def test_stale_windows_score_zero(self):
+        product = Product.objects.create(name="Old bestseller", price=10)
+        long_ago = timezone.now() - timedelta(hours=ProductActivityWindow.WINDOW_HOURS + 1)
+        record_activity({product.pk: (0, 1000)}, now=long_ago)
+        recompute_trending_scores()
+        product.refresh_from_db()
+        self.assertEqual(product.trending_score, 0.0)
+
+
+class TrendingSchedulerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(category=self.category, name="Phone", price=10)
+        DirtyTrendingProduct.objects.all().delete()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_saves_mark_product_dirty_once(self):
+        for views in range(1, 4):
+            self.product.views_count = views
+            self.product.save()
+        self.assertEqual(DirtyTrendingProduct.objects.count(), 1)
+
+    def test_unrelated_update_fields_do_not_mark_dirty(self):
+        self.product.current_stock = 5
+        self.product.save(update_fields=['current_stock'])
+        self.assertFalse(DirtyTrendingProduct.objects.exists())
+
+    @mock.patch('main.tasks.rebuild_landing_snapshot.apply_async')
+    @mock.patch('product.tasks.recompute_dirty_trending_scores.apply_async')
+    def test_one_task_queued_per_window(self, apply_async, _landing_apply_async):
+        with self.captureOnCommitCallbacks(execute=True):
+            for views in range(1, 50):
+                self.product.views_count = views
+                self.product.save()
+        apply_async.assert_called_once_with(countdown=trending.RECOMPUTE_WINDOW)
+
+    def test_dirty_run_only_touches_marked_products(self):
+        other = Product.objects.create(category=self.category, name="Tablet", price=10)
+        record_activity({self.product.pk: (0, 10), other.pk: (0, 10)})
+        DirtyTrendingProduct.objects.filter(pk=other.pk).delete()
+
+        stats = recompute_dirty_trending_scores()
+
+        self.assertEqual(stats, {'scanned': 1, 'written': 1})
+        self.assertFalse(DirtyTrendingProduct.objects.exists())
+        other.refresh_from_db()
+        self.assertEqual(other.trending_score, 0.0)
+
+    @mock.patch('product.tasks.recompute_dirty_trending_scores.apply_async')
+    def test_run_skipped_while_locked_is_rescheduled(self, apply_async):
+        cache.add(trending._LOCK_KEY, 'other-run')
+        self.assertIsNone(recompute_dirty_trending_scores())
+        apply_async.assert_called_once_with(countdown=trending.RECOMPUTE_WINDOW)
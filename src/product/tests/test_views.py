@@ -19,7 +19,7 @@ class ProductViewSetTest(TestCase):
     def test_get_products(self):
         response = self.client.get('/api/product/products/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_get_product_detail(self):
         response = self.client.get(f'/api/product/products/{self.product.id}/')
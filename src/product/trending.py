@@ -0,0 +1,186 @@
+# product/trending.py
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Power
+from django.utils import timezone
+
+from .models import DirtyTrendingProduct, Product, ProductActivityWindow
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# At most one dirty-product recompute is queued per window (seconds).
+RECOMPUTE_WINDOW = 60
+# Upper bound on how long a recompute run may hold the lock (seconds).
+RECOMPUTE_LOCK_TIMEOUT = 10 * 60
+
+_SCHEDULED_KEY = 'product:trending:recompute:scheduled'
+_LOCK_KEY = 'product:trending:recompute:lock'
+
+
+def current_hour(now=None):
+    """Hours since the unix epoch, the bucket key used by ProductActivityWindow."""
+    now = now or timezone.now()
+    return int(now.timestamp() // 3600)
+
+
+def decayed_score_expression(hour=None):
+    """
+    SQL expression for a product's activity window score decayed to `hour`.
+    Windows whose newest bucket is a full window old (or missing) score 0.
+    """
+    hour = current_hour() if hour is None else hour
+    window = ProductActivityWindow.objects.filter(pk=OuterRef('pk')).annotate(
+        decayed=Case(
+            When(hour__lte=hour - ProductActivityWindow.WINDOW_HOURS, then=Value(0.0)),
+            default=F('score') * Power(Value(ProductActivityWindow.DECAY_PER_HOUR), hour - F('hour')),
+            output_field=FloatField(),
+        )
+    )
+    return Coalesce(Subquery(window.values('decayed')[:1]), Value(0.0), output_field=FloatField())
+
+
+def record_activity(counts, now=None):
+    """
+    Add views/sales to the current hourly bucket of each product's activity window.
+
+    `counts` maps product id -> (views, sales). All windows are updated in one
+    transaction with a bulk write, and the products are marked dirty so their
+    trending_score is refreshed by the next coalesced recompute.
+    """
+    counts = {pk: c for pk, c in counts.items() if c[0] or c[1]}
+    if not counts:
+        return
+    hour = current_hour(now)
+    with transaction.atomic():
+        ProductActivityWindow.objects.bulk_create(
+            [ProductActivityWindow(product_id=pk) for pk in counts],
+            ignore_conflicts=True,
+        )
+        windows = ProductActivityWindow.objects.select_for_update().in_bulk(list(counts))
+        for pk, (views, sales) in counts.items():
+            windows[pk].add(hour, views=views, sales=sales)
+        ProductActivityWindow.objects.bulk_update(
+            windows.values(), ['hour', 'views', 'sales', 'score']
+        )
+        mark_trending_dirty(counts)
+
+
+def recompute_trending_scores(product_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Recompute trending_score with one set-based UPDATE per chunk.
+
+    The score is the product's activity window decayed to the current hour
+    (see decayed_score_expression), so products that stop selling or being
+    viewed fall out of "trending" instead of coasting on lifetime totals.
+    Schedule update_trending_scores hourly so idle products keep decaying.
+
+    Products are walked in primary key order (keyset pagination, so each chunk
+    is an index range scan no matter how deep we are). Rows whose stored score
+    already matches the computed one are excluded in the WHERE clause, so they
+    are never written. Each chunk runs in its own statement, which keeps the
+    SQLite write lock short instead of holding it for the whole catalog.
+
+    Pass product_ids to limit the run to a subset of products. If any row is
+    written, product.signals.scores_updated is sent.
+
+    Returns a dict with the number of rows scanned and rows written.
+    """
+    score = decayed_score_expression()
+    base = Product.objects.order_by('pk')
+    if product_ids is not None:
+        base = base.filter(pk__in=list(product_ids))
+
+    scanned = 0
+    written = 0
+    last_pk = 0
+    while True:
+        chunk = list(base.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        scanned += len(chunk)
+        last_pk = chunk[-1]
+        written += (
+            Product.objects.filter(pk__in=chunk)
+            .exclude(trending_score=score)
+            # Queryset updates skip auto_now; the change feed reads updated_at.
+            .update(trending_score=score, updated_at=timezone.now())
+        )
+        if len(chunk) < chunk_size:
+            break
+
+    if written:
+        from .signals import scores_updated
+        scores_updated.send(sender=Product, product_ids=product_ids, fields=['trending_score'])
+    return {'scanned': scanned, 'written': written}
+
+
+def mark_trending_dirty(product_ids):
+    """
+    Flag products for the next coalesced recompute and make sure one is scheduled.
+    Marking an already dirty product is a no-op, so repeated saves cost one
+    INSERT OR IGNORE each and never grow the task queue.
+    """
+    DirtyTrendingProduct.objects.bulk_create(
+        [DirtyTrendingProduct(product_id=pk) for pk in product_ids],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(schedule_trending_recompute)
+
+
+def schedule_trending_recompute():
+    """
+    Queue a dirty-product recompute unless one is already pending for this window.
+    Returns True if a task was queued.
+    """
+    from .tasks import recompute_dirty_trending_scores
+
+    if not cache.add(_SCHEDULED_KEY, True, timeout=RECOMPUTE_WINDOW):
+        return False
+    try:
+        recompute_dirty_trending_scores.apply_async(countdown=RECOMPUTE_WINDOW)
+    except Exception:
+        # Let the next save try again instead of blocking the whole window.
+        cache.delete(_SCHEDULED_KEY)
+        raise
+    return True
+
+
+def recompute_dirty_trending_scores(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Recompute trending_score for the products marked dirty, then clear the marks.
+
+    A cache lock stops two runs from overlapping; a run that cannot take it
+    queues another run for the next window and returns None, so products
+    marked after the running job claimed its chunk are not left waiting for
+    the next save. Marks are claimed (deleted) in the same transaction as the
+    recompute of their chunk, so a save that lands after the claim marks the
+    product again and is picked up by the next run.
+    """
+    token = uuid.uuid4().hex
+    if not cache.add(_LOCK_KEY, token, timeout=RECOMPUTE_LOCK_TIMEOUT):
+        schedule_trending_recompute()
+        return None
+    try:
+        # Saves from now on must schedule a new run.
+        cache.delete(_SCHEDULED_KEY)
+        scanned = 0
+        written = 0
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    DirtyTrendingProduct.objects.order_by('pk').values_list('pk', flat=True)[:chunk_size]
+                )
+                if not ids:
+                    break
+                DirtyTrendingProduct.objects.filter(pk__in=ids).delete()
+                stats = recompute_trending_scores(product_ids=ids, chunk_size=chunk_size)
+            scanned += stats['scanned']
+            written += stats['written']
+        return {'scanned': scanned, 'written': written}
+    finally:
+        if cache.get(_LOCK_KEY) == token:
+            cache.delete(_LOCK_KEY)
@@ -1,15 +1,29 @@
-from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+import hashlib
+
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
-from .models import Category, Manufacturer, Product, ProductImage, Tag
+from .bitmaps import TagExpressionFilter
+from .changes import FEED_MAX_PAGE_SIZE, FEED_PAGE_SIZE, changes_since, decode_cursor
+from .counters import view_counter
+from .detail_cache import get_product_detail, get_product_fragments
+from .exports import csv_lines, export_queryset, ndjson_lines, parse_timestamp
+from .facets import PRODUCT_FILTER_FIELDS, PRODUCT_SEARCH_FIELDS, get_facets
+from .models import Category, Manufacturer, Product, ProductImage, ProductNeighbours, Tag
+from .pagination import ProductCursorPagination
+from .search import ProductSearchFilter
+from .sections import get_section
 from .serializers import ManufacturerSerializer, ProductImageSerializer, ProductSerializer, CategorySerializer, TagSerializer
 from rest_framework import permissions
 
+# Related products returned when ?limit= is not given.
+RELATED_PRODUCTS_SIZE = 10
+
 class ProductViewSet(viewsets.ModelViewSet):
     """
     Exposes endpoints for standard product operations as well as dynamic sections:
@@ -17,43 +31,155 @@ class ProductViewSet(viewsets.ModelViewSet):
     - Trending
     - New Arrivals
     """
-    queryset = Product.objects.select_related('category').prefetch_related('images')
+    queryset = Product.objects.for_serializer()
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['category', 'is_launch', 'current_stock', 'tags']
-    search_fields = ['name', 'description']
-    ordering_fields = ['price', 'sales_count', 'release_date']
+    filter_backends = [DjangoFilterBackend, TagExpressionFilter, ProductSearchFilter, OrderingFilter]
+    filterset_fields = list(PRODUCT_FILTER_FIELDS)
+    # Indexed by product.search (SQLite FTS5); ranked by relevance unless ?ordering= is given
+    search_fields = list(PRODUCT_SEARCH_FIELDS)
+    ordering_fields = ['price', 'sales_count', 'release_date', 'created_at', 'trending_score']
+    pagination_class = ProductCursorPagination
+    facets_param = 'facets'
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # Only the page rows are loaded; product.detail_cache serializes the products it has no fragment for
+        page = self.paginate_queryset(queryset.prefetch_related(None))
+        fragments = get_product_fragments(page, self.get_serializer_context())
+        response = self.get_paginated_response([fragments[product.pk] for product in page])
+        # ?facets=true adds counts per category, manufacturer, tag and price bucket for the filtered set
+        if request.query_params.get(self.facets_param, '').lower() in ('1', 'true'):
+            response.data['facets'] = get_facets(queryset, request.query_params)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        # Read through product.detail_cache; a hit costs no database queries
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+            data = get_product_detail(pk, self.get_serializer_context())
+        except (ValueError, Product.DoesNotExist):
+            raise NotFound()
+        # Buffered; flushed to views_count in batches by view_counter
+        view_counter.record(pk)
+        return Response(data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """
+        Stream the whole catalog for partner feeds as NDJSON (default) or CSV
+        (?export_format=csv). ?updated_since=<ISO date or datetime> limits it
+        to products changed since then.
+        """
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            raise ValidationError({'export_format': ["Expected 'ndjson' or 'csv'."]})
+        updated_since = None
+        if 'updated_since' in request.query_params:
+            updated_since = parse_timestamp(request.query_params['updated_since'])
+            if updated_since is None:
+                raise ValidationError({'updated_since': ["Expected an ISO 8601 date or datetime."]})
+
+        queryset = export_queryset(updated_since)
+        if export_format == 'csv':
+            response = StreamingHttpResponse(csv_lines(queryset), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(ndjson_lines(queryset), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="products.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Change feed for incremental sync. Pass the returned `cursor` back to get
+        what changed since; deleted products appear as {"id", "deleted": true}.
+        Keep polling until `has_more` is false.
+        """
+        token = request.query_params.get('cursor')
+        cursor = decode_cursor(token) if token else None
+        try:
+            limit = max(1, min(int(request.query_params['limit']), FEED_MAX_PAGE_SIZE))
+        except (KeyError, ValueError):
+            limit = FEED_PAGE_SIZE
+        changes, next_cursor, has_more = changes_since(cursor, limit)
+        products = self.get_serializer([obj for kind, obj in changes if kind == 'product'], many=True).data
+        serialized = iter(products)
+        results = []
+        for kind, obj in changes:
+            if kind == 'product':
+                results.append({'id': obj.pk, 'deleted': False, 'changed_at': obj.updated_at, 'product': next(serialized)})
+            else:
+                results.append({'id': obj.product_id, 'deleted': True, 'changed_at': obj.deleted_at, 'sku': obj.sku})
+        return Response({'results': results, 'cursor': next_cursor, 'has_more': has_more})
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Products most often bought together with this one, best first, from the
+        index orders.cooccurrence maintains. ?limit= caps the list.
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
+        try:
+            limit = max(1, int(request.query_params['limit']))
+        except (KeyError, ValueError):
+            limit = RELATED_PRODUCTS_SIZE
+        neighbours = ProductNeighbours.objects.filter(product_id=pk).values_list('neighbours', flat=True).first()
+        if neighbours is None:
+            if not Product.objects.filter(pk=pk).exists():
+                raise NotFound()
+            neighbours = []
+        ids = [related_id for related_id, _ in neighbours[:limit]]
+        # Neighbours deleted since the last build are skipped.
+        found = Product.objects.for_fragments().in_bulk(ids)
+        fragments = get_product_fragments(found.values(), self.get_serializer_context())
+        return Response([fragments[related_id] for related_id in ids if related_id in found])
+
+    # Query parameters that change a section's content; anything else shares the cached entry.
+    # ?category= / ?manufacturer= serve bestsellers and trending from product.leaderboards.
+    section_params = ('category', 'manufacturer')
+
+    def section_response(self, request, name):
+        """
+        Serve a product section from product.sections, which caches it until
+        a relevant write bumps its generation. Clients and proxies revalidate
+        with the ETag instead of caching for a fixed time.
+        """
+        params = {param: request.query_params[param] for param in self.section_params if param in request.query_params}
+        for param, value in params.items():
+            if not value.isdigit():
+                raise ValidationError({param: ["Expected an id."]})
+        key, entry = get_section(name, params)
+        etag = '"%s"' % hashlib.sha1(f"{key}:{entry['built_at']}".encode()).hexdigest()
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        elif not entry['data']:
+            #return empty list if no products are found and 200 status
+            response = Response({'data': []}, status=status.HTTP_200_OK)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = etag
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
 
-    @method_decorator(cache_page(60, key_prefix="bestsellers"))
     @action(detail=False, methods=['get'])
     def bestsellers(self, request):
-        bestsellers = Product.objects.order_by('-sales_count')[:10]
-        if not bestsellers.exists():
-            #return empty list if no bestsellers are found and 200 status
-            return Response({'data': []}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(bestsellers, many=True)
-        return Response(serializer.data)
-
-    @method_decorator(cache_page(60, key_prefix="trending"))
+        return self.section_response(request, 'bestsellers')
+
     @action(detail=False, methods=['get'])
     def trending(self, request):
-        trending = Product.objects.order_by('-trending_score')[:10]
-        if not trending.exists():
-            #return empty list if no trending products are found and 200 status
-            return Response({'data': []}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(trending, many=True)
-        return Response(serializer.data)
-
-    @method_decorator(cache_page(60, key_prefix="new_arrivals"))
+        return self.section_response(request, 'trending')
+
     @action(detail=False, methods=['get'])
     def new_arrivals(self, request):
-        new_arrivals = Product.objects.filter(release_date__lte=timezone.now()).order_by('-release_date')[:10]
-        if not new_arrivals.exists():
-            #return empty list if no new arrivals are found and 200 status
-            return Response({'data': []}, status=status.HTTP_200_OK)
-        serializer = self.get_serializer(new_arrivals, many=True)
-        return Response(serializer.data)
-    
+        return self.section_response(request, 'new_arrivals')
+
+
 class ProductImageViewSet(viewsets.ModelViewSet):
     """
     Handles CRUD operations for product images.
@@ -1,11 +1,12 @@
 from rest_framework import serializers
 from .models import Review
+from product.detail_cache import ProductFragmentField
 from product.serializers import ProductSerializer
 from user.serializers import CustomUserSerializer
 
 class ReviewSerializer(serializers.ModelSerializer):
     # Represent the related product and user
-    product = ProductSerializer(read_only=True)
+    product = ProductFragmentField()
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=ProductSerializer.Meta.model.objects.all(), source='product', write_only=True
     )
@@ -1,3 +1,22 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from product.tests.test_query_budget import create_catalog
+from review.models import Review
+from review.views import ReviewViewSet
 
-# Create your tests here.
+
+class ReviewQueryBudgetTest(TestCase):
+    def test_review_list(self):
+        view = ReviewViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        # reviews (+users, products), product images, product tags
+        for count in (2, 8):
+            Review.objects.all().delete()
+            for i, product in enumerate(create_catalog(count)):
+                user = get_user_model().objects.create_user(username=f"reviewer-{count}-{i}", password="password123")
+                Review.objects.create(product=product, user=user, rating=5, comment="Great")
+            with self.assertNumQueries(3):
+                response = view(factory.get('/reviews/'))
+                response.render()
+            self.assertEqual(len(response.data), count)
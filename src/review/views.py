@@ -2,6 +2,9 @@
 
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from product.detail_cache import get_product_fragments
+from product.querysets import product_serializer_lookups
 from .models import Review
 from .serializers import ReviewSerializer
 
@@ -14,8 +17,17 @@ class ReviewViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
-        queryset = Review.objects.all().order_by('-created_at')
+        # Product images and tags come with the cached fragments (see list())
+        select, _ = product_serializer_lookups('product')
+        queryset = Review.objects.select_related('user', *select).order_by('-created_at')
         product_id = self.request.query_params.get('product')
         if product_id:
             queryset = queryset.filter(product__id=product_id)
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        reviews = list(self.filter_queryset(self.get_queryset()))
+        # Every reviewed product in one fragment lookup, rendered by ProductFragmentField
+        context = self.get_serializer_context()
+        context['product_fragments'] = get_product_fragments(review.product for review in reviews)
+        return Response(ReviewSerializer(reviews, many=True, context=context).data)
@@ -0,0 +1,45 @@
+import random
+
+from django.core.management.base import BaseCommand
+from user.recommendations import build_recommendations, compute_recommendations
+
+
+def synthetic_interactions(count, users, products, seed=0):
+    """
+    `count` random (user, product, weight) triples in (user, product) order,
+    with product popularity skewed like a real catalog (a few products get
+    most of the interactions).
+    """
+    rng = random.Random(seed)
+    return sorted(
+        (rng.randrange(users), int(products * rng.random() ** 3), rng.choice((1.0, 2.0, 3.0)))
+        for _ in range(count)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild per-user product recommendations from orders, carts and activity. "
+        "With --synthetic N, benchmark the computation on N generated interactions instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, help="Benchmark on this many generated interactions; writes nothing.")
+        parser.add_argument('--users', type=int, default=100_000, help="Users in the synthetic data.")
+        parser.add_argument('--products', type=int, default=20_000, help="Products in the synthetic data.")
+        parser.add_argument(
+            '--trace-memory', action='store_true',
+            help="Also report the peak memory allocated by the computation (several times slower).",
+        )
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            interactions = synthetic_interactions(options['synthetic'], options['users'], options['products'])
+            recommendations, stats = compute_recommendations(iter(interactions), trace_memory=options['trace_memory'])
+            for _ in recommendations:
+                pass
+        else:
+            stats = build_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{key}={value}" for key, value in stats.items())
+        ))
@@ -68,4 +68,16 @@ class UserActivity(models.Model):
     def __str__(self):
         # Format timestamp for better readability
         formatted_timestamp = self.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        return f"{self.user.username} - {self.action} at {formatted_timestamp}"
\ No newline at end of file
+        return f"{self.user.username} - {self.action} at {formatted_timestamp}"
+
+class UserRecommendations(models.Model):
+    """
+    Products recommended to `user`, best first, as [[product id, score], ...].
+    Rebuilt offline by user.recommendations.build_recommendations.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    products = models.JSONField(default=list)
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Recommendations for user {self.user_id}"
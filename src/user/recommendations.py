@@ -0,0 +1,241 @@
+# user/recommendations.py
+
+import heapq
+import math
+import resource
+import time
+import tracemalloc
+from array import array
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import BigIntegerField
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from cart.models import CartItem
+from orders.models import OrderItem
+from product.models import Product
+from .models import UserActivity, UserRecommendations
+
+# Interaction weight per source; a user's weights for one product are summed.
+ORDER_WEIGHT = 3.0
+CART_WEIGHT = 2.0
+# UserActivity rows whose meta_data names a product ({"product_id": ...}).
+ACTIVITY_WEIGHT = 1.0
+# meta_data is free-form; other product_id values are skipped.
+PRODUCT_ID_REGEX = r'^[0-9]{1,18}$'
+
+# Recommendations stored per user.
+RECOMMENDATIONS_SIZE = 20
+# Most similar products kept per product; bounds the scoring pass.
+NEIGHBOURS_SIZE = 20
+# Heaviest products kept per user. The similarity pass costs the sum of the
+# squared profile sizes, so one bulk-buying account cannot dominate a build.
+MAX_PROFILE_ITEMS = 100
+WRITE_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 5000
+
+
+def iter_interactions():
+    """
+    (user id, product id, weight) for every order line, cart line and
+    product-tagged activity, merged into (user, product) order. Each source
+    is streamed from the database already sorted, so nothing is buffered.
+    """
+    orders = (
+        OrderItem.objects.filter(order__user__isnull=False, product__isnull=False)
+        .order_by('order__user_id', 'product_id')
+        .values_list('order__user_id', 'product_id')
+    )
+    carts = CartItem.objects.order_by('cart__user_id', 'product_id').values_list('cart__user_id', 'product_id')
+    activity = (
+        # Only ids made of digits reach the Cast, which fails on other text.
+        UserActivity.objects.filter(meta_data__product_id__regex=PRODUCT_ID_REGEX)
+        .annotate(product=Cast(KeyTextTransform('product_id', 'meta_data'), BigIntegerField()))
+        .order_by('user_id', 'product')
+        .values_list('user_id', 'product')
+    )
+    sources = [
+        ((user_id, product_id, weight) for user_id, product_id in queryset.iterator(chunk_size=READ_CHUNK_SIZE))
+        for queryset, weight in ((orders, ORDER_WEIGHT), (carts, CART_WEIGHT), (activity, ACTIVITY_WEIGHT))
+    ]
+    return heapq.merge(*sources)
+
+
+class InteractionMatrix:
+    """
+    Sparse user x product matrix in compressed rows: products are renumbered
+    0..n-1, and each user's row is a pair of arrays (product indexes,
+    weights), so 1M interactions take tens of megabytes rather than a dict
+    entry each.
+    """
+
+    def __init__(self):
+        self.user_ids = []
+        self.rows = []
+        self.product_ids = []
+        self._product_index = {}
+
+    @classmethod
+    def from_interactions(cls, interactions, max_profile_items=MAX_PROFILE_ITEMS):
+        """Build from (user id, product id, weight) triples sorted by user, then product."""
+        matrix = cls()
+        for user_id, entries in groupby(interactions, key=lambda entry: entry[0]):
+            totals = [
+                (sum(weight for _, _, weight in group), product_id)
+                for product_id, group in groupby(entries, key=lambda entry: entry[1])
+            ]
+            if len(totals) > max_profile_items:
+                totals = heapq.nlargest(max_profile_items, totals)
+            matrix.add_row(user_id, totals)
+        return matrix
+
+    def add_row(self, user_id, totals):
+        products = array('l')
+        weights = array('d')
+        for weight, product_id in totals:
+            index = self._product_index.get(product_id)
+            if index is None:
+                index = self._product_index[product_id] = len(self.product_ids)
+                self.product_ids.append(product_id)
+            products.append(index)
+            weights.append(weight)
+        self.user_ids.append(user_id)
+        self.rows.append((products, weights))
+
+    def columns(self):
+        """The transposed matrix: for each product, (user rows, weights)."""
+        columns = [(array('l'), array('d')) for _ in self.product_ids]
+        for row, (products, weights) in enumerate(self.rows):
+            for product, weight in zip(products, weights):
+                users, user_weights = columns[product]
+                users.append(row)
+                user_weights.append(weight)
+        return columns
+
+
+def item_neighbours(matrix, size=NEIGHBOURS_SIZE):
+    """
+    For each product, its `size` most similar products as (index, cosine
+    similarity) pairs.
+
+    Row i of the item x item similarity matrix AᵀA is accumulated on its own
+    (Gustavson's row-by-row sparse product: the rows of every user who has
+    product i, scaled by their weight for i) and cut to its top entries
+    before the next row, so memory stays proportional to products x size.
+    """
+    columns = matrix.columns()
+    norms = [math.sqrt(sum(weight * weight for weight in weights)) for _, weights in columns]
+    neighbours = []
+    for product, (users, user_weights) in enumerate(columns):
+        scores = {}
+        for row, weight in zip(users, user_weights):
+            products, weights = matrix.rows[row]
+            for other, other_weight in zip(products, weights):
+                scores[other] = scores.get(other, 0.0) + weight * other_weight
+        scores.pop(product, None)
+        norm = norms[product]
+        neighbours.append(heapq.nlargest(
+            size, ((other, score / (norm * norms[other])) for other, score in scores.items()),
+            key=lambda pair: pair[1],
+        ))
+    return neighbours
+
+
+def recommend(matrix, neighbours, size=RECOMMENDATIONS_SIZE):
+    """
+    Yield (user id, [[product id, score], ...]) for every user: the row of
+    A x S (interactions times the pruned similarity matrix), best first,
+    without the products the user already has.
+    """
+    for user_id, (products, weights) in zip(matrix.user_ids, matrix.rows):
+        scores = {}
+        for product, weight in zip(products, weights):
+            for other, similarity in neighbours[product]:
+                scores[other] = scores.get(other, 0.0) + weight * similarity
+        for product in products:
+            scores.pop(product, None)
+        best = heapq.nlargest(size, scores.items(), key=lambda pair: pair[1])
+        yield user_id, [[matrix.product_ids[product], round(score, 6)] for product, score in best]
+
+
+def compute_recommendations(interactions, trace_memory=False):
+    """
+    Run the whole computation over (user, product, weight) triples sorted by
+    user and product. Returns (recommendations, stats); the recommendations
+    are a generator, and stats are filled in once it is exhausted: counts,
+    `seconds`, the process's peak RSS and, with `trace_memory`, the peak of
+    the memory allocated by the computation itself (tracemalloc, which slows
+    it down; meant for benchmarks).
+    """
+    stats = {'interactions': 0}
+
+    def counted():
+        for interaction in interactions:
+            stats['interactions'] += 1
+            yield interaction
+
+    def run():
+        if trace_memory:
+            tracemalloc.start()
+        started = time.monotonic()
+        try:
+            matrix = InteractionMatrix.from_interactions(counted())
+            neighbours = item_neighbours(matrix)
+            stats['users'] = len(matrix.user_ids)
+            stats['products'] = len(matrix.product_ids)
+            yield from recommend(matrix, neighbours)
+            stats['seconds'] = round(time.monotonic() - started, 2)
+            # ru_maxrss is in kilobytes on Linux
+            stats['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+            if trace_memory:
+                stats['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+
+    return run(), stats
+
+
+def build_recommendations():
+    """
+    Rebuild UserRecommendations from orders, carts and activity. Rows are
+    written in batches as users are scored; rows of users who no longer have
+    any recommendation are deleted at the end. Recommended products that
+    have since been deleted are skipped when read.
+
+    Returns the stats of compute_recommendations: interaction, user and
+    product counts, the build time in seconds and the peak RSS (MB).
+    """
+    started_at = timezone.now()
+    recommendations, stats = compute_recommendations(iter_interactions())
+    batch = []
+
+    def flush():
+        UserRecommendations.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['user'], update_fields=['products', 'built_at'],
+        )
+        batch.clear()
+
+    for user_id, products in recommendations:
+        if products:
+            batch.append(UserRecommendations(user_id=user_id, products=products, built_at=started_at))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            flush()
+    with transaction.atomic():
+        if batch:
+            flush()
+        UserRecommendations.objects.filter(built_at__lt=started_at).delete()
+    return stats
+
+
+def recommended_products(user):
+    """The user's stored recommendations as Product instances, best first."""
+    ids = [
+        product_id for product_id, _ in
+        UserRecommendations.objects.filter(user=user).values_list('products', flat=True).first() or []
+    ]
+    found = Product.objects.for_fragments().in_bulk(ids)
+    return [found[product_id] for product_id in ids if product_id in found]
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from cart.guest import merge_guest_cart
 from .models import ACTION_CHOICES, CustomUser, UserActivity
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -32,4 +34,22 @@ class UserActivitySerializer(serializers.ModelSerializer):
     class Meta:
         model = UserActivity
         fields = ('id', 'user', 'action', 'timestamp', 'ip_address', 'meta_data')
-        read_only_fields = ('id', 'timestamp')
\ No newline at end of file
+        read_only_fields = ('id', 'timestamp')
+
+
+class GuestCartTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Login serializer (SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER']) that also moves
+    the visitor's guest cart, if one is given, into the user's cart.
+    """
+    guest_cart = serializers.CharField(
+        required=False,
+        write_only=True,
+        help_text="Token of a guest cart to merge into the user's cart"
+    )
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if attrs.get('guest_cart'):
+            merge_guest_cart(self.user, attrs['guest_cart'])
+        return data
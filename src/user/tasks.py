@@ -0,0 +1,22 @@
+# user/tasks.py
+
+import logging
+
+from celery import shared_task
+from .recommendations import build_recommendations
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def build_user_recommendations():
+    """
+    Task to rebuild every user's product recommendations.
+    Schedule it periodically (e.g., nightly) via Celery beat.
+    """
+    stats = build_recommendations()
+    logger.info(
+        "Recommendations build: interactions=%(interactions)d users=%(users)d products=%(products)d "
+        "seconds=%(seconds).1f peak_rss_mb=%(peak_rss_mb).1f", stats
+    )
+    return stats
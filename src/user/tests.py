@@ -1,7 +1,11 @@
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import CustomUser, UserActivity, ACTION_CHOICES
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from product.models import Product
+from .models import CustomUser, UserActivity, UserRecommendations, ACTION_CHOICES
+from .recommendations import ACTIVITY_WEIGHT, InteractionMatrix, build_recommendations, item_neighbours, iter_interactions
 
 
 class CustomUserAPITestCase(APITestCase):
@@ -137,4 +141,87 @@ class LoginAPITestCase(APITestCase):
         response = self.client.post(self.login_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertIn("detail", response.data)
-        self.assertEqual(response.data["detail"], "No active account found with the given credentials.")
\ No newline at end of file
+        self.assertEqual(response.data["detail"], "No active account found with the given credentials.")
+
+class RecommendationsTestCase(APITestCase):
+    def setUp(self):
+        self.dress, self.belt, self.bag, self.hat = [
+            Product.objects.create(name=name, description="", price=10) for name in ("Dress", "Belt", "Bag", "Hat")
+        ]
+        self.users = [CustomUser.objects.create_user(username=f"shopper{i}", password="password123") for i in range(4)]
+        self.orders = 0
+
+    def order(self, user, *products):
+        self.orders += 1
+        order = Order.objects.create(
+            user=user, payment_intent_id=f"pi_{self.orders}", amount=0, currency="aud", shipping_info={},
+            subtotal=0, shipping=0, total=0,
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, name=product.name, quantity=1, price=10)
+
+    def recommendations(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/user/users/me/recommendations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['name'] for product in response.data]
+
+    def test_recommends_products_bought_by_similar_users(self):
+        first, second, third, fourth = self.users
+        self.order(first, self.dress, self.belt)
+        self.order(second, self.dress, self.belt)
+        self.order(third, self.dress)
+        CartItem.objects.create(cart=Cart.objects.create(user=third), product=self.bag, selected_color="", selected_size="")
+        UserActivity.objects.create(user=fourth, action="purchase", meta_data={"product_id": self.bag.pk})
+        UserActivity.objects.create(user=fourth, action="purchase", meta_data={"product_id": self.hat.pk})
+
+        stats = build_recommendations()
+
+        self.assertEqual((stats['interactions'], stats['users'], stats['products']), (8, 4, 4))
+        self.assertEqual(self.recommendations(third), ["Belt", "Hat"])
+        self.assertEqual(self.recommendations(first), ["Bag"])
+
+    def test_malformed_activity_rows_are_skipped(self):
+        user = self.users[0]
+        for product_id in (self.hat.pk, str(self.bag.pk), "abc", "12abc", "", None, True, 1.5, [1]):
+            UserActivity.objects.create(user=user, action="purchase", meta_data={"product_id": product_id})
+        UserActivity.objects.create(user=user, action="purchase", meta_data={})
+
+        self.assertEqual(
+            list(iter_interactions()),
+            sorted([(user.pk, self.hat.pk, ACTIVITY_WEIGHT), (user.pk, self.bag.pk, ACTIVITY_WEIGHT)]),
+        )
+
+    def test_rebuild_replaces_rows(self):
+        first, second = self.users[:2]
+        self.order(first, self.dress, self.belt)
+        self.order(second, self.dress)
+        build_recommendations()
+        self.assertTrue(UserRecommendations.objects.filter(user=second).exists())
+
+        Order.objects.all().delete()
+        build_recommendations()
+        self.assertFalse(UserRecommendations.objects.exists())
+        self.belt.delete()
+        self.assertEqual(self.recommendations(second), [])
+
+    def test_lookup_is_one_query_before_rendering(self):
+        self.order(self.users[0], self.dress, self.belt)
+        self.order(self.users[1], self.dress)
+        build_recommendations()
+        self.client.force_authenticate(user=self.users[1])
+        self.client.get('/api/user/users/me/recommendations/')
+        # the recommendations row and the recommended products; fragments are cached
+        with self.assertNumQueries(2):
+            self.client.get('/api/user/users/me/recommendations/')
+
+    def test_similarity_is_cosine(self):
+        matrix = InteractionMatrix.from_interactions(iter([
+            (1, 10, 1.0), (1, 20, 1.0),
+            (2, 10, 1.0), (2, 30, 1.0),
+            (3, 10, 1.0), (3, 20, 1.0),
+        ]))
+        neighbours = item_neighbours(matrix)
+        named = {matrix.product_ids[i]: [(matrix.product_ids[j], round(s, 3)) for j, s in pairs] for i, pairs in enumerate(neighbours)}
+        self.assertEqual(named[10], [(20, 0.816), (30, 0.577)])
+        self.assertEqual(named[30], [(10, 0.577)])
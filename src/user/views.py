@@ -4,7 +4,9 @@ from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from product.detail_cache import get_product_fragments
 from .models import CustomUser, UserActivity
+from .recommendations import recommended_products
 from .serializers import CustomUserSerializer, UserActivitySerializer
 
 from rest_framework import generics, status
@@ -45,6 +47,17 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         serializer = UserActivitySerializer(activities, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='me/recommendations')
+    def recommendations(self, request):
+        """
+        Products recommended to the current user, best first, from the table
+        user.recommendations rebuilds offline. Empty until the user has
+        orders, cart items or product activity and a build has run.
+        """
+        products = recommended_products(request.user)
+        fragments = get_product_fragments(products, self.get_serializer_context())
+        return Response([fragments[product.pk] for product in products])
+
 
 class UserActivityViewSet(viewsets.ReadOnlyModelViewSet):
     """